@@ -1,47 +1,476 @@
 """Copyright (c) 2022, Liberty Mutual Group."""
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
 
+import fsspec
 import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
 from lit_ds_utils.decorate.logging import log_function
 
+from pipeline.acquisition.acquire_data_utils import (
+    ARROW_IPC_SUFFIXES,
+    Filters,
+    add_partition_columns,
+    apply_dtype_plan,
+    apply_filters,
+    arrow_ipc_bytes_per_row,
+    arrow_table_to_pandas,
+    bind_partition_filters,
+    columns_to_read,
+    dictionary_encode_columns,
+    filters_to_arrow_expression,
+    is_multi_file_path,
+    iter_arrow_ipc_batches,
+    list_dataset_files,
+    parse_partition_values,
+    read_arrow_ipc,
+    read_csv_arrow,
+    resolve_filesystem,
+    write_arrow_ipc,
+)
+from pipeline.acquisition.dataset_cache import DatasetCache, get_default_dataset_cache, is_remote_path
+from pipeline.config.constants import TEST_POLICY_YEAR
+from pipeline.config.dataclasses import (
+    LoadTimeDtypes,
+    ModellingFeatures,
+    NonModellingFeatures,
+    TargetFeature,
+    feature_names,
+)
+from pipeline.features.nlp_feature_engineering_utils import NLPFeatures
+
 logger = logging.getLogger(__name__)
 
+TRAINING_DATA_PATH = "s3://cortex-dsc-2023-data/sprint_data/sprint_train.parquet"
+
+# The columns and policy years the training pipeline reads from the training extract. The 10-K summaries are text
+# features of the model.
+TRAINING_COLUMNS = feature_names(ModellingFeatures, NonModellingFeatures, TargetFeature, NLPFeatures)
+TRAINING_FILTERS = [(NonModellingFeatures.policy_year, "<=", TEST_POLICY_YEAR)]
+
+DEFAULT_BATCH_SIZE_ROWS = 100_000
+# Number of rows read up front to estimate the in-memory size of a CSV/JSON row
+BYTES_PER_ROW_SAMPLE_SIZE = 1_000
+
 
 @log_function()
-def acquire_data() -> pd.DataFrame:
+def acquire_data(
+    columns: Optional[List[str]] = None,
+    filters: Optional[Filters] = None,
+) -> pd.DataFrame:
     """Acquire the data.
 
+    Args:
+        columns: Columns to read, e.g. TRAINING_COLUMNS. None reads all columns.
+        filters: Row filters pushed down into the reader, e.g. TRAINING_FILTERS. None reads all rows.
+
     Returns:
         The dataset as a pandas DataFrame.
     """
-    data = get_dataset("s3://cortex-dsc-2023-data/sprint_data/sprint_train.parquet")
+    data = get_dataset(
+        TRAINING_DATA_PATH,
+        columns=columns,
+        filters=filters,
+        cache=get_default_dataset_cache(),
+        dtype_plan=LoadTimeDtypes(),
+    )
 
     return data
 
 
+def acquire_data_batches(
+    batch_size_rows: Optional[int] = None,
+    batch_size_bytes: Optional[int] = None,
+    columns: Optional[List[str]] = None,
+    filters: Optional[Filters] = None,
+) -> Iterator[pd.DataFrame]:
+    """Acquire the data as a stream of bounded-size batches.
+
+    Args:
+        batch_size_rows: Maximum number of rows per batch.
+        batch_size_bytes: Approximate maximum in-memory size of each batch, in bytes.
+        columns: Columns to read, e.g. TRAINING_COLUMNS. None reads all columns.
+        filters: Row filters pushed down into the reader, e.g. TRAINING_FILTERS. None reads all rows.
+
+    Returns:
+        An iterator over the dataset batches.
+    """
+    return iter_dataset(
+        TRAINING_DATA_PATH,
+        batch_size_rows=batch_size_rows,
+        batch_size_bytes=batch_size_bytes,
+        columns=columns,
+        filters=filters,
+    )
+
+
 def get_dataset(
-    path_to_data: str,
+    path_to_data: Union[str, List[str]],
+    columns: Optional[List[str]] = None,
+    filters: Optional[Filters] = None,
+    cache: Optional[DatasetCache] = None,
+    dtype_plan: Optional[LoadTimeDtypes] = None,
+    max_workers: Optional[int] = None,
+    fast_csv: bool = False,
 ) -> pd.DataFrame:
     """Load dataframe from disk
 
+    For parquet files, the column projection and row filters are pushed down into the reader, so unused columns are
+    never decoded and row groups whose statistics rule out every row are skipped. Other formats apply them after
+    reading.
+
+    A directory, glob or list of paths is read as a multi-file dataset: the files are read concurrently and
+    concatenated. Hive partition values in the paths (e.g. policy_year=2017/lob=GL/) become columns without being
+    read from the files, and files whose partition values rule out every row are never opened.
+
     Args:
         path_to_data (str): Absolute path to the data. Can be local or
-            path to S3.
+            path to S3. Can also be a directory, a glob or a list of paths.
+        columns (List[str]): Columns to read. None reads all columns.
+        filters (Filters): Row filters as (column, op, value) tuples, e.g. [("policy_year", "<=", 2017)].
+        cache (DatasetCache): If given, remote datasets are read from a local cached copy, which is fetched in full
+            on the first read of each version of the source.
+        dtype_plan (LoadTimeDtypes): If given, categorical columns are read dictionary-encoded where the format
+            allows it, numeric columns are downcast, and the memory saved per column is logged.
+        max_workers (int): Maximum number of files of a multi-file dataset read at once. Defaults to the thread pool
+            default, which scales with the number of CPUs.
+        fast_csv (bool): Read CSV files with the multithreaded Arrow parser, caching the inferred column types in a
+            sidecar file so later reads skip type inference. Arrow may infer different types than pandas, e.g.
+            timestamps instead of strings.
+
+    Raises:
+        ValueError: If the file format is not supported.
     """
+    if is_multi_file_path(path_to_data):
+        return _get_multi_file_dataset(path_to_data, columns, filters, cache, dtype_plan, max_workers, fast_csv)
+
+    if cache is not None and is_remote_path(path_to_data):
+        source = path_to_data
+        path_to_data = str(cache.fetch(source, load=lambda: get_dataset(source)))
+
+    categorical = [] if dtype_plan is None else [c for c in dtype_plan.categorical if columns is None or c in columns]
+    # Whether the reader applied the projection and filters itself
+    pushed_down = True
     try:
+        read_columns = columns_to_read(columns, filters)
         if path_to_data.endswith('.parquet'):
             # Load parquet file
-            df = pd.read_parquet(path_to_data)
+            df = pd.read_parquet(path_to_data, columns=columns, filters=filters, read_dictionary=categorical or None)
+        elif path_to_data.endswith('.csv') and fast_csv:
+            # Load CSV file with the multithreaded Arrow parser
+            table = read_csv_arrow(path_to_data, columns=columns, filters=filters)
+            df = arrow_table_to_pandas(dictionary_encode_columns(table, categorical))
         elif path_to_data.endswith('.csv'):
             # Load CSV file
-            df = pd.read_csv(path_to_data)
+            pushed_down = False
+            df = pd.read_csv(path_to_data, usecols=read_columns, dtype={column: "category" for column in categorical})
         elif path_to_data.endswith('.xlsx'):
             # Load Excel file
-            df = pd.read_excel(path_to_data)
+            pushed_down = False
+            df = pd.read_excel(path_to_data, usecols=read_columns)
         elif path_to_data.endswith('.json'):
             # Load JSON file
+            pushed_down = False
             df = pd.read_json(path_to_data)
-        return df
+        elif path_to_data.endswith('.jsonl'):
+            # Load JSON lines file
+            pushed_down = False
+            df = pd.read_json(path_to_data, lines=True)
+        elif path_to_data.endswith(ARROW_IPC_SUFFIXES):
+            # Load memory-mapped Arrow IPC (Feather) file
+            table = read_arrow_ipc(path_to_data, columns=columns, filters=filters)
+            df = arrow_table_to_pandas(dictionary_encode_columns(table, categorical))
+        else:
+            raise ValueError(f"Unsupported file format: {path_to_data}")
+    except PermissionError as error:
+        logger.error(f"You do not have access to the dataset in {path_to_data}")
+        raise error
+
+    df = _apply_dtype_plan(df, dtype_plan)
+    if not pushed_down:
+        df = _project_and_filter(df, columns, filters)
+    return df
+
+
+def iter_dataset(
+    path_to_data: Union[str, List[str]],
+    batch_size_rows: Optional[int] = None,
+    batch_size_bytes: Optional[int] = None,
+    columns: Optional[List[str]] = None,
+    filters: Optional[Filters] = None,
+) -> Iterator[pd.DataFrame]:
+    """Stream a dataframe from disk in bounded-size batches.
+
+    Parquet and Arrow IPC files are read one record batch at a time, and CSV and JSON lines files in chunks, so only a
+    single batch is held in memory at once. A JSON document cannot be read in chunks, so it is read whole and batched.
+    At most one of `batch_size_rows` and `batch_size_bytes` may be given; if neither is, batches of
+    `DEFAULT_BATCH_SIZE_ROWS` rows are produced. A byte budget is converted into a row count from the file metadata,
+    from the first record batch of an Arrow IPC file, or from a small sample of the file for CSV/JSON. Columns and
+    filters are applied as in `get_dataset`, so filtered batches may hold fewer rows than the batch size. The files of
+    a multi-file dataset are streamed one after the other.
+
+    Args:
+        path_to_data (str): Absolute path to the data. Can be local or path to S3. Can also be a directory, a glob or
+            a list of paths.
+        batch_size_rows (int): Maximum number of rows per batch.
+        batch_size_bytes (int): Approximate maximum in-memory size of each batch, in bytes.
+        columns (List[str]): Columns to read. None reads all columns.
+        filters (Filters): Row filters as (column, op, value) tuples.
+
+    Yields:
+        The dataset, one pandas DataFrame batch at a time.
+
+    Raises:
+        ValueError: If both batch sizes are given, or the file format cannot be streamed.
+    """
+    if batch_size_rows is not None and batch_size_bytes is not None:
+        raise ValueError("Specify at most one of batch_size_rows and batch_size_bytes")
+    if batch_size_rows is None and batch_size_bytes is None:
+        batch_size_rows = DEFAULT_BATCH_SIZE_ROWS
+
+    if is_multi_file_path(path_to_data):
+        for path, partition_values in _list_partitioned_files(path_to_data, filters):
+            file_filters = bind_partition_filters(filters, partition_values)
+            file_columns = None if columns is None else [c for c in columns if c not in partition_values]
+            for batch in iter_dataset(path, batch_size_rows, batch_size_bytes, file_columns, file_filters):
+                for key, value in partition_values.items():
+                    if key not in batch.columns and (columns is None or key in columns):
+                        batch[key] = pd.Categorical([value] * len(batch)) if isinstance(value, str) else value
+                yield batch if columns is None else batch[columns]
+        return
+
+    try:
+        if path_to_data.endswith('.parquet'):
+            filesystem, path = resolve_filesystem(path_to_data)
+            dataset = ds.dataset(path, filesystem=filesystem, format="parquet")
+            if batch_size_rows is None:
+                batch_size_rows = _rows_per_batch(batch_size_bytes, _parquet_bytes_per_row(dataset, columns))
+            # Read ahead a single batch at a time so that memory stays bounded by the batch size
+            for batch in dataset.to_batches(
+                columns=columns,
+                filter=filters_to_arrow_expression(filters),
+                batch_size=batch_size_rows,
+                batch_readahead=1,
+                fragment_readahead=1,
+            ):
+                if batch.num_rows:
+                    yield batch.to_pandas()
+        elif path_to_data.endswith('.csv'):
+            read_columns = columns_to_read(columns, filters)
+            if batch_size_rows is None:
+                sample = pd.read_csv(path_to_data, usecols=read_columns, nrows=BYTES_PER_ROW_SAMPLE_SIZE)
+                batch_size_rows = _rows_per_batch(batch_size_bytes, _frame_bytes_per_row(sample))
+            with pd.read_csv(path_to_data, usecols=read_columns, chunksize=batch_size_rows) as reader:
+                for chunk in reader:
+                    yield _project_and_filter(chunk, columns, filters)
+        elif path_to_data.endswith('.json'):
+            # A JSON document cannot be parsed incrementally, so it is read whole as in get_dataset and then batched
+            df = _project_and_filter(pd.read_json(path_to_data), columns, filters)
+            if batch_size_rows is None:
+                batch_size_rows = _rows_per_batch(batch_size_bytes, _frame_bytes_per_row(df))
+            for start in range(0, len(df), batch_size_rows):
+                yield df.iloc[start:start + batch_size_rows]
+        elif path_to_data.endswith('.jsonl'):
+            if batch_size_rows is None:
+                sample = pd.read_json(path_to_data, lines=True, nrows=BYTES_PER_ROW_SAMPLE_SIZE)
+                batch_size_rows = _rows_per_batch(batch_size_bytes, _frame_bytes_per_row(sample))
+            with pd.read_json(path_to_data, lines=True, chunksize=batch_size_rows) as reader:
+                for chunk in reader:
+                    yield _project_and_filter(chunk, columns, filters)
+        elif path_to_data.endswith(ARROW_IPC_SUFFIXES):
+            if batch_size_rows is None:
+                batch_size_rows = _rows_per_batch(batch_size_bytes, arrow_ipc_bytes_per_row(path_to_data, columns))
+            for table in iter_arrow_ipc_batches(path_to_data, batch_size_rows, columns=columns, filters=filters):
+                yield arrow_table_to_pandas(table)
+        else:
+            raise ValueError(f"Streaming is not supported for file format: {path_to_data}")
     except PermissionError as error:
         logger.error(f"You do not have access to the dataset in {path_to_data}")
         raise error
+
+
+def _get_multi_file_dataset(
+    path_to_data: Union[str, List[str]],
+    columns: Optional[List[str]],
+    filters: Optional[Filters],
+    cache: Optional[DatasetCache],
+    dtype_plan: Optional[LoadTimeDtypes],
+    max_workers: Optional[int],
+    fast_csv: bool,
+) -> pd.DataFrame:
+    """Read a multi-file dataset concurrently on a bounded thread pool.
+
+    Each file is read into an Arrow table, and the tables are concatenated without copying before a single conversion
+    to pandas, rather than concatenating one pandas frame per file.
+
+    Args:
+        path_to_data: A directory, a glob or a list of paths.
+        columns: Columns to read. None reads all columns.
+        filters: Row filters.
+        cache: Optional local cache for remote files.
+        dtype_plan: Optional load-time dtype plan.
+        max_workers: Maximum number of files read at once.
+        fast_csv: Whether to read CSV files with the multithreaded Arrow parser.
+
+    Returns:
+        The dataset as a pandas DataFrame.
+
+    Raises:
+        ValueError: If no file of the dataset matches the filters.
+    """
+    files = _list_partitioned_files(path_to_data, filters)
+    if not files:
+        raise ValueError(f"No data files to read in {path_to_data}")
+
+    categorical = [] if dtype_plan is None else dtype_plan.categorical
+
+    def read_file(path: str, partition_values: Dict[str, Any]) -> pa.Table:
+        file_filters = bind_partition_filters(filters, partition_values) or None
+        file_columns = None if columns is None else [c for c in columns if c not in partition_values]
+        if cache is not None and is_remote_path(path):
+            path = str(cache.fetch(path, load=lambda: get_dataset(path)))
+        if path.endswith('.parquet'):
+            filesystem, fs_path = fsspec.core.url_to_fs(path)
+            table = pq.read_table(
+                fs_path, filesystem=filesystem, columns=file_columns, filters=file_filters, read_dictionary=categorical
+            )
+        elif path.endswith(ARROW_IPC_SUFFIXES):
+            table = dictionary_encode_columns(read_arrow_ipc(path, file_columns, file_filters), categorical)
+        elif path.endswith('.csv') and fast_csv:
+            table = dictionary_encode_columns(read_csv_arrow(path, file_columns, file_filters), categorical)
+        else:
+            table = pa.Table.from_pandas(get_dataset(path, file_columns, file_filters), preserve_index=False)
+        return add_partition_columns(table, partition_values, columns)
+
+    logger.info(f"Reading {len(files)} files from {path_to_data}")
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        tables = list(executor.map(lambda file: read_file(*file), files))
+
+    # Files infer their types on their own, e.g. int64 in one file and double in another that has nulls, so the types
+    # are promoted to a common one rather than required to match
+    df = arrow_table_to_pandas(pa.concat_tables(tables, promote_options="permissive"))
+    return _apply_dtype_plan(df, dtype_plan)
+
+
+def _list_partitioned_files(
+    path_to_data: Union[str, List[str]], filters: Optional[Filters]
+) -> List[Tuple[str, Dict[str, Any]]]:
+    """List the files of a multi-file dataset with their partition values, skipping files pruned by the filters.
+
+    Args:
+        path_to_data: A directory, a glob or a list of paths.
+        filters: Row filters.
+
+    Returns:
+        The file paths and their partition values.
+    """
+    files = [(path, parse_partition_values(path)) for path in list_dataset_files(path_to_data)]
+    return [(path, values) for path, values in files if bind_partition_filters(filters, values) is not None]
+
+
+def _apply_dtype_plan(df: pd.DataFrame, dtype_plan: Optional[LoadTimeDtypes]) -> pd.DataFrame:
+    """Apply a load-time dtype plan, if any, and log the memory it saved.
+
+    Args:
+        df: The dataframe.
+        dtype_plan: The dtype plan.
+
+    Returns:
+        The dataframe with the planned dtypes.
+    """
+    if dtype_plan is None:
+        return df
+    df, report = apply_dtype_plan(df, dtype_plan)
+    logger.info("Load-time dtype plan saved %.1f MB:\n%s", report["bytes_saved"].sum() / 1024**2, report.to_string())
+    return df
+
+
+def _project_and_filter(df: pd.DataFrame, columns: Optional[List[str]], filters: Optional[Filters]) -> pd.DataFrame:
+    """Apply a column projection and row filters to a dataframe that has already been read.
+
+    Args:
+        df: The dataframe.
+        columns: Columns to keep. None keeps all columns.
+        filters: Row filters.
+
+    Returns:
+        The projected and filtered dataframe.
+    """
+    df = apply_filters(df, filters)
+    if columns is not None and list(df.columns) != columns:
+        df = df[columns]
+    return df
+
+
+def _parquet_bytes_per_row(dataset: ds.FileSystemDataset, columns: Optional[List[str]] = None) -> float:
+    """Estimate the uncompressed size of one row of a parquet dataset from the metadata of its first file.
+
+    Args:
+        dataset: The parquet dataset.
+        columns: Columns that will be read. None counts all columns.
+
+    Returns:
+        The average number of uncompressed bytes per row.
+    """
+    metadata = next(iter(dataset.get_fragments())).metadata
+    total_bytes = 0
+    for i in range(metadata.num_row_groups):
+        row_group = metadata.row_group(i)
+        for j in range(row_group.num_columns):
+            column = row_group.column(j)
+            if columns is None or column.path_in_schema in columns:
+                total_bytes += column.total_uncompressed_size
+    return total_bytes / max(metadata.num_rows, 1)
+
+
+def _frame_bytes_per_row(df: pd.DataFrame) -> float:
+    """Measure the average in-memory size of one row of a dataframe.
+
+    Args:
+        df: Sample dataframe.
+
+    Returns:
+        The average number of bytes per row.
+    """
+    return df.memory_usage(deep=True).sum() / max(len(df), 1)
+
+
+def _rows_per_batch(batch_size_bytes: int, bytes_per_row: float) -> int:
+    """Convert a byte budget into a number of rows per batch.
+
+    Args:
+        batch_size_bytes: The byte budget for one batch.
+        bytes_per_row: The estimated size of one row.
+
+    Returns:
+        The number of rows per batch, at least one.
+    """
+    return max(int(batch_size_bytes // max(bytes_per_row, 1)), 1)
+
+
+def convert_to_arrow_ipc(
+    path_to_data: str,
+    destination: str,
+    columns: Optional[List[str]] = None,
+    filters: Optional[Filters] = None,
+) -> None:
+    """Convert a dataset to an uncompressed Arrow IPC (Feather v2) file.
+
+    Converting once lets later reads memory-map the result with `get_dataset` instead of decoding the source again,
+    and lets several processes on one machine share a single page-cached copy of it.
+
+    Args:
+        path_to_data: Local path or URI of the source dataset.
+        destination: Path of the Arrow IPC file to write, e.g. ending in .feather or .arrow.
+        columns: Columns to keep. None keeps all columns.
+        filters: Row filters.
+    """
+    if path_to_data.endswith('.parquet'):
+        # Stay in Arrow rather than round-tripping the data through pandas
+        data = pq.read_table(path_to_data, columns=columns, filters=filters)
+    else:
+        data = get_dataset(path_to_data, columns=columns, filters=filters)
+    write_arrow_ipc(data, destination)
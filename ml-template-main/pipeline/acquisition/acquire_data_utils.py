@@ -0,0 +1,602 @@
+"""Copyright (c) 2022, Liberty Mutual Group."""
+import logging
+import operator
+import os
+import re
+import sys
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+import fsspec
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import pyarrow.dataset as ds
+import pyarrow.feather as feather
+from pyarrow import fs
+
+from pipeline.config.dataclasses import LoadTimeDtypes
+
+try:
+    from pyarrow.parquet import filters_to_expression
+except ImportError:  # pyarrow < 10
+    from pyarrow.parquet import _filters_to_expression as filters_to_expression
+
+logger = logging.getLogger(__name__)
+
+ARROW_IPC_SUFFIXES = (".feather", ".arrow", ".ipc")
+CSV_SCHEMA_SIDECAR_SUFFIX = ".schema"
+DATASET_FILE_SUFFIXES = (".parquet", ".csv", ".xlsx", ".json", ".jsonl") + ARROW_IPC_SUFFIXES
+
+GLOB_CHARACTERS = ("*", "?", "[")
+# A hive partition directory, e.g. policy_year=2017
+PARTITION_DIRECTORY_PATTERN = re.compile(r"^(?P<key>[^=/]+)=(?P<value>[^/]*)$")
+INTEGER_PATTERN = re.compile(r"^-?\d+$")
+
+# Row filters in the DNF format used by pyarrow and pandas.read_parquet: a list of (column, op, value) tuples that are
+# ANDed together, or a list of such lists that are ORed together.
+Filters = List[Any]
+
+FILTER_OPERATORS: Dict[str, Callable[[pd.Series, Any], pd.Series]] = {
+    "=": operator.eq,
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    ">": operator.gt,
+    "<=": operator.le,
+    ">=": operator.ge,
+    "in": lambda series, value: series.isin(value),
+    "not in": lambda series, value: ~series.isin(value),
+}
+
+
+def normalize_filters(filters: Optional[Filters]) -> List[List[Tuple[str, str, Any]]]:
+    """Normalize row filters to a list of conjunctions.
+
+    Args:
+        filters: Filters as a list of tuples, or a list of lists of tuples.
+
+    Returns:
+        A list of ORed conjunctions, each a list of ANDed (column, op, value) tuples.
+    """
+    if not filters:
+        return []
+    if isinstance(filters[0], tuple):
+        return [list(filters)]
+    return [list(conjunction) for conjunction in filters]
+
+
+def filter_columns(filters: Optional[Filters]) -> List[str]:
+    """List the columns referenced by row filters.
+
+    Args:
+        filters: Row filters.
+
+    Returns:
+        The referenced column names, in order of first appearance.
+    """
+    columns: List[str] = []
+    for conjunction in normalize_filters(filters):
+        for column, _, _ in conjunction:
+            if column not in columns:
+                columns.append(column)
+    return columns
+
+
+def columns_to_read(columns: Optional[List[str]], filters: Optional[Filters]) -> Optional[List[str]]:
+    """List the columns a reader must read to apply a projection and row filters: the projection plus any filtered
+    columns.
+
+    Args:
+        columns: Columns to keep. None keeps all columns.
+        filters: Row filters.
+
+    Returns:
+        The columns to read, or None to read all columns.
+    """
+    if columns is None:
+        return None
+    return columns + [column for column in filter_columns(filters) if column not in columns]
+
+
+def filters_to_arrow_expression(filters: Optional[Filters]) -> Optional[pc.Expression]:
+    """Convert row filters into a pyarrow dataset expression.
+
+    Args:
+        filters: Row filters.
+
+    Returns:
+        The filter expression, or None if there are no filters.
+    """
+    if not filters:
+        return None
+    return filters_to_expression(normalize_filters(filters))
+
+
+def apply_filters(df: pd.DataFrame, filters: Optional[Filters]) -> pd.DataFrame:
+    """Apply row filters to a dataframe that has already been read.
+
+    Used for formats whose readers cannot push filters down, so that every format honours the same filters.
+
+    Args:
+        df: Dataframe to filter.
+        filters: Row filters.
+
+    Returns:
+        The rows of df matching the filters.
+
+    Raises:
+        ValueError: If a filter uses an unsupported operator.
+    """
+    conjunctions = normalize_filters(filters)
+    if not conjunctions:
+        return df
+
+    mask = np.zeros(len(df), dtype=bool)
+    for conjunction in conjunctions:
+        conjunction_mask = np.ones(len(df), dtype=bool)
+        for column, op, value in conjunction:
+            if op not in FILTER_OPERATORS:
+                raise ValueError(f"Unsupported filter operator: {op}")
+            conjunction_mask &= FILTER_OPERATORS[op](df[column], value).to_numpy(dtype=bool)
+        mask |= conjunction_mask
+    return df[mask]
+
+
+def resolve_filesystem(path_to_data: str) -> Tuple[fs.FileSystem, str]:
+    """Resolve the pyarrow filesystem and the path within it for a local path or URI.
+
+    Args:
+        path_to_data: Local path or URI, e.g. s3://bucket/key.
+
+    Returns:
+        The filesystem and the path relative to it.
+    """
+    if "://" in path_to_data:
+        return fs.FileSystem.from_uri(path_to_data)
+    return fs.LocalFileSystem(), path_to_data
+
+
+def read_arrow_ipc(
+    path_to_data: str, columns: Optional[List[str]] = None, filters: Optional[Filters] = None
+) -> pa.Table:
+    """Read an Arrow IPC (Feather v2) file into an Arrow table.
+
+    Local files are memory-mapped, so the table's buffers point straight into the page cache: selecting columns
+    copies nothing, and processes reading the same file share one copy of it. Filtering has to copy the selected rows.
+
+    Args:
+        path_to_data: Local path or URI of the file.
+        columns: Columns to read. None reads all columns.
+        filters: Row filters.
+
+    Returns:
+        The Arrow table.
+    """
+    read_columns = columns_to_read(columns, filters)
+    if "://" in path_to_data:
+        filesystem, path = resolve_filesystem(path_to_data)
+        with filesystem.open_input_file(path) as source:
+            table = feather.read_table(source, columns=read_columns, memory_map=False)
+    else:
+        # The IPC file reader wraps the mapped pages directly, whereas feather.read_table copies them into the Arrow
+        # memory pool even when memory_map is set
+        with pa.memory_map(path_to_data) as source:
+            table = pa.ipc.open_file(source).read_all()
+        if read_columns is not None:
+            table = table.select(read_columns)
+
+    return filter_table(table, columns, filters)
+
+
+def filter_table(table: pa.Table, columns: Optional[List[str]], filters: Optional[Filters]) -> pa.Table:
+    """Apply row filters and a column projection to an Arrow table that has already been read.
+
+    Args:
+        table: The Arrow table.
+        columns: Columns to keep. None keeps all columns.
+        filters: Row filters.
+
+    Returns:
+        The filtered and projected table.
+    """
+    expression = filters_to_arrow_expression(filters)
+    if expression is not None:
+        table = ds.dataset(table).to_table(filter=expression)
+    if columns is not None:
+        table = table.select(columns)
+    return table
+
+
+def read_csv_arrow(
+    path_to_data: str,
+    columns: Optional[List[str]] = None,
+    filters: Optional[Filters] = None,
+    cache_schema: bool = True,
+) -> pa.Table:
+    """Read a CSV file with the multithreaded Arrow CSV parser.
+
+    The column types inferred on the first read of a local file are stored in a sidecar file next to it, and later
+    reads pass them to the parser so that type inference is skipped. If the cached types no longer fit the file, the
+    types are inferred again and the sidecar is rewritten.
+
+    Args:
+        path_to_data: Local path or URI of the file.
+        columns: Columns to read. None reads all columns.
+        filters: Row filters.
+        cache_schema: Whether to use and maintain the schema sidecar. Only local files have a sidecar.
+
+    Returns:
+        The Arrow table.
+    """
+    sidecar_path = f"{path_to_data}{CSV_SCHEMA_SIDECAR_SUFFIX}" if cache_schema and "://" not in path_to_data else None
+    cached_schema = _read_schema_sidecar(sidecar_path)
+    read_columns = columns_to_read(columns, filters)
+
+    start = time.perf_counter()
+    try:
+        table = _read_csv_arrow(path_to_data, read_columns, cached_schema)
+    except pa.ArrowInvalid as error:
+        if cached_schema is None:
+            raise error
+        logger.warning(f"Cached CSV schema in {sidecar_path} does not fit {path_to_data}, inferring it again: {error}")
+        cached_schema = None
+        table = _read_csv_arrow(path_to_data, read_columns, cached_schema)
+    elapsed = time.perf_counter() - start
+
+    logger.info(
+        f"Read {table.num_rows} rows from {path_to_data} in {elapsed:.2f}s "
+        f"({table.num_rows / max(elapsed, 1e-9):,.0f} rows/s, schema {'cached' if cached_schema else 'inferred'})"
+    )
+    if sidecar_path is not None:
+        _write_schema_sidecar(sidecar_path, table.schema, cached_schema)
+
+    return filter_table(table, columns, filters)
+
+
+def _read_csv_arrow(path_to_data: str, columns: Optional[List[str]], schema: Optional[pa.Schema]) -> pa.Table:
+    """Parse a CSV file with Arrow, using the given column types where available.
+
+    Args:
+        path_to_data: Local path or URI of the file.
+        columns: Columns to read. None reads all columns.
+        schema: Known column types. Columns missing from it are inferred.
+
+    Returns:
+        The Arrow table.
+    """
+    convert_options = pacsv.ConvertOptions(
+        column_types={field.name: field.type for field in schema} if schema is not None else None,
+        include_columns=columns,
+    )
+    read_options = pacsv.ReadOptions(use_threads=True)
+    with fsspec.open(path_to_data, "rb") as source:
+        return pacsv.read_csv(source, read_options=read_options, convert_options=convert_options)
+
+
+def _read_schema_sidecar(sidecar_path: Optional[str]) -> Optional[pa.Schema]:
+    """Read the column types cached in a schema sidecar file.
+
+    Args:
+        sidecar_path: Path of the sidecar file, or None.
+
+    Returns:
+        The cached schema, or None if there is no sidecar.
+    """
+    if sidecar_path is None or not os.path.exists(sidecar_path):
+        return None
+    with open(sidecar_path, "rb") as f:
+        return pa.ipc.read_schema(pa.py_buffer(f.read()))
+
+
+def _write_schema_sidecar(sidecar_path: str, schema: pa.Schema, cached_schema: Optional[pa.Schema]) -> None:
+    """Store column types in a schema sidecar file, keeping cached types of columns that were not read this time.
+
+    Args:
+        sidecar_path: Path of the sidecar file.
+        schema: Column types of the table just read.
+        cached_schema: Column types previously cached, or None.
+    """
+    fields = {field.name: field for field in (cached_schema or [])}
+    if cached_schema is not None and all(fields.get(field.name) == field for field in schema):
+        return
+    fields.update({field.name: field for field in schema})
+    with open(sidecar_path, "wb") as f:
+        f.write(pa.schema(list(fields.values())).serialize().to_pybytes())
+
+
+def open_arrow_ipc(path_to_data: str) -> pa.NativeFile:
+    """Open an Arrow IPC (Feather v2) file for random access, without reading it.
+
+    Args:
+        path_to_data: Local path or URI of the file.
+
+    Returns:
+        The memory-mapped local file, or the remote file opened on its filesystem.
+    """
+    if "://" in path_to_data:
+        filesystem, path = resolve_filesystem(path_to_data)
+        return filesystem.open_input_file(path)
+    return pa.memory_map(path_to_data)
+
+
+def arrow_ipc_bytes_per_row(path_to_data: str, columns: Optional[List[str]] = None) -> float:
+    """Estimate the in-memory size of one row of an Arrow IPC (Feather v2) file from its first record batch.
+
+    Only the first record batch is read, so a remote file is not downloaded to estimate its rows' size.
+
+    Args:
+        path_to_data: Local path or URI of the file.
+        columns: Columns that will be read. None counts all columns.
+
+    Returns:
+        The average number of bytes per row.
+    """
+    with open_arrow_ipc(path_to_data) as source:
+        reader = pa.ipc.open_file(source)
+        if not reader.num_record_batches:
+            return 0.0
+        table = pa.Table.from_batches([reader.get_batch(0)])
+    if columns is not None:
+        table = table.select(columns)
+    return table.nbytes / max(table.num_rows, 1)
+
+
+def iter_arrow_ipc_batches(
+    path_to_data: str, batch_size_rows: int, columns: Optional[List[str]] = None, filters: Optional[Filters] = None
+) -> Iterator[pa.Table]:
+    """Stream an Arrow IPC (Feather v2) file as tables of at most batch_size_rows rows.
+
+    Local files are memory-mapped. Remote files are opened on their filesystem, and each record batch is read from it
+    only when reached.
+
+    Args:
+        path_to_data: Local path or URI of the file.
+        batch_size_rows: Maximum number of rows per batch.
+        columns: Columns to read. None reads all columns.
+        filters: Row filters.
+
+    Yields:
+        The file, one Arrow table slice at a time.
+    """
+    expression = filters_to_arrow_expression(filters)
+    with open_arrow_ipc(path_to_data) as source:
+        reader = pa.ipc.open_file(source)
+        for i in range(reader.num_record_batches):
+            record_batch = reader.get_batch(i)
+            for offset in range(0, record_batch.num_rows, batch_size_rows):
+                table = pa.Table.from_batches([record_batch.slice(offset, batch_size_rows)])
+                if expression is not None:
+                    table = ds.dataset(table).to_table(filter=expression)
+                if columns is not None:
+                    table = table.select(columns)
+                if table.num_rows:
+                    yield table
+
+
+def arrow_table_to_pandas(table: pa.Table) -> pd.DataFrame:
+    """Convert an Arrow table to pandas with as few copies as possible.
+
+    Each column becomes its own pandas block instead of being consolidated with the other columns of its dtype, which
+    lets numeric columns without nulls wrap the Arrow buffers (and so a memory-mapped file) without copying.
+
+    Args:
+        table: The Arrow table.
+
+    Returns:
+        The pandas DataFrame.
+    """
+    return table.to_pandas(split_blocks=True)
+
+
+def write_arrow_ipc(data: Union[pd.DataFrame, pa.Table], path: str) -> None:
+    """Write a dataset as an uncompressed Arrow IPC (Feather v2) file.
+
+    The file is left uncompressed so that it can be memory-mapped and read without decoding.
+
+    Args:
+        data: The dataset, as a pandas DataFrame or an Arrow table.
+        path: Destination path.
+    """
+    feather.write_feather(data, path, compression="uncompressed")
+
+
+def dictionary_encode_columns(table: pa.Table, columns: List[str]) -> pa.Table:
+    """Dictionary-encode columns of an Arrow table, so they convert to pandas categoricals without creating a Python
+    string per row.
+
+    Args:
+        table: The Arrow table.
+        columns: Columns to encode. Columns missing from the table or already encoded are skipped.
+
+    Returns:
+        The table with the columns encoded.
+    """
+    for column in columns:
+        index = table.schema.get_field_index(column)
+        if index >= 0 and not pa.types.is_dictionary(table.schema.field(index).type):
+            table = table.set_column(index, column, pc.dictionary_encode(table.column(index)))
+    return table
+
+
+def apply_dtype_plan(df: pd.DataFrame, dtype_plan: LoadTimeDtypes) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Apply a load-time dtype plan to a dataframe, and report the memory it saves.
+
+    Categorical columns that were read dictionary-encoded are already categoricals, so for them the memory before is
+    what the column would have taken as Python strings. A column is only kept categorical if that is smaller, which
+    it is not for short columns, whose categories cost more than their codes save. Columns missing from df are skipped.
+
+    Args:
+        df: The dataframe, modified in place.
+        dtype_plan: The dtype plan.
+
+    Returns:
+        The dataframe, and a report of the bytes used by each column before and after the plan was applied.
+    """
+    report = {}
+    for column in dtype_plan.categorical:
+        if column in df.columns:
+            before = _object_memory_usage(df[column])
+            categorical = df[column].astype("category")
+            if categorical.memory_usage(index=False, deep=True) < before:
+                df[column] = categorical
+            elif isinstance(df[column].dtype, pd.CategoricalDtype):
+                df[column] = df[column].astype(object)
+            report[column] = (str(df[column].dtype), before, df[column].memory_usage(index=False, deep=True))
+    for downcast, columns in (("integer", dtype_plan.downcast_integer), ("float", dtype_plan.downcast_float)):
+        for column in columns:
+            if column in df.columns:
+                before = df[column].memory_usage(index=False, deep=True)
+                df[column] = pd.to_numeric(df[column], downcast=downcast)
+                report[column] = (str(df[column].dtype), before, df[column].memory_usage(index=False, deep=True))
+
+    report_df = pd.DataFrame.from_dict(report, orient="index", columns=["dtype", "bytes_before", "bytes_after"])
+    report_df["bytes_saved"] = report_df["bytes_before"] - report_df["bytes_after"]
+    return df, report_df
+
+
+def _object_memory_usage(series: pd.Series) -> int:
+    """Memory a column takes, or would take, as a pandas object column.
+
+    Matches `memory_usage(deep=True)` for object columns, but is computed from the categories and their counts when
+    the column is already categorical, without materializing a Python object per row.
+
+    Args:
+        series: The column.
+
+    Returns:
+        The size in bytes.
+    """
+    if not isinstance(series.dtype, pd.CategoricalDtype):
+        return int(series.memory_usage(index=False, deep=True))
+    codes = series.cat.codes.to_numpy()
+    counts = np.bincount(codes[codes >= 0], minlength=len(series.cat.categories))
+    category_sizes = np.array([sys.getsizeof(category) for category in series.cat.categories], dtype=np.int64)
+    missing_size = sys.getsizeof(np.nan) * int((codes < 0).sum())
+    return int(len(series) * np.dtype(object).itemsize + counts @ category_sizes + missing_size)
+
+
+def is_multi_file_path(path_to_data: Union[str, List[str]]) -> bool:
+    """Does the path refer to more than a single file: a list of paths, a glob or a directory?
+
+    Args:
+        path_to_data: A path, URI or glob, or a list of them.
+
+    Returns:
+        True if the path refers to a multi-file dataset, and False otherwise.
+    """
+    if not isinstance(path_to_data, str):
+        return True
+    if any(character in path_to_data for character in GLOB_CHARACTERS):
+        return True
+    if path_to_data.endswith(DATASET_FILE_SUFFIXES):
+        return False
+    filesystem, path = fsspec.core.url_to_fs(path_to_data)
+    return filesystem.isdir(path)
+
+
+def list_dataset_files(path_to_data: Union[str, List[str]]) -> List[str]:
+    """List the data files of a multi-file dataset.
+
+    Directories are searched recursively, and files without a supported extension, such as _SUCCESS markers, are
+    ignored. Globs are expanded, and the files are returned in sorted order so that reads are deterministic.
+
+    Args:
+        path_to_data: A directory, a glob, or a list of paths. Can be local or on S3.
+
+    Returns:
+        The paths of the data files, with the same protocol as the input.
+    """
+    if not isinstance(path_to_data, str):
+        return [file for path in path_to_data for file in list_dataset_files(path)]
+
+    filesystem, path = fsspec.core.url_to_fs(path_to_data)
+    if any(character in path_to_data for character in GLOB_CHARACTERS):
+        files = filesystem.glob(path)
+    elif filesystem.isdir(path):
+        files = filesystem.find(path)
+    else:
+        files = [path]
+    files = sorted(file for file in files if file.endswith(DATASET_FILE_SUFFIXES))
+    if "://" in path_to_data:
+        files = [filesystem.unstrip_protocol(file) for file in files]
+    return files
+
+
+def parse_partition_values(path_to_data: str) -> Dict[str, Any]:
+    """Parse the hive partition values encoded in a file path, e.g. .../policy_year=2017/lob=GL/part-0.parquet.
+
+    Values made of digits are returned as integers, and everything else as strings.
+
+    Args:
+        path_to_data: Path of a data file.
+
+    Returns:
+        The partition values, keyed by partition column, in path order.
+    """
+    values: Dict[str, Any] = {}
+    for directory in path_to_data.split("://")[-1].split("/")[:-1]:
+        match = PARTITION_DIRECTORY_PATTERN.match(directory)
+        if match:
+            value = match.group("value")
+            values[match.group("key")] = int(value) if INTEGER_PATTERN.match(value) else value
+    return values
+
+
+def bind_partition_filters(filters: Optional[Filters], partition_values: Dict[str, Any]) -> Optional[Filters]:
+    """Evaluate the parts of row filters that refer to partition columns, using the partition values of one file.
+
+    Args:
+        filters: Row filters.
+        partition_values: The partition values of the file.
+
+    Returns:
+        None if no row of the file can match the filters, so the file can be skipped. Otherwise the filters that still
+        have to be applied to the rows of the file, which are empty if every row matches.
+    """
+    conjunctions = normalize_filters(filters)
+    if not conjunctions:
+        return []
+
+    partition_row = pd.DataFrame({key: [value] for key, value in partition_values.items()})
+    bound = []
+    for conjunction in conjunctions:
+        partition_terms = [term for term in conjunction if term[0] in partition_values]
+        if partition_terms and not apply_filters(partition_row, partition_terms).shape[0]:
+            continue
+        row_terms = [term for term in conjunction if term[0] not in partition_values]
+        if not row_terms:
+            return []
+        bound.append(row_terms)
+    return bound or None
+
+
+def add_partition_columns(
+    table: pa.Table, partition_values: Dict[str, Any], columns: Optional[List[str]] = None
+) -> pa.Table:
+    """Append partition columns to the table read from one file of a partitioned dataset.
+
+    String values become dictionary-encoded columns with a single dictionary entry, so no value is repeated per row.
+
+    Args:
+        table: The table read from the file.
+        partition_values: The partition values of the file.
+        columns: Columns to keep. None keeps every partition column.
+
+    Returns:
+        The table with the partition columns appended.
+    """
+    for key, value in partition_values.items():
+        if key in table.column_names or (columns is not None and key not in columns):
+            continue
+        if isinstance(value, str):
+            indices = pa.array(np.zeros(table.num_rows, dtype=np.int32))
+            array = pa.DictionaryArray.from_arrays(indices, pa.array([value]))
+        else:
+            array = pa.array(np.full(table.num_rows, value))
+        table = table.append_column(key, array)
+    if columns is not None:
+        table = table.select(columns)
+    return table
@@ -0,0 +1,137 @@
+"""Copyright (c) 2022, Liberty Mutual Group."""
+import hashlib
+import json
+import logging
+import os
+import uuid
+from pathlib import Path
+from typing import Callable, Optional
+
+import fsspec
+import pandas as pd
+
+from pipeline import settings
+from pipeline.acquisition.acquire_data_utils import write_arrow_ipc
+from pipeline.config.constants import (
+    BASE_PATH,
+    DATASET_CACHE_DIR,
+    DATASET_CACHE_ENABLED,
+    DATASET_CACHE_MAX_SIZE_GB,
+)
+
+logger = logging.getLogger(__name__)
+
+CACHE_FILE_SUFFIX = ".feather"
+
+# File info fields that change whenever a remote object is rewritten, across the fsspec filesystem implementations
+VERSION_INFO_FIELDS = ("ETag", "etag", "size", "LastModified", "last_modified", "mtime", "updated", "created")
+
+
+def is_remote_path(path_to_data: str) -> bool:
+    """Is the path a URI on a remote filesystem, e.g. s3://?
+
+    Args:
+        path_to_data: Local path or URI.
+
+    Returns:
+        True if the data lives on a remote filesystem, and False otherwise.
+    """
+    return "://" in path_to_data and not path_to_data.startswith("file://")
+
+
+class DatasetCache:
+    """Size-bounded, content-addressed local cache of remote datasets.
+
+    Entries are keyed by the source URI plus the version information reported by its filesystem (ETag, size and
+    modification time), so a rewritten source is fetched again while repeat reads of an unchanged source are served
+    from local disk. Entries are stored as uncompressed Arrow IPC (Feather) files, and the least recently used entries
+    are evicted once the cache grows beyond its size limit.
+    """
+
+    def __init__(self, cache_dir: Path, max_size_bytes: int):
+        self.cache_dir = Path(cache_dir)
+        self.max_size_bytes = max_size_bytes
+
+    def cache_key(self, uri: str) -> str:
+        """Compute the cache key for a source.
+
+        Args:
+            uri: URI of the source dataset.
+
+        Returns:
+            A hex digest identifying the current version of the source.
+        """
+        filesystem, path = fsspec.core.url_to_fs(uri)
+        info = filesystem.info(path)
+        version = {field: info[field] for field in VERSION_INFO_FIELDS if field in info}
+        fingerprint = json.dumps([uri, version], sort_keys=True, default=str)
+        return hashlib.sha256(fingerprint.encode("utf-8")).hexdigest()
+
+    def fetch(self, uri: str, load: Callable[[], pd.DataFrame]) -> Path:
+        """Return the local cached copy of a source, loading and storing it on a cache miss.
+
+        Args:
+            uri: URI of the source dataset.
+            load: Loads the full source dataset; only called on a cache miss.
+
+        Returns:
+            Path to the local Feather file holding the dataset.
+        """
+        path = self.cache_dir / f"{self.cache_key(uri)}{CACHE_FILE_SUFFIX}"
+        if path.exists():
+            logger.info(f"Dataset cache hit for {uri}: {path}")
+            # Refresh the modification time, which orders entries for LRU eviction
+            os.utime(path)
+            return path
+
+        logger.info(f"Dataset cache miss for {uri}, fetching it into {path}")
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file first so that concurrent readers never see a partially written entry
+        temp_path = path.with_suffix(f".{uuid.uuid4().hex}.tmp")
+        try:
+            write_arrow_ipc(load(), str(temp_path))
+            os.replace(temp_path, path)
+        finally:
+            if temp_path.exists():
+                temp_path.unlink()
+
+        self.evict(keep=path)
+        return path
+
+    def size_bytes(self) -> int:
+        """Total size of the cache entries.
+
+        Returns:
+            The size in bytes.
+        """
+        return sum(entry.stat().st_size for entry in self.cache_dir.glob(f"*{CACHE_FILE_SUFFIX}"))
+
+    def evict(self, keep: Optional[Path] = None) -> None:
+        """Delete the least recently used entries until the cache fits within its size limit.
+
+        Args:
+            keep: An entry that must not be evicted, e.g. the one just written.
+        """
+        entries = sorted(self.cache_dir.glob(f"*{CACHE_FILE_SUFFIX}"), key=lambda entry: entry.stat().st_mtime)
+        total_size = sum(entry.stat().st_size for entry in entries)
+        for entry in entries:
+            if total_size <= self.max_size_bytes:
+                break
+            if entry == keep:
+                continue
+            logger.info(f"Evicting {entry} from the dataset cache")
+            total_size -= entry.stat().st_size
+            entry.unlink()
+
+
+def get_default_dataset_cache() -> Optional[DatasetCache]:
+    """Create the dataset cache configured in settings.ini.
+
+    Returns:
+        The dataset cache, or None if caching is disabled.
+    """
+    if not settings.bool(DATASET_CACHE_ENABLED, False):
+        return None
+    cache_dir = Path(BASE_PATH) / settings.str(DATASET_CACHE_DIR)
+    max_size_bytes = int(float(settings.str(DATASET_CACHE_MAX_SIZE_GB)) * 1024**3)
+    return DatasetCache(cache_dir, max_size_bytes)
@@ -4,10 +4,55 @@ from pathlib import Path
 BASE_PATH = Path(__file__).resolve().parents[2]
 
 MODEL_ARTIFACT = Path(BASE_PATH) / "data" / "temp" / "artifacts" / "mlflow" / "model.pkl"
+FEATURE_PIPELINE_ARTIFACT = Path(BASE_PATH) / "data" / "temp" / "artifacts" / "mlflow" / "feature_pipeline.pkl"
 MODEL_METRICS_ARTIFACT = Path(BASE_PATH) / "data" / "temp" / "artifacts" / "mlflow" / "model_metrics.pkl"
 
+# Splits and features written by out-of-core feature engineering
+OUT_OF_CORE_DATA_DIR = Path(BASE_PATH) / "data" / "temp" / "out_of_core"
+
+# Results of the latest feature engineering benchmark (run_benchmark.py)
+BENCHMARK_RESULTS_ARTIFACT = Path(BASE_PATH) / "data" / "temp" / "benchmarks" / "results.json"
+
 DATABRICKS_GROUP_NAME = "DATABRICKS_GROUP_NAME"
 DATABRICKS_EXPERIMENT_NAME = "DATABRICKS_EXPERIMENT_NAME"
 DATABRICKS_REGISTERED_MODEL_NAME = "DATABRICKS_REGISTERED_MODEL_NAME"
 
 ENFORCE_CLEAN_WORKSPACE = "ENFORCE_CLEAN_WORKSPACE"
+
+DATASET_CACHE_ENABLED = "DATASET_CACHE_ENABLED"
+DATASET_CACHE_DIR = "DATASET_CACHE_DIR"
+DATASET_CACHE_MAX_SIZE_GB = "DATASET_CACHE_MAX_SIZE_GB"
+
+FEATURE_CACHE_ENABLED = "FEATURE_CACHE_ENABLED"
+FEATURE_CACHE_DIR = "FEATURE_CACHE_DIR"
+FEATURE_CACHE_MAX_SIZE_GB = "FEATURE_CACHE_MAX_SIZE_GB"
+
+TRAINING_MODE = "TRAINING_MODE"
+DEV_SAMPLE_SIZE = "DEV_SAMPLE_SIZE"
+DEV_SAMPLE_SEED = "DEV_SAMPLE_SEED"
+DEV_TIME_LIMIT_S = "DEV_TIME_LIMIT_S"
+DEV_PRESETS = "DEV_PRESETS"
+DEV_HYPERPARAMETERS = "DEV_HYPERPARAMETERS"
+
+FEATURE_BATCH_SIZE_ROWS = "FEATURE_BATCH_SIZE_ROWS"
+FEATURE_N_WORKERS = "FEATURE_N_WORKERS"
+FEATURE_PROFILING_ENABLED = "FEATURE_PROFILING_ENABLED"
+
+# Training modes: full trains on all the training data, dev on a small stratified sample with a short time limit
+TRAINING_MODE_FULL = "full"
+TRAINING_MODE_DEV = "dev"
+
+BACKTEST_N_FOLDS = "BACKTEST_N_FOLDS"
+BACKTEST_WINDOW = "BACKTEST_WINDOW"
+BACKTEST_WINDOW_YEARS = "BACKTEST_WINDOW_YEARS"
+BACKTEST_MAX_WORKERS = "BACKTEST_MAX_WORKERS"
+BACKTEST_CPUS_PER_FOLD = "BACKTEST_CPUS_PER_FOLD"
+BACKTEST_MEMORY_PER_FOLD_GB = "BACKTEST_MEMORY_PER_FOLD_GB"
+
+BENCHMARK_N_ROWS = "BENCHMARK_N_ROWS"
+BENCHMARK_NLP_MAX_ROWS = "BENCHMARK_NLP_MAX_ROWS"
+BENCHMARK_BASELINE_PATH = "BENCHMARK_BASELINE_PATH"
+BENCHMARK_REGRESSION_THRESHOLD = "BENCHMARK_REGRESSION_THRESHOLD"
+
+# Policy year held out as the test set; earlier years are used for training
+TEST_POLICY_YEAR = 2017
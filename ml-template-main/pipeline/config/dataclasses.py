@@ -1,5 +1,6 @@
 import logging
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import List, Union
 import pandas as pd
 
 logger = logging.getLogger(__name__)
@@ -41,6 +42,56 @@ class NumericalFeatures:
     exposure_amount = "exposure_amount"
 
 
+@dataclass()
+class LoadTimeDtypes:
+    """
+    Dtype plan applied while the raw dataset is loaded. Categorical features are read dictionary-encoded, and kept
+    categorical where that saves memory, and integer and float features are downcast to the narrowest type that holds
+    their values.
+    """
+    categorical: List[str] = field(
+        default_factory=lambda: [
+            ModellingFeatures.state,
+            ModellingFeatures.industry,
+            ModellingFeatures.exposure_base,
+            NonModellingFeatures.lob,
+        ]
+    )
+    downcast_integer: List[str] = field(
+        default_factory=lambda: [
+            ModellingFeatures.has_10k,
+            NonModellingFeatures.policy_year,
+            TargetFeature.target,
+        ]
+    )
+    # exposure_amt stays float64: float32 rounds it by up to ~5e-4, and serving data is not loaded through this plan, so
+    # training and serving would see different values
+    downcast_float: List[str] = field(default_factory=list)
+
+
+def feature_names(*feature_classes: Union[type, List[str]]) -> List[str]:
+    """
+    Lists the column names declared on one or more feature dataclasses, in declaration order and without duplicates.
+
+    Args:
+        feature_classes: Feature dataclasses such as ModellingFeatures or TargetFeature, or lists of column names such
+            as NLPFeatures.
+
+    Returns:
+        List[str]: The column names.
+    """
+    names = []
+    for feature_class in feature_classes:
+        if isinstance(feature_class, list):
+            values = feature_class
+        else:
+            values = [value for attribute, value in vars(feature_class).items() if not attribute.startswith("_")]
+        for value in values:
+            if isinstance(value, str) and value not in names:
+                names.append(value)
+    return names
+
+
 @dataclass()
 class TrainTestHoldoutSplit:
     """
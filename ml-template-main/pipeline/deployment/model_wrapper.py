@@ -7,7 +7,7 @@ import pandas as pd
 from autogluon.tabular import TabularPredictor
 from lit_ds_utils.decorate.logging import log_function
 
-from ..features.feature_engineering import do_feature_engineering
+from ..features.feature_pipeline import FeaturePipeline
 
 logger = logging.getLogger(__name__)
 
@@ -17,6 +17,8 @@ class ModelWrapper(mlflow.pyfunc.PythonModel):
 
     def load_context(self, context):
         self.model = TabularPredictor.load(context.artifacts["predictor_path"])
+        # Load the fitted feature pipeline once, so each predict call only transforms
+        self.feature_pipeline = FeaturePipeline.load(context.artifacts["feature_pipeline"])
 
     @log_function()
     def predict(self, context: Any, input_data: pd.DataFrame) -> pd.Series:
@@ -31,7 +33,7 @@ class ModelWrapper(mlflow.pyfunc.PythonModel):
         Returns:
             The model predictions.
         """
-        processed_df = do_feature_engineering(input_data)
+        processed_df = self.feature_pipeline.transform(input_data)
         logger.debug("processed_df shape {}".format(processed_df.shape))
 
         probability_scores = pd.Series(self.model.predict_proba(processed_df)[1])
@@ -39,7 +41,7 @@ class ModelWrapper(mlflow.pyfunc.PythonModel):
         return probability_scores
 
     def predict_class(self, input_data: pd.DataFrame) -> pd.Series:
-        processed_df = do_feature_engineering(input_data, training=False)
+        processed_df = self.feature_pipeline.transform(input_data)
         logger.debug("processed_df shape {}".format(processed_df.shape))
 
         preds = pd.Series(self.model.predict(processed_df))
@@ -0,0 +1,315 @@
+"""Copyright (c) 2022, Liberty Mutual Group."""
+import logging
+from typing import Any, Dict, List
+
+import numpy as np
+import pandas as pd
+from sklearn.base import BaseEstimator, TransformerMixin
+
+logger = logging.getLogger(__name__)
+
+
+class CategoryLookupTable:
+    """Derives several grouped columns from one categorical column, with one array gather per derived column.
+
+    The groupings are compiled once into integer lookup tables, one per derived column, holding the code of each
+    source category's group. A lookup maps the (few) categories of the source column to their group codes, and then
+    gathers those codes for every row by the row's categorical code, so no per-row dictionary work is done.
+
+    As with `Series.replace`, values missing from a grouping are kept unchanged and missing values stay missing.
+
+    Args:
+        groupings: Maps each derived column to its grouping, which maps source values to groups.
+    """
+
+    def __init__(self, groupings: Dict[str, Dict[str, str]]):
+        self.groupings = groupings
+        self.keys = pd.Index(sorted(set().union(*groupings.values())))
+        self.group_categories = {}
+        self.group_codes = {}
+        for column, grouping in groupings.items():
+            categories = pd.Index(sorted(set(grouping.values())))
+            self.group_categories[column] = categories
+            # Code of each key's group, or -1 if the key is not in this grouping
+            self.group_codes[column] = categories.get_indexer([grouping.get(key) for key in self.keys])
+
+    def lookup(self, values: pd.Series) -> Dict[str, pd.Categorical]:
+        """Derive the grouped columns of a source column.
+
+        Args:
+            values: The source column.
+
+        Returns:
+            The derived columns, as categoricals, keyed by column name.
+        """
+        values = values.astype("category")
+        categories = values.cat.categories
+        codes = values.cat.codes.to_numpy()
+        positions = self.keys.get_indexer(categories)
+        known = positions >= 0
+
+        derived = {}
+        for column, group_codes in self.group_codes.items():
+            category_codes = np.where(known, group_codes[positions], -1)
+            output_categories = self.group_categories[column]
+            unknown = category_codes < 0
+            if unknown.any():
+                # Values without a group keep their own value
+                unknown_categories = categories[unknown]
+                output_categories = output_categories.append(unknown_categories.difference(output_categories))
+                category_codes[unknown] = output_categories.get_indexer(unknown_categories)
+            # Missing values have code -1, which gathers the trailing -1
+            lookup_codes = np.append(category_codes, -1).astype(np.int8 if len(output_categories) < 128 else np.int32)
+            derived[column] = pd.Categorical.from_codes(lookup_codes[codes], categories=output_categories)
+        return derived
+
+
+class FixedSchemaOneHotEncoder(BaseEstimator, TransformerMixin):
+    """One-hot encodes categorical features into a fixed set of columns learned when fitting.
+
+    The output columns are named like `pd.get_dummies` names them (feature_value) and always come in the same order,
+    whatever values a frame contains, so training, test and single-row serving frames line up without reindexing.
+    Unseen and missing values are encoded as all zeros. The indicators are written straight into one preallocated
+    block, rather than a dense column per level being allocated and concatenated. `partial_fit` adds the levels of
+    each batch of a dataset that is streamed in batches.
+
+    Args:
+        features: The features to encode.
+        output: Type of the indicator columns: "uint8", "bool", or "sparse" for pandas sparse uint8 columns.
+    """
+
+    OUTPUT_TYPES = ("uint8", "bool", "sparse")
+
+    def __init__(self, features: List[str], output: str = "uint8"):
+        self.features = features
+        self.output = output
+
+    def fit(self, input_data: pd.DataFrame, y=None):
+        if self.output not in self.OUTPUT_TYPES:
+            raise ValueError(f"Unknown one-hot output type: {self.output}")
+        self.categories_ = {feature: self._categories(input_data[feature]) for feature in self.features}
+        self._update_feature_names()
+        return self
+
+    def partial_fit(self, input_data: pd.DataFrame, y=None):
+        if not hasattr(self, "categories_"):
+            return self.fit(input_data)
+        for feature in self.features:
+            known = self.categories_[feature]
+            categories = self._categories(input_data[feature])
+            if isinstance(input_data[feature].dtype, pd.CategoricalDtype):
+                # Keep the order of the categoricals' categories, with levels not seen before at the end
+                self.categories_[feature] = known.append(categories.difference(known, sort=False))
+            else:
+                self.categories_[feature] = known.union(categories)
+        self._update_feature_names()
+        return self
+
+    def _update_feature_names(self) -> None:
+        self.feature_names_out_ = [
+            f"{feature}_{category}" for feature, categories in self.categories_.items() for category in categories
+        ]
+
+    @staticmethod
+    def _categories(values: pd.Series) -> pd.Index:
+        """The levels of a feature.
+
+        Args:
+            values: The feature.
+
+        Returns:
+            All the categories of a categorical, as `pd.get_dummies` encodes them, or else the values seen, sorted.
+        """
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            return values.cat.categories
+        return pd.Index(values.dropna().unique()).sort_values()
+
+    def get_feature_names_out(self, input_features=None) -> np.ndarray:
+        return np.asarray(self.feature_names_out_, dtype=object)
+
+    def transform(self, input_data: pd.DataFrame) -> pd.DataFrame:
+        n_rows = len(input_data)
+        row_indices = []
+        column_indices = []
+        offset = 0
+        for feature, categories in self.categories_.items():
+            values = input_data[feature].astype("category")
+            # Output column of each category of the frame, or -1 if it was not seen when fitting
+            category_columns = categories.get_indexer(values.cat.categories)
+            category_columns[category_columns >= 0] += offset
+            # Missing values have code -1, which gathers the trailing -1
+            columns = np.append(category_columns, -1)[values.cat.codes.to_numpy()]
+            encoded = columns >= 0
+            row_indices.append(np.flatnonzero(encoded))
+            column_indices.append(columns[encoded])
+            offset += len(categories)
+
+        rows = np.concatenate(row_indices) if row_indices else np.empty(0, dtype=np.int64)
+        columns = np.concatenate(column_indices) if column_indices else np.empty(0, dtype=np.int64)
+        if self.output == "sparse":
+            from scipy.sparse import csc_matrix
+
+            block = csc_matrix((np.ones(len(rows), dtype=np.uint8), (rows, columns)), shape=(n_rows, offset))
+            encoded_df = pd.DataFrame.sparse.from_spmatrix(
+                block, index=input_data.index, columns=self.feature_names_out_
+            )
+        else:
+            block = np.zeros((n_rows, offset), dtype=np.uint8 if self.output == "uint8" else bool)
+            block[rows, columns] = 1
+            encoded_df = pd.DataFrame(block, index=input_data.index, columns=self.feature_names_out_, copy=False)
+
+        return pd.concat([input_data.drop(columns=self.features), encoded_df], axis=1, copy=False)
+
+
+class MEstimateTargetEncoder(BaseEstimator, TransformerMixin):
+    """Replaces categorical features by the M-estimate of the target mean of each category.
+
+    Each category is encoded as (target sum + m * prior) / (count + m), where the prior is the overall target mean, so
+    rare categories are shrunk towards the prior. Unseen and missing values are encoded as the prior. This matches
+    `category_encoders.MEstimateEncoder` with its default settings. The encodings are held in one array per feature,
+    with the prior in the last slot, and are applied by gathering with the rows' categorical codes.
+
+    The encoder keeps the sufficient statistics of the encodings (the target count and sum of each category), so it
+    can be updated with new data in `partial_fit`, in time proportional to the new rows, and encoders fitted on
+    separate partitions can be combined exactly with `merge`. `to_dict` and `from_dict` serialize the statistics.
+
+    Args:
+        features: The features to encode.
+        m: Additive smoothing; the weight of the prior, in rows.
+    """
+
+    def __init__(self, features: List[str], m: float = 1.0):
+        self.features = features
+        self.m = m
+
+    def fit(self, input_data: pd.DataFrame, y: pd.Series):
+        self._reset_statistics()
+        return self.partial_fit(input_data, y)
+
+    def partial_fit(self, input_data: pd.DataFrame, y: pd.Series):
+        if not hasattr(self, "target_count_"):
+            self._reset_statistics()
+        y = pd.Series(y, index=input_data.index, dtype=np.float64)
+        self.target_sum_ += y.sum()
+        self.target_count_ += int(y.count())
+        for feature in self.features:
+            stats = y.groupby(input_data[feature], observed=True, sort=False).agg(["sum", "count"])
+            self._add_statistics(
+                feature, pd.Index(stats.index.tolist()), stats["sum"].to_numpy(), stats["count"].to_numpy()
+            )
+        self._update_encodings()
+        return self
+
+    def merge(self, other: "MEstimateTargetEncoder") -> "MEstimateTargetEncoder":
+        """Add the statistics of an encoder fitted on other data, e.g. another partition.
+
+        Args:
+            other: The other encoder.
+
+        Returns:
+            This encoder, now encoding as if fitted on both encoders' data.
+
+        Raises:
+            ValueError: If the encoders have different features or smoothing.
+        """
+        if list(other.features) != list(self.features) or other.m != self.m:
+            raise ValueError("Only target encoders with the same features and smoothing can be merged")
+        if not hasattr(self, "target_count_"):
+            self._reset_statistics()
+        self.target_sum_ += other.target_sum_
+        self.target_count_ += other.target_count_
+        for feature in self.features:
+            self._add_statistics(feature, other.categories_[feature], other.sums_[feature], other.counts_[feature])
+        self._update_encodings()
+        return self
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialize the encoder's settings and statistics to JSON-compatible types.
+
+        Returns:
+            The serialized encoder.
+        """
+        return {
+            "features": list(self.features),
+            "m": self.m,
+            "target_sum": float(self.target_sum_),
+            "target_count": int(self.target_count_),
+            "statistics": {
+                feature: {
+                    "categories": self.categories_[feature].tolist(),
+                    "sums": self.sums_[feature].tolist(),
+                    "counts": self.counts_[feature].tolist(),
+                }
+                for feature in self.features
+            },
+        }
+
+    @classmethod
+    def from_dict(cls, serialized: Dict[str, Any]) -> "MEstimateTargetEncoder":
+        """Deserialize an encoder serialized by `to_dict`.
+
+        Args:
+            serialized: The serialized encoder.
+
+        Returns:
+            The fitted encoder.
+        """
+        encoder = cls(features=serialized["features"], m=serialized["m"])
+        encoder._reset_statistics()
+        encoder.target_sum_ = serialized["target_sum"]
+        encoder.target_count_ = serialized["target_count"]
+        for feature, statistics in serialized["statistics"].items():
+            encoder._add_statistics(
+                feature,
+                pd.Index(statistics["categories"]),
+                np.asarray(statistics["sums"], dtype=np.float64),
+                np.asarray(statistics["counts"], dtype=np.int64),
+            )
+        encoder._update_encodings()
+        return encoder
+
+    def transform(self, input_data: pd.DataFrame) -> pd.DataFrame:
+        # The encoded columns replace the features' columns, so a shallow copy leaves the caller's frame unchanged
+        input_data = input_data.copy(deep=False)
+        for feature in self.features:
+            values = input_data[feature].astype("category")
+            # Unseen categories have position -1, which gathers the prior in the last slot
+            category_encodings = self.encodings_[feature][self.categories_[feature].get_indexer(values.cat.categories)]
+            # Missing values have code -1, which gathers the trailing prior
+            lookup = np.append(category_encodings, self.prior_)
+            input_data[feature] = lookup[values.cat.codes.to_numpy()]
+        return input_data
+
+    def _reset_statistics(self) -> None:
+        self.target_sum_ = 0.0
+        self.target_count_ = 0
+        self.categories_ = {feature: pd.Index([], dtype=object) for feature in self.features}
+        self.sums_ = {feature: np.zeros(0, dtype=np.float64) for feature in self.features}
+        self.counts_ = {feature: np.zeros(0, dtype=np.int64) for feature in self.features}
+
+    def _add_statistics(self, feature: str, categories: pd.Index, sums: np.ndarray, counts: np.ndarray) -> None:
+        """Add the target sums and counts of some categories of a feature, which may be new.
+
+        Args:
+            feature: The feature.
+            categories: The categories, without duplicates.
+            sums: Target sum of each category.
+            counts: Target count of each category.
+        """
+        new_categories = categories.difference(self.categories_[feature], sort=False)
+        if len(new_categories):
+            self.categories_[feature] = self.categories_[feature].append(new_categories)
+            self.sums_[feature] = np.concatenate([self.sums_[feature], np.zeros(len(new_categories))])
+            self.counts_[feature] = np.concatenate([self.counts_[feature], np.zeros(len(new_categories), np.int64)])
+        positions = self.categories_[feature].get_indexer(categories)
+        self.sums_[feature][positions] += sums
+        self.counts_[feature][positions] += counts
+
+    def _update_encodings(self) -> None:
+        self.prior_ = self.target_sum_ / self.target_count_ if self.target_count_ else np.nan
+        self.encodings_ = {
+            feature: np.append(
+                (self.sums_[feature] + self.m * self.prior_) / (self.counts_[feature] + self.m), self.prior_
+            )
+            for feature in self.features
+        }
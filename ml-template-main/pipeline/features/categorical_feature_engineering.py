@@ -3,17 +3,21 @@ Refer
 Inspired by penguins/random forest tutorial here: https://datagy.io/sklearn-random-forests/
 """
 import logging
+from typing import List
 
 import numpy as np
 import pandas as pd
-import pickle
 from sklearn.base import BaseEstimator, TransformerMixin
-from category_encoders import MEstimateEncoder
 from pipeline.config.dataclasses import ModellingFeatures, NonModellingFeatures, CategoricalFeatures, TargetFeature
+from pipeline.features.categorical_encoders import (
+    CategoryLookupTable,
+    FixedSchemaOneHotEncoder,
+    MEstimateTargetEncoder,
+)
+from pipeline.features.column_planner import ColumnStep, run_column_steps
 from pipeline.features.feature_engineering_utils import (
-    IndustryGrouping,
-    WeatherExposureGrouping,
-    LitigationGrouping,
+    IndustryGroupings,
+    StateGroupings,
     CategoricalFeaturesToGroup,
     CategoricalFeaturesToOneHot,
     CategoricalFeaturesToTargetEncode
@@ -21,54 +25,33 @@ from pipeline.features.feature_engineering_utils import (
 
 logger = logging.getLogger(__name__)
 
-class CategoricalFeatureEngineering(BaseEstimator, TransformerMixin):
-    """Performs Feature Engineering on categorical features"""
+# Compiled once, and shared by every transform
+INDUSTRY_LOOKUP = CategoryLookupTable(IndustryGroupings)
+STATE_LOOKUP = CategoryLookupTable(StateGroupings)
 
-    def __init__(self, training):
-        self.training = training
 
-    @staticmethod
-    def group_uncommon_categories(
-        df: pd.DataFrame, feature: str, no_categories: int = 5
-    ) -> pd.DataFrame:
-        """
-        Groups uncommon categorical values, only retaining the most frequently occurring values, rest are set
-        to other.
-
-        Args:
-            df (pd.DataFrame): The pandas DataFrame to convert the loss state features in.
-            feature (str): Feature in dataframe to perform the operation on.
-            min_categories (int): Specifies the minimum amount of categories to keep, overriding top_percent.
+class CategoricalFeatureEngineering(BaseEstimator, TransformerMixin):
+    """Performs Feature Engineering on categorical features.
 
-        Returns:
-            pd.DataFrame: The pandas DataFrame with the grouped loss state features.
-        """
-        # Get value counts for the column
-        val_counts = df[feature].value_counts()
-        # Get the top categories
-        top_categories = val_counts.index[:no_categories]
-        # Set the value of rows that are not in the top categories to "other"
-        df[feature] = df[feature].apply(lambda x: x if x in top_categories else "other")
-        logger.debug("Unique categories after grouping {} categories: {}".format(feature, df[feature].nunique()))
-        return df
+    The target and one-hot encoders are fitted by `fit` or `fit_transform`, or batch by batch by `partial_fit`, and
+    kept on the instance, so `transform` applies the encodings learned from the training data.
+    """
 
     @staticmethod
-    def group_categories(
-        df: pd.DataFrame, feature: str, grouped_feature: str, feature_grouping: dict) -> pd.DataFrame:
+    def group_categories(df: pd.DataFrame, feature: str, lookup_table: CategoryLookupTable) -> pd.DataFrame:
         """
-        Groups categorical values based on a defined dictionary
+        Adds the grouped features derived from a categorical feature, using a precompiled lookup table
 
         Args:
-            df (pd.DataFrame): The pandas DataFrame to convert the loss state features in.
+            df (pd.DataFrame): The pandas DataFrame to add the grouped features to.
             feature (str): feature to perform the grouping on
-            grouped_feature (str): the grouped feature that is returned
-            feature_grouping (dict): Key-value pairs of features with their respective grouping
+            lookup_table (CategoryLookupTable): The groupings of the feature, keyed by grouped feature
 
         Returns:
-            pd.DataFrame: The pandas DataFrame with the grouped loss state features.
+            pd.DataFrame: The pandas DataFrame with the grouped features.
         """
-        df[feature] = df[feature].astype('category')
-        df[grouped_feature] = df[feature].replace(feature_grouping)
+        for grouped_feature, grouped_values in lookup_table.lookup(df[feature]).items():
+            df[grouped_feature] = grouped_values
         return df
 
 
@@ -88,40 +71,94 @@ class CategoricalFeatureEngineering(BaseEstimator, TransformerMixin):
             df[feature_list] = df[feature_list].astype("category")
         return df
 
-    @staticmethod
-    def one_hot_encode_categorical(df: pd.DataFrame, cols_to_encode: list):
-        df = pd.get_dummies(df, columns = cols_to_encode)
-        return df
+    def update_target_encoding(self, new_data: pd.DataFrame) -> None:
+        """Update the fitted target encoder with new training data, e.g. a new policy year, instead of refitting it.
 
-    def target_encoding(self, df: pd.DataFrame, training: bool, cols_to_target_encode: list=CategoricalFeaturesToTargetEncode):
-        if training:
-            # m controls additive smoothing for regularisation, default = 1.0
-            y = df[TargetFeature.target]
-            target_encoder = MEstimateEncoder(cols=CategoricalFeaturesToTargetEncode, m=5.0)
-            target_encoder.fit(df, y)
-            transformed_df = target_encoder.transform(df)
-            pickle.dump(target_encoder, open('target_encoder.pkl', 'wb'))
-            return transformed_df
-        else:
-            target_encoder = pickle.load(open('target_encoder.pkl', 'rb'))
-            transformed_df = target_encoder.transform(df)
-            return transformed_df
+        The encoder's statistics are merged with those of the new rows, so the cost grows with the new data only, not
+        with the full history.
+
+        Args:
+            new_data: The new training data, with the target.
+        """
+        self.target_encoder_.partial_fit(new_data, new_data[TargetFeature.target])
 
     def fit(self, input_data, y=None):
+        # Refit from scratch, rather than updating encoders fitted earlier
+        for attribute in ("target_encoder_", "one_hot_encoder_"):
+            if hasattr(self, attribute):
+                delattr(self, attribute)
+        return self.partial_fit(input_data)
+
+    def partial_fit(self, input_data: pd.DataFrame, y=None):
+        """Update the encoders with a batch of training data, so they can be fitted on data larger than memory.
+
+        Args:
+            input_data: A batch of training data, with the target.
+
+        Returns:
+            The updated feature engineering.
+        """
+        input_data = self._group_categories(input_data)
+        if not hasattr(self, "target_encoder_"):
+            # m controls additive smoothing for regularisation, default = 1.0
+            self.target_encoder_ = MEstimateTargetEncoder(features=CategoricalFeaturesToTargetEncode, m=5.0)
+            # The levels seen in training fix the output columns of every later frame
+            self.one_hot_encoder_ = FixedSchemaOneHotEncoder(features=CategoricalFeaturesToOneHot)
+        self.target_encoder_.partial_fit(input_data, input_data[TargetFeature.target])
+        self.one_hot_encoder_.partial_fit(input_data)
         return self
 
+    def fit_transform(self, input_data: pd.DataFrame, y=None, **fit_params):
+        return self.fit(input_data).transform(input_data)
+
     def transform(self, input_data: pd.DataFrame):
         logger.debug("Input data shape before categorical feature engineering {}".format(input_data.shape))
-        input_data = self.convert_categorical_dtypes(input_data, CategoricalFeaturesToGroup)
-        input_data = self.group_categories(input_data, ModellingFeatures.industry, 'industry_grouped', IndustryGrouping)
-        input_data = self.group_categories(input_data, ModellingFeatures.state, 'litigation_grouped', LitigationGrouping)
-        input_data = self.group_categories(input_data, ModellingFeatures.state, 'weather_grouped', WeatherExposureGrouping)
-        input_data = self.group_categories(input_data, ModellingFeatures.state, 'GDP', GDP)
-        input_data = self.group_categories(input_data, ModellingFeatures.state, 'LivingCost', LivingCost)
-        input_data = self.group_categories(input_data, ModellingFeatures.state, 'CorporateTax', CorporateTax)
-        input_data = self.group_categories(input_data, ModellingFeatures.state, 'AvgLaborCost', AvgLaborCost)
-        input_data = self.target_encoding(df=input_data,
-                                          training=self.training)
-        input_data = self.one_hot_encode_categorical(input_data, cols_to_encode=CategoricalFeaturesToOneHot)
+        input_data = run_column_steps(input_data, self.column_steps())
         logger.debug("Input data shape after categorical feature engineering {}".format(input_data.shape))
         return input_data
+
+    def column_steps(self) -> List[ColumnStep]:
+        """The steps of the fitted transform, and the columns each reads and writes.
+
+        Returns:
+            The steps, in the order they run.
+        """
+        categorical_features = tuple(CategoricalFeaturesToGroup)
+        return [
+            ColumnStep(
+                "convert_categorical_dtypes",
+                reads=categorical_features,
+                writes=categorical_features,
+                apply=lambda df: self.convert_categorical_dtypes(df, CategoricalFeaturesToGroup),
+            ),
+            ColumnStep(
+                "group_industry",
+                reads=(ModellingFeatures.industry,),
+                writes=tuple(INDUSTRY_LOOKUP.groupings),
+                apply=lambda df: self.group_categories(df, ModellingFeatures.industry, INDUSTRY_LOOKUP),
+            ),
+            ColumnStep(
+                "group_state",
+                reads=(ModellingFeatures.state,),
+                writes=tuple(STATE_LOOKUP.groupings),
+                apply=lambda df: self.group_categories(df, ModellingFeatures.state, STATE_LOOKUP),
+            ),
+            ColumnStep(
+                "target_encoding",
+                reads=tuple(self.target_encoder_.features),
+                writes=tuple(self.target_encoder_.features),
+                apply=self.target_encoder_.transform,
+            ),
+            ColumnStep(
+                "one_hot_encoding",
+                reads=tuple(self.one_hot_encoder_.features),
+                writes=tuple(self.one_hot_encoder_.feature_names_out_),
+                apply=self.one_hot_encoder_.transform,
+            ),
+        ]
+
+    def _group_categories(self, input_data: pd.DataFrame) -> pd.DataFrame:
+        # The grouping adds and converts columns, which must not modify the caller's frame
+        input_data = self.convert_categorical_dtypes(input_data.copy(deep=False), CategoricalFeaturesToGroup)
+        input_data = self.group_categories(input_data, ModellingFeatures.industry, INDUSTRY_LOOKUP)
+        return self.group_categories(input_data, ModellingFeatures.state, STATE_LOOKUP)
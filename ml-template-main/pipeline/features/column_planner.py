@@ -0,0 +1,76 @@
+"""Copyright (c) 2022, Liberty Mutual Group."""
+import logging
+from dataclasses import dataclass
+from typing import Callable, Iterable, List, Optional, Set, Tuple
+
+import pandas as pd
+
+from pipeline.utils.profiling import StageProfiler, profile_stage
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ColumnStep:
+    """A step of a fitted transformer, and the columns it reads and writes.
+
+    Steps that modify a column in place both read and write it.
+    """
+
+    name: str
+    reads: Tuple[str, ...]
+    writes: Tuple[str, ...]
+    apply: Callable[[pd.DataFrame], pd.DataFrame]
+
+
+@dataclass()
+class ColumnPlan:
+    """The steps needed to produce some output columns, and the input columns they need."""
+
+    steps: List[ColumnStep]
+    input_columns: Set[str]
+    skipped_steps: List[str]
+
+
+def plan_columns(steps: List[ColumnStep], output_columns: Iterable[str]) -> ColumnPlan:
+    """Plan the steps needed to produce some output columns, working backwards from the output.
+
+    A step is needed if a later step, or the output, uses a column it writes; the columns it reads are then needed
+    too, unless an earlier step writes them. Whatever is needed at the start must come from the input.
+
+    Args:
+        steps: All the steps, in the order they run.
+        output_columns: The requested output columns.
+
+    Returns:
+        The plan.
+    """
+    needed = set(output_columns)
+    planned = []
+    skipped = []
+    for step in reversed(steps):
+        if needed.intersection(step.writes):
+            needed.difference_update(step.writes)
+            needed.update(step.reads)
+            planned.append(step)
+        else:
+            skipped.append(step.name)
+    return ColumnPlan(steps=planned[::-1], input_columns=needed, skipped_steps=skipped[::-1])
+
+
+def run_column_steps(
+    input_data: pd.DataFrame, steps: List[ColumnStep], profiler: Optional[StageProfiler] = None
+) -> pd.DataFrame:
+    """Run steps one after the other.
+
+    Args:
+        input_data: The input of the first step.
+        steps: The steps.
+        profiler: If given, each step is profiled as a stage named after it.
+
+    Returns:
+        The output of the last step.
+    """
+    for step in steps:
+        input_data = profile_stage(profiler, step.name, step.apply, input_data)
+    return input_data
@@ -0,0 +1,172 @@
+"""Copyright (c) 2022, Liberty Mutual Group."""
+import json
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+from pipeline.features.feature_pipeline import FeaturePipeline
+from pipeline.features.nlp_feature_engineering import NLPFeatureEngineering
+from pipeline.features.nlp_feature_engineering_utils import NLPFeatures
+from pipeline.features.synthetic_data import make_synthetic_policies
+from pipeline.utils.profiling import StageProfiler, peak_rss_bytes
+
+logger = logging.getLogger(__name__)
+
+# The whole benchmark of one size: its stages' summed wall time, and the peak RSS growth of synthesizing the data and
+# engineering its features
+TOTAL_STAGE = "total"
+# Stages faster than this are dominated by timer noise, so their throughput is not compared with the baseline
+MIN_COMPARABLE_WALL_TIME_S = 0.05
+
+
+@dataclass()
+class BenchmarkResult:
+    """The throughput and memory of one feature engineering stage on a number of rows."""
+
+    n_rows: int
+    stage: str
+    wall_time_s: float
+    rows_per_s: float
+    peak_rss_delta_bytes: int
+
+
+def benchmark_feature_engineering(n_rows: int, nlp: bool = True, seed: int = 0) -> List[BenchmarkResult]:
+    """Benchmark every stage of the feature engineering on synthetic policies.
+
+    The feature pipeline is fitted and then transforms the policies serially, so each of its steps is timed on its
+    own, and the NLP feature engineering then processes their summaries.
+
+    Args:
+        n_rows: Number of policies.
+        nlp: Benchmark the NLP feature engineering too. It is far slower than the rest, so it is skipped on large sizes.
+        seed: Seed of the synthetic policies.
+
+    Returns:
+        The result of each stage, in the order they ran, followed by the total.
+    """
+    peak_rss_before = peak_rss_bytes()
+    policies = make_synthetic_policies(n_rows, seed=seed, text=nlp)
+    # Object columns are not measured deeply, which would dominate the profile of the text stages
+    profiler = StageProfiler(name="benchmark", deep_memory=False)
+
+    feature_pipeline = FeaturePipeline().fit(policies, profiler=profiler)
+    feature_pipeline.transform(policies, profiler=profiler)
+    if nlp:
+        NLPFeatureEngineering(profiler=profiler).transform(policies[NLPFeatures].copy())
+
+    results = [
+        BenchmarkResult(
+            n_rows=n_rows,
+            stage=profile.stage,
+            wall_time_s=profile.wall_time_s,
+            rows_per_s=_rows_per_s(n_rows, profile.wall_time_s),
+            peak_rss_delta_bytes=profile.peak_rss_delta_bytes,
+        )
+        for profile in profiler.profiles
+    ]
+    wall_time = sum(result.wall_time_s for result in results)
+    results.append(
+        BenchmarkResult(
+            n_rows=n_rows,
+            stage=TOTAL_STAGE,
+            wall_time_s=wall_time,
+            rows_per_s=_rows_per_s(n_rows, wall_time),
+            peak_rss_delta_bytes=peak_rss_bytes() - peak_rss_before,
+        )
+    )
+    return results
+
+
+def run_benchmarks(sizes: Iterable[int], nlp_max_rows: int, seed: int = 0) -> List[BenchmarkResult]:
+    """Benchmark the feature engineering at each size.
+
+    Each size is benchmarked in a new process, so its peak memory is not hidden by the peak of a larger size.
+
+    Args:
+        sizes: Numbers of rows.
+        nlp_max_rows: The NLP feature engineering is only benchmarked on sizes up to this many rows.
+        seed: Seed of the synthetic policies.
+
+    Returns:
+        The results of every size.
+    """
+    results = []
+    for n_rows in sizes:
+        logger.info(f"Benchmarking feature engineering on {n_rows} rows")
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+            future = executor.submit(benchmark_feature_engineering, n_rows, n_rows <= nlp_max_rows, seed)
+            results.extend(future.result())
+    return results
+
+
+def find_regressions(
+    results: List[BenchmarkResult], baseline: List[BenchmarkResult], threshold: float
+) -> List[str]:
+    """Compare benchmark results with a baseline.
+
+    A stage regressed if its throughput dropped by more than the threshold. The peak memory of each size regressed if
+    it grew by more than the threshold; stages' own peaks are not compared, as a stage that stays below an earlier
+    stage's peak shows no growth. Stages or sizes missing from either side are not compared.
+
+    Args:
+        results: The new results.
+        baseline: The results to compare with.
+        threshold: The tolerated relative change, e.g. 0.25 for 25%.
+
+    Returns:
+        A description of each regression.
+    """
+    baseline_by_key: Dict[Tuple[int, str], BenchmarkResult] = {
+        (result.n_rows, result.stage): result for result in baseline
+    }
+    regressions = []
+    for result in results:
+        expected = baseline_by_key.get((result.n_rows, result.stage))
+        if expected is None:
+            continue
+        if (
+            expected.wall_time_s >= MIN_COMPARABLE_WALL_TIME_S
+            and result.rows_per_s < expected.rows_per_s * (1 - threshold)
+        ):
+            regressions.append(
+                f"{result.stage} on {result.n_rows} rows: {result.rows_per_s:.0f} rows/s, "
+                f"baseline {expected.rows_per_s:.0f} rows/s"
+            )
+        peak_rss_limit = expected.peak_rss_delta_bytes * (1 + threshold)
+        if result.stage == TOTAL_STAGE and result.peak_rss_delta_bytes > peak_rss_limit:
+            regressions.append(
+                f"Peak memory on {result.n_rows} rows: {result.peak_rss_delta_bytes / 1024**2:.0f} MiB, "
+                f"baseline {expected.peak_rss_delta_bytes / 1024**2:.0f} MiB"
+            )
+    return regressions
+
+
+def save_benchmark_results(results: List[BenchmarkResult], path: Path) -> None:
+    """Save benchmark results as JSON, e.g. as the baseline of later runs.
+
+    Args:
+        results: The results.
+        path: The JSON file.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps([asdict(result) for result in results], indent=2))
+
+
+def load_benchmark_results(path: Path) -> List[BenchmarkResult]:
+    """Load benchmark results saved by `save_benchmark_results`.
+
+    Args:
+        path: The JSON file.
+
+    Returns:
+        The results.
+    """
+    return [BenchmarkResult(**result) for result in json.loads(Path(path).read_text())]
+
+
+def _rows_per_s(n_rows: int, wall_time_s: float) -> float:
+    return n_rows / wall_time_s if wall_time_s > 0 else float("inf")
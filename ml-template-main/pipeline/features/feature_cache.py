@@ -0,0 +1,208 @@
+"""Copyright (c) 2022, Liberty Mutual Group."""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+
+from pipeline import settings
+from pipeline.config.constants import (
+    BASE_PATH,
+    FEATURE_CACHE_DIR,
+    FEATURE_CACHE_ENABLED,
+    FEATURE_CACHE_MAX_SIZE_GB,
+)
+from pipeline.features.feature_pipeline import FEATURE_PIPELINE_VERSION, FeaturePipeline
+
+logger = logging.getLogger(__name__)
+
+# The code the features are computed by: any change to it invalidates the cached features
+FEATURE_CODE_PATHS = (
+    Path(BASE_PATH) / "pipeline" / "features",
+    Path(BASE_PATH) / "pipeline" / "config" / "dataclasses.py",
+)
+
+FEATURE_PIPELINE_FILE = "feature_pipeline.pkl"
+FRAME_FILE_SUFFIX = ".parquet"
+
+
+@dataclass()
+class MaterializedFeatures:
+    """A fitted feature pipeline, and the frames it processed, keyed by name (e.g. train and test)."""
+
+    feature_pipeline: FeaturePipeline
+    frames: Dict[str, pd.DataFrame]
+
+
+def fingerprint_frame(df: pd.DataFrame) -> str:
+    """Fingerprint the contents of a frame: its columns, dtypes, index and values.
+
+    Args:
+        df: The frame.
+
+    Returns:
+        A hex digest that changes whenever the frame does.
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps([[str(column), str(dtype)] for column, dtype in df.dtypes.items()]).encode("utf-8"))
+    # One vectorized 64-bit hash per row, covering the index and every column
+    digest.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def hash_feature_code(paths: Iterable[Path] = FEATURE_CODE_PATHS) -> str:
+    """Hash the source code of the feature engineering.
+
+    Args:
+        paths: Source files, and directories whose Python files are hashed.
+
+    Returns:
+        A hex digest that changes whenever the code does.
+    """
+    digest = hashlib.sha256()
+    for path in paths:
+        files = sorted(Path(path).rglob("*.py")) if Path(path).is_dir() else [Path(path)]
+        for file in files:
+            digest.update(str(file.relative_to(BASE_PATH)).encode("utf-8"))
+            digest.update(file.read_bytes())
+    return digest.hexdigest()
+
+
+class FeatureCache:
+    """Size-bounded, content-addressed local cache of engineered features.
+
+    Entries are keyed by a fingerprint of the input frames, a hash of the feature engineering code and the feature
+    configuration, so a rerun on the same data with the same features, e.g. one that only changes the modelling
+    settings, reads the features back instead of recomputing them. Each entry is a directory holding the processed
+    frames as parquet files and the fitted feature pipeline, and the least recently used entries are evicted once the
+    cache grows beyond its size limit.
+    """
+
+    def __init__(self, cache_dir: Path, max_size_bytes: int):
+        self.cache_dir = Path(cache_dir)
+        self.max_size_bytes = max_size_bytes
+
+    def cache_key(self, input_data: Dict[str, pd.DataFrame], config: Optional[Dict[str, Any]] = None) -> str:
+        """Compute the cache key of some input frames.
+
+        Args:
+            input_data: The unprocessed frames, keyed by name.
+            config: The feature configuration. The feature pipeline version is always part of the key.
+
+        Returns:
+            A hex digest identifying the features of the input frames.
+        """
+        fingerprint = {
+            "data": {name: fingerprint_frame(df) for name, df in sorted(input_data.items())},
+            "code": hash_feature_code(),
+            "config": {"feature_pipeline_version": FEATURE_PIPELINE_VERSION, **(config or {})},
+        }
+        return hashlib.sha256(json.dumps(fingerprint, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def fetch(
+        self,
+        input_data: Dict[str, pd.DataFrame],
+        compute: Callable[[], MaterializedFeatures],
+        config: Optional[Dict[str, Any]] = None,
+    ) -> Tuple[MaterializedFeatures, bool]:
+        """Return the cached features of some input frames, computing and storing them on a cache miss.
+
+        Args:
+            input_data: The unprocessed frames, keyed by name.
+            compute: Fits the feature pipeline and processes the frames; only called on a cache miss.
+            config: The feature configuration.
+
+        Returns:
+            The features, and whether they were read from the cache.
+        """
+        key = self.cache_key(input_data, config)
+        path = self.cache_dir / key
+        if path.exists():
+            logger.info(f"Feature cache hit: {path}")
+            # Refresh the modification time, which orders entries for LRU eviction
+            os.utime(path)
+            return self._read(path), True
+
+        logger.info(f"Feature cache miss, computing the features into {path}")
+        materialized = compute()
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary directory first so that concurrent readers never see a partially written entry
+        temp_path = self.cache_dir / f"{key}.{uuid.uuid4().hex}.tmp"
+        try:
+            self._write(materialized, temp_path)
+            os.replace(temp_path, path)
+        except OSError:
+            # Another run stored the same entry first
+            if not path.exists():
+                raise
+        finally:
+            shutil.rmtree(temp_path, ignore_errors=True)
+
+        self.evict(keep=path)
+        return materialized, False
+
+    def size_bytes(self) -> int:
+        """Total size of the cache entries.
+
+        Returns:
+            The size in bytes.
+        """
+        return sum(self._entry_size(entry) for entry in self._entries())
+
+    def evict(self, keep: Optional[Path] = None) -> None:
+        """Delete the least recently used entries until the cache fits within its size limit.
+
+        Args:
+            keep: An entry that must not be evicted, e.g. the one just written.
+        """
+        entries = sorted(self._entries(), key=lambda entry: entry.stat().st_mtime)
+        sizes = {entry: self._entry_size(entry) for entry in entries}
+        total_size = sum(sizes.values())
+        for entry in entries:
+            if total_size <= self.max_size_bytes:
+                break
+            if entry == keep:
+                continue
+            logger.info(f"Evicting {entry} from the feature cache")
+            total_size -= sizes[entry]
+            shutil.rmtree(entry, ignore_errors=True)
+
+    def _entries(self) -> List[Path]:
+        if not self.cache_dir.exists():
+            return []
+        return [entry for entry in self.cache_dir.iterdir() if entry.is_dir() and entry.suffix != ".tmp"]
+
+    @staticmethod
+    def _entry_size(entry: Path) -> int:
+        return sum(file.stat().st_size for file in entry.iterdir())
+
+    @staticmethod
+    def _write(materialized: MaterializedFeatures, path: Path) -> None:
+        path.mkdir(parents=True)
+        for name, df in materialized.frames.items():
+            df.to_parquet(path / f"{name}{FRAME_FILE_SUFFIX}")
+        materialized.feature_pipeline.save(path / FEATURE_PIPELINE_FILE)
+
+    @staticmethod
+    def _read(path: Path) -> MaterializedFeatures:
+        frames = {file.stem: pd.read_parquet(file) for file in path.glob(f"*{FRAME_FILE_SUFFIX}")}
+        return MaterializedFeatures(FeaturePipeline.load(path / FEATURE_PIPELINE_FILE), frames)
+
+
+def get_default_feature_cache() -> Optional[FeatureCache]:
+    """Create the feature cache configured in settings.ini.
+
+    Returns:
+        The feature cache, or None if caching is disabled.
+    """
+    if not settings.bool(FEATURE_CACHE_ENABLED, False):
+        return None
+    cache_dir = Path(BASE_PATH) / settings.str(FEATURE_CACHE_DIR)
+    max_size_bytes = int(float(settings.str(FEATURE_CACHE_MAX_SIZE_GB)) * 1024**3)
+    return FeatureCache(cache_dir, max_size_bytes)
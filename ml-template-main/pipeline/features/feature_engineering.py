@@ -1,64 +1,43 @@
 """Copyright (c) 2022, Liberty Mutual Group."""
 import logging
-
+from typing import Optional
 
 import pandas as pd
 from lit_ds_utils.decorate.logging import log_function
-from sklearn.pipeline import Pipeline
-from pipeline.features.nlp_feature_engineering import NLPFeatureEngineering
-from pipeline.features.categorical_feature_engineering import CategoricalFeatureEngineering
-from pipeline.features.numerical_feature_engineering import NumericalFeatureEngineering
-from pipeline.features.feature_engineering_utils import FeaturesToDrop
+from pipeline.config.constants import FEATURE_PIPELINE_ARTIFACT
+from pipeline.features.feature_pipeline import FeaturePipeline, drop_unused_features  # noqa: F401
+from pipeline.utils.profiling import StageProfiler
 
 logger = logging.getLogger(__name__)
 
 
-def drop_unused_features(df: pd.DataFrame, feature_list: list = FeaturesToDrop) -> pd.DataFrame:
-    """
-    Drops features that are not necessary for the modelling process after doing feature preprocessing
-
-    Args:
-        df (pd.DataFrame): Dataframe containing the features to drop.
-        feature_list (list): A list of feature names to drop.
-
-    Returns:
-        df (pd.DataFrame): A Pandas DataFrame without the features found in feature_list.
-    """
-    return df.drop(labels=feature_list, axis=1)
-
-
 @log_function()
-def do_feature_engineering(input_data: pd.DataFrame, training: bool = False) -> pd.DataFrame:
+def do_feature_engineering(
+    input_data: pd.DataFrame,
+    training: bool = False,
+    feature_pipeline: Optional[FeaturePipeline] = None,
+    n_workers: Optional[int] = 1,
+    profiler: Optional[StageProfiler] = None,
+) -> pd.DataFrame:
     """Example of feature engineering.
 
     Args:
         input_data: Input data.
-        training: Called as part of model training?
+        training: Called as part of model training? If so, a new feature pipeline is fitted and saved.
+        feature_pipeline: The fitted feature pipeline, when not training. Defaults to the saved one, which is then
+            loaded on every call, so pass it in when transforming repeatedly.
+        n_workers: Number of processes the data is transformed with, each on a shard of the rows. 1 transforms in
+            this process, and None or 0 use one per CPU.
+        profiler: If given, each step of the feature engineering is profiled.
 
     Returns:
         A Pandas DataFrame of the feature data.
-
-    TODO: Implement this function and remove the reference implementation and implementation notes below.
     """
     logger.debug("****** feature engineering")
-    final_fe_pipe = Pipeline(
-        steps=[
-            ("CategoricalFeatureEngineering", CategoricalFeatureEngineering(training)),
-            ("NumericalFeatureEngineering", NumericalFeatureEngineering()),
-            # ("NLPFeatureEngineering", NLPFeatureEngineering()),
-        ]
-    )
     if training:
-        piped_data = final_fe_pipe.fit_transform(input_data)
-    else:
-        piped_data = final_fe_pipe.transform(input_data)
-
-    input_data_dropped = drop_unused_features(piped_data, ['account_number', 'lob', 'split'])
-    non_kw_cols = [c for c in input_data_dropped.columns if '_kw_' not in c]
-    df_filtered = input_data_dropped[non_kw_cols]
-
-    return df_filtered
-
-
-
+        feature_pipeline = FeaturePipeline().fit(input_data, profiler=profiler)
+        feature_pipeline.save(FEATURE_PIPELINE_ARTIFACT)
+        return feature_pipeline.transform(input_data, n_workers=n_workers, profiler=profiler)
 
+    feature_pipeline = feature_pipeline or FeaturePipeline.load(FEATURE_PIPELINE_ARTIFACT)
+    return feature_pipeline.transform(input_data, n_workers=n_workers, profiler=profiler)
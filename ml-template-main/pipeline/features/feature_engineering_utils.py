@@ -384,3 +384,28 @@ AvgLaborCost = {
     'WY' : 'Low-Moderate'
 }
 
+
+
+# Columns derived from the industry and the state, keyed by the name of the column each grouping is written to
+IndustryGroupings = {
+    'industry_grouped': IndustryGrouping,
+}
+
+StateGroupings = {
+    'litigation_grouped': LitigationGrouping,
+    'weather_grouped': WeatherExposureGrouping,
+    'GDP': GDP,
+    'LivingCost': LivingCost,
+    'CorporateTax': CorporateTax,
+    'AvgLaborCost': AvgLaborCost,
+}
+
+# Pairwise interactions built by NumericalFeatureEngineering, keyed by the name of the column each product is written to
+InteractionFeaturePairs = {
+    'state_industry_interact': ('state', 'industry'),
+    'state_has10k_interac': ('state', 'has_10k'),
+    'state_expsramt_interac': ('state', 'exposure_amt'),
+    'industry_has10k_interac': ('industry', 'has_10k'),
+    'industry_expsramt_interac': ('industry', 'exposure_amt'),
+    'expsramt_has10k_interac': ('exposure_amt', 'has_10k'),
+}
@@ -0,0 +1,339 @@
+"""Copyright (c) 2022, Liberty Mutual Group."""
+import logging
+import multiprocessing
+import os
+import pickle
+import uuid
+from dataclasses import replace
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+from sklearn.pipeline import Pipeline
+from threadpoolctl import threadpool_limits
+
+from pipeline.features.categorical_feature_engineering import CategoricalFeatureEngineering
+from pipeline.features.column_planner import ColumnStep, plan_columns, run_column_steps
+from pipeline.features.feature_engineering_utils import FeaturesToDrop, InteractionFeaturePairs
+from pipeline.features.numerical_feature_engineering import NumericalFeatureEngineering
+from pipeline.utils.profiling import StageProfiler, profile_stage
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever a change to the feature engineering makes previously saved pipelines incompatible
+FEATURE_PIPELINE_VERSION = 2
+
+# Smaller frames are transformed in process, as sharding them costs more than it saves
+MIN_ROWS_PER_SHARD = 10000
+
+# The fitted pipeline of a parallel transform worker, set once when the worker starts
+_worker_pipeline: Optional["FeaturePipeline"] = None
+
+
+def drop_unused_features(df: pd.DataFrame, feature_list: list = FeaturesToDrop) -> pd.DataFrame:
+    """
+    Drops features that are not necessary for the modelling process after doing feature preprocessing
+
+    Args:
+        df (pd.DataFrame): Dataframe containing the features to drop.
+        feature_list (list): A list of feature names to drop.
+
+    Returns:
+        df (pd.DataFrame): A Pandas DataFrame without the features found in feature_list.
+    """
+    return df.drop(labels=feature_list, axis=1)
+
+
+class FeaturePipeline:
+    """The model's feature engineering, fitted once on the training data and reused for every later frame.
+
+    All the fitted state (the target encoder, and the one-hot vocabulary) lives in the pipeline's steps, so the whole
+    feature engineering is saved and loaded as one versioned artifact, and transforming a frame never touches disk.
+
+    When fitted, the pipeline records its output columns. Its transformers declare the columns each of their steps
+    reads and writes, so `transform` works backwards from the output columns: steps whose outputs are never used are
+    skipped, and input columns that are never used (e.g. the account number) are dropped before the first step.
+
+    Datasets larger than memory are handled out of core: `fit_streaming` fits the stateful steps in one pass over a
+    stream of batches, and `transform_to_parquet` transforms a stream batch by batch into a parquet dataset, so only
+    one batch and its features are held in memory at a time.
+    """
+
+    def __init__(self):
+        self.version = FEATURE_PIPELINE_VERSION
+        self.pipeline = Pipeline(
+            steps=[
+                ("CategoricalFeatureEngineering", CategoricalFeatureEngineering()),
+                ("NumericalFeatureEngineering", NumericalFeatureEngineering(interactions=InteractionFeaturePairs)),
+                # ("NLPFeatureEngineering", NLPFeatureEngineering()),
+            ]
+        )
+
+    def fit(self, input_data: pd.DataFrame, profiler: Optional[StageProfiler] = None) -> "FeaturePipeline":
+        """Fit the pipeline on training data, without transforming it, e.g. to then transform it in parallel.
+
+        Args:
+            input_data: Training data, with the target.
+            profiler: If given, fitting is profiled.
+
+        Returns:
+            The fitted pipeline.
+        """
+        return self.fit_streaming([input_data], profiler=profiler)
+
+    def fit_transform(self, input_data: pd.DataFrame, profiler: Optional[StageProfiler] = None) -> pd.DataFrame:
+        """Fit the pipeline on training data, and transform it.
+
+        Args:
+            input_data: Training data, with the target. It is not modified.
+            profiler: If given, fitting and each step of the transform are profiled.
+
+        Returns:
+            A Pandas DataFrame of the feature data.
+        """
+        return self.fit(input_data, profiler=profiler)._transform_columns(input_data, None, profiler)
+
+    def transform(
+        self,
+        input_data: pd.DataFrame,
+        n_workers: Optional[int] = 1,
+        output_columns: Optional[List[str]] = None,
+        profiler: Optional[StageProfiler] = None,
+    ) -> pd.DataFrame:
+        """Transform data with the fitted pipeline.
+
+        Once fitted, the pipeline transforms each row independently, so with several workers the rows are split into
+        one contiguous shard per worker, transformed in a process pool, and the shards reassembled in order. Each
+        worker receives the fitted pipeline once, when it starts.
+
+        Args:
+            input_data: Input data. It is not modified.
+            n_workers: Number of worker processes. 1 transforms in this process, and None or 0 use one per CPU.
+            output_columns: Columns to output. Defaults to the columns output when fitting, without any that the
+                input lacks and no step writes, e.g. the target when serving.
+            profiler: If given, each step is profiled. When sharded, each worker profiles the steps of its shard,
+                and the whole sharded transform is profiled too.
+
+        Returns:
+            A Pandas DataFrame of the feature data.
+        """
+        n_workers = n_workers or os.cpu_count() or 1
+        n_shards = min(n_workers, len(input_data) // MIN_ROWS_PER_SHARD)
+        if n_shards <= 1:
+            return self._transform_columns(input_data, output_columns, profiler)
+        return profile_stage(
+            profiler,
+            "sharded_transform",
+            lambda df: self._transform_shards(df, n_shards, output_columns, profiler),
+            input_data,
+        )
+
+    def fit_streaming(
+        self, batches: Iterable[pd.DataFrame], profiler: Optional[StageProfiler] = None
+    ) -> "FeaturePipeline":
+        """Fit the pipeline in one pass over a stream of training data.
+
+        Args:
+            batches: The training data, with the target, e.g. from `iter_dataset`.
+            profiler: If given, fitting each batch is profiled.
+
+        Returns:
+            The fitted pipeline.
+
+        Raises:
+            ValueError: If there are no batches.
+        """
+        categorical_feature_engineering = self.pipeline.named_steps["CategoricalFeatureEngineering"]
+        n_rows = 0
+        empty_batch = None
+        for batch in batches:
+            if empty_batch is None:
+                empty_batch = batch.iloc[:0].copy()
+            # The numerical feature engineering is stateless, so only the categorical encoders are fitted
+            partial_fit = categorical_feature_engineering.partial_fit
+            profile_stage(profiler, "CategoricalFeatureEngineering.partial_fit", partial_fit, batch)
+            n_rows += len(batch)
+        if empty_batch is None:
+            raise ValueError("Cannot fit the feature pipeline on no training data: there are no batches")
+        # Transforming no rows through every step gives the output columns cheaply
+        empty_output = run_column_steps(empty_batch, self._column_steps())
+        self.output_columns_ = [column for column in empty_output.columns if column not in FeaturesToDrop]
+        logger.info(f"Fitted feature pipeline on {n_rows} streamed rows")
+        return self
+
+    def transform_to_parquet(self, batches: Iterable[pd.DataFrame], output_dir: Path) -> int:
+        """Transform a stream of data with the fitted pipeline, writing each batch's features to its own parquet file.
+
+        The files are written as output_dir/part-00000.parquet, part-00001.parquet, ..., so the features can be read
+        back with `get_dataset(output_dir)`, or streamed again with `iter_dataset(output_dir)`.
+
+        Args:
+            batches: The input data, e.g. from `iter_dataset`.
+            output_dir: Directory of the output dataset.
+
+        Returns:
+            The number of rows written.
+        """
+        output_dir = Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        n_rows = 0
+        for part_number, batch in enumerate(batches):
+            self.transform(batch).to_parquet(output_dir / f"part-{part_number:05d}.parquet", index=False)
+            n_rows += len(batch)
+        logger.info(f"Wrote {n_rows} rows of features to {output_dir}")
+        return n_rows
+
+    def update_target_encoding(self, new_data: pd.DataFrame) -> None:
+        """Update the fitted target encoding with new training data, e.g. a new policy year.
+
+        Args:
+            new_data: The new training data, with the target.
+        """
+        self.pipeline.named_steps["CategoricalFeatureEngineering"].update_target_encoding(new_data)
+
+    def save(self, path: Path) -> None:
+        """Save the fitted pipeline.
+
+        Args:
+            path: Path of the artifact.
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file first, so that concurrent trainings never leave a torn artifact
+        temp_path = path.with_suffix(f".{uuid.uuid4().hex}.tmp")
+        with open(temp_path, "wb") as f:
+            pickle.dump(self, f)
+        os.replace(temp_path, path)
+        logger.info(f"Saved feature pipeline version {self.version} to {path}")
+
+    @staticmethod
+    def load(path: Path) -> "FeaturePipeline":
+        """Load a fitted pipeline.
+
+        Args:
+            path: Path of the artifact.
+
+        Returns:
+            The fitted pipeline.
+
+        Raises:
+            ValueError: If the pipeline was saved by an incompatible version of the feature engineering.
+        """
+        with open(path, "rb") as f:
+            feature_pipeline = pickle.load(f)
+        if getattr(feature_pipeline, "version", None) != FEATURE_PIPELINE_VERSION:
+            raise ValueError(
+                f"Feature pipeline {path} has version {getattr(feature_pipeline, 'version', None)}, but version "
+                f"{FEATURE_PIPELINE_VERSION} is required. Retrain the model to rebuild it."
+            )
+        return feature_pipeline
+
+    def _column_steps(self) -> List[ColumnStep]:
+        return [
+            replace(step, name=f"{name}.{step.name}")
+            for name, transformer in self.pipeline.steps
+            for step in transformer.column_steps()
+        ]
+
+    def _transform_columns(
+        self,
+        input_data: pd.DataFrame,
+        output_columns: Optional[List[str]],
+        profiler: Optional[StageProfiler] = None,
+    ) -> pd.DataFrame:
+        """Transform data with only the steps needed for some output columns.
+
+        Args:
+            input_data: Input data. It is not modified.
+            output_columns: Columns to output. Defaults to the columns output when fitting.
+            profiler: If given, each step is profiled.
+
+        Returns:
+            A Pandas DataFrame of the feature data.
+        """
+        steps = self._column_steps()
+        written = {column for step in steps for column in step.writes}
+        output_columns = [
+            column for column in (output_columns or self.output_columns_)
+            if column in written or column in input_data.columns
+        ]
+        plan = plan_columns(steps, output_columns)
+        if plan.skipped_steps:
+            logger.debug(f"Skipping feature engineering steps whose output is not used: {plan.skipped_steps}")
+        # Dropping the unused columns also copies the input, so the steps never modify the caller's frame
+        unused_columns = [column for column in input_data.columns if column not in plan.input_columns]
+        input_data = input_data.drop(columns=unused_columns)
+        return run_column_steps(input_data, plan.steps, profiler)[output_columns]
+
+    def _transform_shards(
+        self,
+        input_data: pd.DataFrame,
+        n_shards: int,
+        output_columns: Optional[List[str]],
+        profiler: Optional[StageProfiler] = None,
+    ) -> pd.DataFrame:
+        """Transform data in a process pool, one shard of rows per process.
+
+        Args:
+            input_data: Input data. It is not modified.
+            n_shards: Number of shards, and of processes.
+            output_columns: Columns to output. Defaults to the columns output when fitting.
+            profiler: If given, the profiles of each shard's steps are added to it, in shard order.
+
+        Returns:
+            A Pandas DataFrame of the feature data.
+        """
+        logger.info(f"Transforming {len(input_data)} rows in {n_shards} shards")
+        shards = [input_data.iloc[rows] for rows in np.array_split(np.arange(len(input_data)), n_shards)]
+        # Spawned workers start from a fresh interpreter, rather than forking a parent that may hold large frames
+        with ProcessPoolExecutor(
+            max_workers=n_shards,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_transform_worker,
+            initargs=(self,),
+        ) as executor:
+            # Each shard is profiled by its own profiler in its worker, and the profiles are sent back with it
+            shard_profiler = StageProfiler(profiler.name, profiler.deep_memory) if profiler is not None else None
+            results = list(executor.map(_transform_shard, shards, repeat(output_columns), repeat(shard_profiler)))
+        if profiler is not None:
+            for _, shard_profiler in results:
+                profiler.profiles.extend(shard_profiler.profiles)
+        return _concat_shards([shard for shard, _ in results])
+
+
+def _init_transform_worker(feature_pipeline: FeaturePipeline) -> None:
+    global _worker_pipeline
+    _worker_pipeline = feature_pipeline
+    # Each worker gets its share of the CPUs, so native thread pools must not also use all of them
+    threadpool_limits(limits=1)
+
+
+def _transform_shard(
+    shard: pd.DataFrame, output_columns: Optional[List[str]], profiler: Optional[StageProfiler]
+) -> Tuple[pd.DataFrame, Optional[StageProfiler]]:
+    return _worker_pipeline.transform(shard, output_columns=output_columns, profiler=profiler), profiler
+
+
+def _concat_shards(shards: List[pd.DataFrame]) -> pd.DataFrame:
+    """Concatenate transformed shards, keeping categorical columns categorical.
+
+    `pd.concat` turns categorical columns whose shards have different categories (e.g. values without a group, seen
+    in one shard only) into object columns, so their categories are unioned first.
+
+    Args:
+        shards: The transformed shards, in order.
+
+    Returns:
+        The shards as one frame.
+    """
+    for column in shards[0].columns:
+        if isinstance(shards[0][column].dtype, pd.CategoricalDtype):
+            categories = union_categoricals([shard[column] for shard in shards], ignore_order=True).categories
+            for shard in shards:
+                if not shard[column].cat.categories.equals(categories):
+                    shard[column] = shard[column].cat.set_categories(categories)
+    return pd.concat(shards, copy=False)
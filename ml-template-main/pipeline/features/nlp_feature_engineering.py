@@ -1,23 +1,116 @@
 import logging
+import multiprocessing
+import os
+import re
+import string
 import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import List, Optional, Union
+import numpy as np
 import pandas as pd
+from gensim.parsing.preprocessing import RE_PUNCT, RE_TAGS
 from sklearn.base import TransformerMixin
 from pipeline.features.nlp_feature_engineering_utils import (
-    TEXT_CLEANING_FUNCTION_MAPPINGS,
-    sw_to_remove,
     NLPFeatures,
+    SentimentScoreFeatures,
+    SummaryStopwords,
 )
+from pipeline.utils.profiling import StageProfiler, profile_stage
 logger = logging.getLogger(__name__)
 from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
 
+# Texts scored per task of the sentiment worker pool
+SENTIMENT_BATCH_SIZE = 10000
+
+# Whitespace that str.split splits on, but bytes.split does not
+NON_ASCII_WHITESPACE = re.compile(r"[^\S\x00-\x7f]")
+
+# Texts that `Series.replace(r"\n|\t", " ")` replaces: it matches whole values literally, not as a pattern
+LITERAL_TABS_AND_NEWLINES = r"\n|\t"
+
+
+@lru_cache(maxsize=None)
+def get_sentiment_analyzer() -> SentimentIntensityAnalyzer:
+    """The sentiment analyzer of this process, created on first use: creating one reloads the VADER lexicon from disk.
+
+    Returns:
+        The sentiment analyzer.
+    """
+    return SentimentIntensityAnalyzer()
+
+
+def score_sentiment(texts: List[str]) -> List[float]:
+    """Score the compound sentiment of a batch of texts.
+
+    Args:
+        texts: The texts.
+
+    Returns:
+        The compound score of each text, from -1 (most negative) to 1 (most positive).
+    """
+    analyzer = get_sentiment_analyzer()
+    return [analyzer.polarity_scores(text)["compound"] for text in texts]
+
+
+class TextNormalizer:
+    """Cleans a text in one pass, as the text cleaning steps of `NLPFeatureEngineering` do one after the other.
+
+    The text is lower cased, NFKD normalized and lower cased again (the normalization can decompose characters into
+    upper case letters), then its tags are stripped, its ASCII punctuation replaced by spaces, and it is split into
+    words, which are joined by single spaces without the stop words. Splitting collapses the whitespace, so the output
+    is the same as gensim's steps. ASCII texts, which the normalization leaves unchanged, skip it, and texts are split
+    and filtered as UTF-8 bytes, which is several times faster than as strings, unless they have non-ASCII whitespace.
+
+    Args:
+        stopwords: The stop words.
+    """
+
+    def __init__(self, stopwords: frozenset = SummaryStopwords):
+        self.stopwords = frozenset(stopwords)
+        self.stopword_bytes = frozenset(word.encode("utf-8") for word in self.stopwords)
+        # bytes.split only splits on ASCII whitespace, so the other characters str.split splits on become spaces
+        self.punctuation_to_spaces = bytes.maketrans(
+            (string.punctuation + "\x1c\x1d\x1e\x1f").encode("ascii"), b" " * (len(string.punctuation) + 4)
+        )
+
+    def __call__(self, text: str) -> str:
+        text = text.lower()
+        if text == LITERAL_TABS_AND_NEWLINES:
+            return ""
+        if not text.isascii():
+            text = unicodedata.normalize("NFKD", text).lower()
+            if NON_ASCII_WHITESPACE.search(text):
+                return self._clean_str(text)
+        if "<" in text:
+            text = RE_TAGS.sub("", text)
+        # ASCII punctuation and whitespace bytes only ever encode themselves in UTF-8
+        words = text.encode("utf-8").translate(self.punctuation_to_spaces).split()
+        return b" ".join([word for word in words if word not in self.stopword_bytes]).decode("utf-8")
+
+    def _clean_str(self, text: str) -> str:
+        if "<" in text:
+            text = RE_TAGS.sub("", text)
+        words = RE_PUNCT.sub(" ", text).split()
+        return " ".join([word for word in words if word not in self.stopwords])
+
+
 class NLPFeatureEngineering(TransformerMixin):
     def __init__(
         self,
-        gsp_text_cleaning=TEXT_CLEANING_FUNCTION_MAPPINGS,
+        gsp_text_cleaning: Optional[dict] = None,
         features: list = NLPFeatures,
+        profiler: Optional[StageProfiler] = None,
+        n_workers: Optional[int] = 1,
     ):
         self.features = features
+        # The text cleaning steps, or None to clean each text in one pass with the TextNormalizer. It is equivalent to
+        # TEXT_CLEANING_FUNCTION_MAPPINGS, but also removes the extra stop words of SummaryStopwords.
         self.gsp_text_cleaning = gsp_text_cleaning
+        # If given, each text cleaning step of each feature, and the sentiment scoring, is profiled
+        self.profiler = profiler
+        # Number of processes the sentiment is scored in: 1 scores in this process, and None or 0 use one per CPU
+        self.n_workers = n_workers
 
     @staticmethod
     def normalize_text(text: str) -> str:
@@ -26,8 +119,7 @@ class NLPFeatureEngineering(TransformerMixin):
 
     @staticmethod
     def calculate_sentiment(text) -> str:
-        sentimentAnalyser = SentimentIntensityAnalyzer()
-        scores = sentimentAnalyser.polarity_scores(text)
+        scores = get_sentiment_analyzer().polarity_scores(text)
         # Extract the compound score
         compound_score = scores['compound']
         return compound_score
@@ -37,18 +129,79 @@ class NLPFeatureEngineering(TransformerMixin):
 
     def transform(self, input_data: pd.DataFrame) -> pd.DataFrame:
         for feature in self.features:
-            input_data[feature] = input_data[feature].astype(str)
-            input_data[feature] = input_data[feature].str.lower()
-            logger.info("Removing tabs and newlines")
-            input_data[feature] = input_data[feature].replace(r"\n|\t", " ")
-            logger.info("Normalizing text")
-            input_data[feature] = input_data[feature].apply(self.normalize_text)
-            for func_name, func in self.gsp_text_cleaning.items():
-                logger.info(f"Starting feature engineering step: {func_name}")
-                input_data[feature] = input_data[feature].apply(lambda x: func(x))
-        input_data['1A_compound_score'] = input_data['item1A_summary'].apply(self.calculate_sentiment)
-        input_data['3_compound_score'] = input_data['item3_summary'].apply(self.calculate_sentiment)
-        input_data['7_compound_score'] = input_data['item7_summary'].apply(self.calculate_sentiment)
-        input_data['7A_compound_score'] = input_data['item7A_summary'].apply(self.calculate_sentiment)
+            if self.gsp_text_cleaning is None:
+                input_data[feature] = self._run_step(f"{feature}.clean_text", self.clean_text, input_data[feature])
+            else:
+                input_data[feature] = self._clean_text_stepwise(feature, input_data[feature])
+        scores = self._run_step("sentiment", self.score_sentiment_features, input_data)
+        for score in scores:
+            input_data[score] = scores[score]
 
         return input_data
+
+    @staticmethod
+    def clean_text(values: pd.Series) -> pd.Series:
+        """Clean texts with the TextNormalizer.
+
+        A company's summaries are repeated on each of its policies, so each distinct text is only cleaned once.
+
+        Args:
+            values: The texts. Values that are not strings are cleaned as strings.
+
+        Returns:
+            The cleaned texts.
+        """
+        normalizer = TextNormalizer()
+        codes, texts = pd.factorize(values.astype(str))
+        cleaned_texts = np.array([normalizer(text) for text in texts], dtype=object)
+        return pd.Series(cleaned_texts[codes], index=values.index, name=values.name, dtype=object)
+
+    def _clean_text_stepwise(self, feature: str, values: pd.Series) -> pd.Series:
+        values = self._run_step(f"{feature}.to_str", lambda x: x.astype(str), values)
+        values = self._run_step(f"{feature}.lower", lambda x: x.str.lower(), values)
+        logger.info("Removing tabs and newlines")
+        values = self._run_step(
+            f"{feature}.remove_tabs_and_newlines", lambda x: x.replace(LITERAL_TABS_AND_NEWLINES, " "), values
+        )
+        logger.info("Normalizing text")
+        values = self._run_step(f"{feature}.normalize_text", lambda x: x.apply(self.normalize_text), values)
+        for func_name, func in self.gsp_text_cleaning.items():
+            logger.info(f"Starting feature engineering step: {func_name}")
+            values = self._run_step(f"{feature}.{func_name}", lambda x: x.apply(func), values)
+        return values
+
+    def score_sentiment_features(self, input_data: pd.DataFrame) -> pd.DataFrame:
+        """Score the sentiment of every summary.
+
+        The summaries of all the features are scored in one pass, in batches, which are spread across a process pool
+        when there are several workers. Each process loads the sentiment analyzer once.
+
+        Args:
+            input_data: The summaries.
+
+        Returns:
+            A Pandas DataFrame of the compound score of each summary, one column per feature.
+        """
+        texts = np.concatenate([input_data[feature].to_numpy(dtype=object) for feature in SentimentScoreFeatures])
+        batches = [
+            texts[start:start + SENTIMENT_BATCH_SIZE].tolist() for start in range(0, len(texts), SENTIMENT_BATCH_SIZE)
+        ]
+        n_workers = min(self.n_workers or os.cpu_count() or 1, len(batches))
+        if n_workers <= 1:
+            batch_scores = [score_sentiment(batch) for batch in batches]
+        else:
+            logger.info(f"Scoring the sentiment of {len(texts)} texts in {n_workers} processes")
+            # Spawned workers start from a fresh interpreter, rather than forking a parent that may hold large frames
+            mp_context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=n_workers, mp_context=mp_context) as executor:
+                batch_scores = list(executor.map(score_sentiment, batches))
+
+        scores = np.concatenate(batch_scores) if batch_scores else np.empty(0)
+        return pd.DataFrame(
+            scores.reshape(len(SentimentScoreFeatures), len(input_data)).T,
+            index=input_data.index,
+            columns=list(SentimentScoreFeatures.values()),
+        )
+
+    def _run_step(self, step: str, func, values: Union[pd.Series, pd.DataFrame]) -> Union[pd.Series, pd.DataFrame]:
+        return profile_stage(self.profiler, f"NLPFeatureEngineering.{step}", func, values)
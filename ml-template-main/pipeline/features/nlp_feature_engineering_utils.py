@@ -54,3 +54,15 @@ sw_to_remove = [
     "hers",
     "nowhere",
 ]
+
+# Stop words removed from the summaries: gensim's, and the extra ones above
+SummaryStopwords = frozenset(gsp.STOPWORDS).union(sw_to_remove)
+
+
+# Compound sentiment score columns, keyed by the NLP feature each one scores
+SentimentScoreFeatures = {
+    'item1A_summary': '1A_compound_score',
+    'item3_summary': '3_compound_score',
+    'item7_summary': '7_compound_score',
+    'item7A_summary': '7A_compound_score',
+}
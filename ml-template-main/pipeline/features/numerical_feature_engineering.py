@@ -3,31 +3,156 @@
 Inspired by penguins/random forest tutorial here: https://datagy.io/sklearn-random-forests/
 """
 import logging
+from itertools import combinations
+from typing import Dict, List, Optional, Tuple
 
 import numpy as np
 import pandas as pd
 from lit_ds_utils.decorate.logging import log_function
 from sklearn.base import BaseEstimator, TransformerMixin
 from pipeline.config.dataclasses import ModellingFeatures, NonModellingFeatures, NumericalFeatures
+from pipeline.features.column_planner import ColumnStep, run_column_steps
+from pipeline.features.feature_engineering_utils import InteractionFeaturePairs
 
 logger = logging.getLogger(__name__)
 
 
+class InteractionFeatureGenerator(BaseEstimator, TransformerMixin):
+    """Builds interaction features, the products of groups of numerical features, as one new block.
+
+    The interactions are either named feature groups (e.g. pairs), or every combination of the given features up to
+    max_degree. All products of the same degree are computed in one NumPy operation over a matrix of the input
+    features, and the input frame is never modified.
+
+    Args:
+        interactions: The features multiplied together for each interaction, keyed by output column.
+        features: The features combined when no interactions are given.
+        max_degree: Largest number of features combined, when combining features.
+        dtype: Type of the interaction columns, e.g. np.float32 to halve their memory.
+    """
+
+    def __init__(
+        self,
+        interactions: Optional[Dict[str, Tuple[str, ...]]] = None,
+        features: Optional[List[str]] = None,
+        max_degree: int = 2,
+        dtype: type = np.float64,
+    ):
+        self.interactions = interactions
+        self.features = features
+        self.max_degree = max_degree
+        self.dtype = dtype
+
+    def get_interactions(self) -> Dict[str, Tuple[str, ...]]:
+        """The features multiplied together for each interaction.
+
+        Returns:
+            The interactions, keyed by output column.
+        """
+        if self.interactions is not None:
+            return self.interactions
+        return {
+            "_x_".join(group): group
+            for degree in range(2, self.max_degree + 1)
+            for group in combinations(self.features, degree)
+        }
+
+    def fit(self, input_data, y=None):
+        return self
+
+    def transform(self, input_data: pd.DataFrame) -> pd.DataFrame:
+        interactions = self.get_interactions()
+        inputs = list(dict.fromkeys(feature for group in interactions.values() for feature in group))
+        matrix = input_data[inputs].to_numpy(dtype=self.dtype)
+        positions = {feature: position for position, feature in enumerate(inputs)}
+
+        block = np.empty((len(input_data), len(interactions)), dtype=self.dtype)
+        names = list(interactions)
+        for degree in sorted({len(group) for group in interactions.values()}):
+            columns = [column for column, name in enumerate(names) if len(interactions[name]) == degree]
+            # Indices of the multiplied features, one row per interaction of this degree
+            indices = np.array([[positions[feature] for feature in interactions[names[column]]] for column in columns])
+            block[:, columns] = np.prod(matrix[:, indices], axis=2)
+
+        return pd.DataFrame(block, index=input_data.index, columns=names, copy=False)
+
+
 class NumericalFeatureEngineering(BaseEstimator, TransformerMixin):
-    """Performs Feature Engineering on categorical features"""
+    """Performs Feature Engineering on categorical features
+
+    The interactions are constructor parameters, so they are part of `get_params`, and of the feature cache key.
+
+    Args:
+        interactions: The features multiplied together for each interaction, keyed by output column. Defaults to
+            InteractionFeaturePairs, unless features are given.
+        features: The features combined when no interactions are given.
+        max_degree: Largest number of features combined, when combining features.
+        interaction_dtype: Type of the interaction columns.
+    """
+
+    def __init__(
+        self,
+        interactions: Optional[Dict[str, Tuple[str, ...]]] = None,
+        features: Optional[List[str]] = None,
+        max_degree: int = 2,
+        interaction_dtype: type = np.float64,
+    ):
+        self.interactions = interactions
+        self.features = features
+        self.max_degree = max_degree
+        self.interaction_dtype = interaction_dtype
 
     def fit(self, input_data, y=None):
         return self
 
+    def __sklearn_is_fitted__(self) -> bool:
+        # Stateless, so always ready to transform
+        return True
+
     def transform(self, input_data: pd.DataFrame):
         logger.debug("Input data shape before numerical feature engineering {}".format(input_data.shape))
-        input_data[ModellingFeatures.exposure_amt] = input_data[ModellingFeatures.exposure_amt]/1000
-        input_data['state_industry_interact'] = input_data[ModellingFeatures.state] * input_data[ModellingFeatures.industry]
-        input_data['state_has10k_interac'] = input_data[ModellingFeatures.state] * input_data[ModellingFeatures.has_10k]
-        input_data['state_expsramt_interac'] = input_data[ModellingFeatures.state] * input_data[ModellingFeatures.exposure_amt]
-        input_data['industry_has10k_interac'] = input_data[ModellingFeatures.industry] * input_data[ModellingFeatures.has_10k]
-        input_data['industry_expsramt_interac'] = input_data[ModellingFeatures.industry] * input_data[ModellingFeatures.exposure_amt]
-        input_data['expsramt_has10k_interac'] = input_data[ModellingFeatures.exposure_amt] * input_data[ModellingFeatures.has_10k]
-        logger.debug("Input data shape after numerical feature engineering {}".format(input_data.shape))
+        # The steps replace columns rather than writing into them, so a shallow copy leaves the input unchanged, and
+        # transforming the same frame twice gives the same result
+        output_data = run_column_steps(input_data.copy(deep=False), self.column_steps())
+        logger.debug("Input data shape after numerical feature engineering {}".format(output_data.shape))
+        return output_data
+
+    def column_steps(self) -> List[ColumnStep]:
+        """The steps of the transform, and the columns each reads and writes.
+
+        Returns:
+            The steps, in the order they run.
+        """
+        interactions = self._interaction_generator().get_interactions()
+        interaction_features = tuple(dict.fromkeys(f for group in interactions.values() for f in group))
+        return [
+            ColumnStep(
+                "scale_exposure_amt",
+                reads=(ModellingFeatures.exposure_amt,),
+                writes=(ModellingFeatures.exposure_amt,),
+                apply=self._scale_exposure_amt,
+            ),
+            ColumnStep(
+                "interactions",
+                reads=interaction_features,
+                writes=tuple(interactions),
+                apply=self._add_interactions,
+            ),
+        ]
+
+    @staticmethod
+    def _scale_exposure_amt(input_data: pd.DataFrame) -> pd.DataFrame:
+        input_data[ModellingFeatures.exposure_amt] = input_data[ModellingFeatures.exposure_amt] / 1000
         return input_data
 
+    def _add_interactions(self, input_data: pd.DataFrame) -> pd.DataFrame:
+        interactions = self._interaction_generator().transform(input_data)
+        return pd.concat([input_data, interactions], axis=1, copy=False)
+
+    def _interaction_generator(self) -> InteractionFeatureGenerator:
+        interactions = self.interactions
+        if interactions is None and self.features is None:
+            interactions = InteractionFeaturePairs
+        return InteractionFeatureGenerator(
+            interactions, features=self.features, max_degree=self.max_degree, dtype=self.interaction_dtype
+        )
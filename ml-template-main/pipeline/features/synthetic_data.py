@@ -0,0 +1,96 @@
+"""Copyright (c) 2022, Liberty Mutual Group."""
+import logging
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+from pipeline.config.dataclasses import ModellingFeatures, NonModellingFeatures, TargetFeature
+from pipeline.features.feature_engineering_utils import GDP, IndustryGrouping, LitigationGrouping
+from pipeline.features.nlp_feature_engineering_utils import NLPFeatures
+
+logger = logging.getLogger(__name__)
+
+# Relative number of policies written in a state, by the state's GDP group: larger economies write more policies
+STATE_WEIGHTS_BY_GDP = {"High": 8.0, "Moderate-High": 4.0, "Moderate": 2.0, "Low-Moderate": 1.0, "Low": 0.5}
+# Claim rate of a policy, by the litigation group of its state
+TARGET_RATE_BY_LITIGATION = {"High": 0.2, "Moderate-High": 0.15, "Moderate": 0.1, "Low-Moderate": 0.07, "Low": 0.05}
+EXPOSURE_BASES = ["Payroll", "Sales"]
+POLICY_YEARS = np.arange(2012, 2018)
+
+# Words of the synthetic 10-K summaries. Stop words, punctuation, markup and accents are mixed in so every text
+# cleaning step has something to do.
+SUMMARY_WORDS = [
+    "risk", "litigation", "claims", "exposure", "revenue", "regulatory", "adverse", "material", "liquidity", "market",
+    "interest", "rate", "currency", "supply", "chain", "cybersecurity", "breach", "pandemic", "growth", "decline",
+    "favorable", "strong", "weak", "loss", "profit", "uncertain", "compliance", "environmental", "injury", "safety",
+    "the", "and", "of", "to", "in", "not", "more", "less", "against", "through",
+    "results,", "operations.", "(see", "note)", "<b>significant</b>", "naïve", "café", "rôle", "n°", "ﬁnancial",
+]
+
+
+def make_synthetic_policies(n_rows: int, seed: int = 0, text: bool = True, words_per_summary: int = 50) -> pd.DataFrame:
+    """Synthesize policies shaped like the training data, e.g. to benchmark the feature engineering at any scale.
+
+    The frame has the modelling, non-modelling and target features, with the categorical features dictionary-encoded
+    as when the dataset is loaded. States are drawn in proportion to their GDP group, and industries uniformly from
+    the industry grouping, so every group is represented; the target rate depends on the state's litigation group, so
+    the target encoding has a signal to learn.
+
+    Args:
+        n_rows: Number of policies.
+        seed: Seed of the random number generator, so the same policies are synthesized each time.
+        text: Synthesize the 10-K summaries of the NLP features too. They dominate the generation time and memory.
+        words_per_summary: Number of words of each summary.
+
+    Returns:
+        The policies.
+    """
+    rng = np.random.default_rng(seed)
+    states = list(GDP)
+    state_weights = np.array([STATE_WEIGHTS_BY_GDP[GDP[state]] for state in states])
+    state_codes = rng.choice(len(states), n_rows, p=state_weights / state_weights.sum())
+    target_rates = np.array([TARGET_RATE_BY_LITIGATION[LitigationGrouping[state]] for state in states])
+
+    policies = pd.DataFrame(
+        {
+            NonModellingFeatures.account_number: np.arange(n_rows),
+            NonModellingFeatures.policy_year: rng.choice(POLICY_YEARS, n_rows),
+            NonModellingFeatures.lob: pd.Categorical.from_codes(np.zeros(n_rows, dtype=np.int8), ["wc"]),
+            NonModellingFeatures.split: "train",
+            ModellingFeatures.state: pd.Categorical.from_codes(state_codes, states),
+            ModellingFeatures.industry: pd.Categorical.from_codes(
+                rng.integers(0, len(IndustryGrouping), n_rows), list(IndustryGrouping)
+            ),
+            ModellingFeatures.exposure_base: pd.Categorical.from_codes(
+                rng.integers(0, len(EXPOSURE_BASES), n_rows), EXPOSURE_BASES
+            ),
+            ModellingFeatures.exposure_amt: rng.lognormal(mean=11.0, sigma=1.5, size=n_rows),
+            ModellingFeatures.has_10k: rng.integers(0, 2, n_rows, dtype=np.int8),
+            TargetFeature.target: (rng.random(n_rows) < target_rates[state_codes]).astype(np.int8),
+        }
+    )
+    if text:
+        policies = policies.assign(**make_synthetic_summaries(n_rows, rng, words_per_summary))
+    return policies
+
+
+def make_synthetic_summaries(
+    n_rows: int, rng: np.random.Generator, words_per_summary: int = 50
+) -> Dict[str, List[str]]:
+    """Synthesize the 10-K summaries of the NLP features.
+
+    Args:
+        n_rows: Number of summaries of each feature.
+        rng: The random number generator.
+        words_per_summary: Number of words of each summary.
+
+    Returns:
+        The summaries, keyed by NLP feature.
+    """
+    words = np.array(SUMMARY_WORDS, dtype=object)
+    summaries = {}
+    for feature in NLPFeatures:
+        word_indices = rng.integers(0, len(words), (n_rows, words_per_summary))
+        summaries[feature] = [" ".join(row) for row in words[word_indices]]
+    return summaries
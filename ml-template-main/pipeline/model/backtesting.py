@@ -0,0 +1,167 @@
+"""Copyright (c) 2022, Liberty Mutual Group."""
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Any, Dict, Optional
+
+import pandas as pd
+from lit_ds_utils.decorate.logging import log_function
+from threadpoolctl import threadpool_limits
+
+from ..config.dataclasses import NonModellingFeatures
+from ..deployment.model_wrapper import ModelWrapper
+from ..features.feature_pipeline import FeaturePipeline
+from .build import build_model
+from .evaluation import evaluate_model
+from .splitting import WINDOW_EXPANDING, BacktestFold, make_backtest_folds
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - not available on Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# Environment variables read by native libraries (BLAS, OpenMP, LightGBM, PyTorch, ...) that are loaded after the
+# worker starts, e.g. by AutoGluon when it fits a model
+THREAD_LIMIT_VARIABLES = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "NUMEXPR_NUM_THREADS")
+
+FOLD_COLUMNS = ["fold", "test_year", "train_years", "n_train", "n_test", "duration_s"]
+
+
+@log_function()
+def run_backtest(
+    input_df: pd.DataFrame,
+    n_folds: int,
+    window: str = WINDOW_EXPANDING,
+    window_years: Optional[int] = None,
+    max_workers: Optional[int] = None,
+    cpus_per_fold: Optional[int] = None,
+    memory_per_fold_bytes: Optional[int] = None,
+) -> pd.DataFrame:
+    """Train and evaluate a model on each backtest fold, running the folds concurrently.
+
+    Each fold runs feature engineering, `build_model` and `evaluate_model` in its own worker process. The workers are
+    capped to cpus_per_fold threads and, approximately, memory_per_fold_bytes of memory. Only max_workers folds are
+    submitted at a time, so only their train and test frames are copied to the workers at once.
+
+    Args:
+        input_df: Unprocessed data covering all the fold years.
+        n_folds: Number of folds.
+        window: WINDOW_EXPANDING or WINDOW_SLIDING.
+        window_years: Number of training years of a sliding window.
+        max_workers: Number of folds run at the same time. Defaults to one per fold, up to the number of CPUs.
+        cpus_per_fold: Number of CPUs each fold may use. Defaults to no limit.
+        memory_per_fold_bytes: Approximate maximum memory of each fold's process, see `_limit_fold_resources`.
+            Defaults to no limit.
+
+    Returns:
+        The metrics of each fold, ordered by fold.
+    """
+    folds = make_backtest_folds(input_df[NonModellingFeatures.policy_year].unique(), n_folds, window, window_years)
+    max_workers = max_workers or min(len(folds), os.cpu_count() or 1)
+    logger.info(f"Running {len(folds)} backtest folds on {max_workers} workers: {folds}")
+
+    results = []
+    # Spawned workers start from a fresh interpreter, rather than forking a parent that may hold large frames and
+    # native thread pools
+    with ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_limit_fold_resources,
+        initargs=(cpus_per_fold, memory_per_fold_bytes),
+    ) as executor:
+        policy_years = input_df[NonModellingFeatures.policy_year]
+        pending = set()
+        for fold in folds:
+            if len(pending) >= max_workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                results.extend(future.result() for future in done)
+            train_df = input_df[policy_years.isin(fold.train_years)]
+            test_df = input_df[policy_years == fold.test_year]
+            pending.add(executor.submit(_run_fold, fold, train_df, test_df, cpus_per_fold))
+        results.extend(future.result() for future in wait(pending).done)
+
+    fold_metrics = pd.DataFrame(results).sort_values("fold").reset_index(drop=True)
+    logger.info(f"Backtest metrics:\n{summarize_backtest(fold_metrics)}")
+    return fold_metrics
+
+
+def summarize_backtest(fold_metrics: pd.DataFrame) -> pd.DataFrame:
+    """Aggregate the metrics of the backtest folds.
+
+    Args:
+        fold_metrics: The metrics of each fold, from `run_backtest`.
+
+    Returns:
+        The mean, standard deviation, minimum and maximum of each metric across the folds.
+    """
+    metric_columns = [column for column in fold_metrics.columns if column not in FOLD_COLUMNS]
+    return fold_metrics[metric_columns].agg(["mean", "std", "min", "max"])
+
+
+def _limit_fold_resources(cpus_per_fold: Optional[int], memory_per_fold_bytes: Optional[int]) -> None:
+    """Cap the threads and memory of a backtest worker process.
+
+    The memory cap is RLIMIT_DATA: the heap and the private writable mappings, where allocations live, rather than
+    RLIMIT_AS, the whole address space, which the thread stacks and reserved arenas of native libraries (BLAS, OpenMP,
+    PyTorch) inflate far beyond the memory they use. It is still approximate: it counts memory that is mapped but
+    never touched, and not shared or file-backed memory. A fold that exceeds it fails with a MemoryError.
+
+    Args:
+        cpus_per_fold: Maximum number of threads of each native thread pool.
+        memory_per_fold_bytes: Maximum data memory of the process.
+    """
+    if cpus_per_fold:
+        for variable in THREAD_LIMIT_VARIABLES:
+            os.environ[variable] = str(cpus_per_fold)
+        # Thread pools of libraries that were already loaded, e.g. numpy's BLAS, ignore the environment variables
+        threadpool_limits(limits=cpus_per_fold)
+    if memory_per_fold_bytes and resource is not None:
+        resource.setrlimit(resource.RLIMIT_DATA, (memory_per_fold_bytes, memory_per_fold_bytes))
+
+
+def _run_fold(
+    fold: BacktestFold, train_df: pd.DataFrame, test_df: pd.DataFrame, cpus_per_fold: Optional[int]
+) -> Dict[str, Any]:
+    """Train and evaluate the model of one backtest fold.
+
+    Args:
+        fold: The fold.
+        train_df: Unprocessed training data of the fold.
+        test_df: Unprocessed test data of the fold.
+        cpus_per_fold: Number of CPUs the model may use.
+
+    Returns:
+        The fold and its metrics.
+    """
+    start = time.perf_counter()
+    working_dir = os.getcwd()
+    # Each fold runs in its own directory, so that concurrent folds do not overwrite each other's AutoGluon models
+    fold_dir = tempfile.mkdtemp(prefix=f"backtest-fold-{fold.fold}-")
+    os.chdir(fold_dir)
+    try:
+        logger.info(f"Training backtest fold {fold.fold} on {fold.train_years}, testing on {fold.test_year}")
+        feature_pipeline = FeaturePipeline()
+        processed_train_df = feature_pipeline.fit_transform(train_df)
+        wrapper = ModelWrapper()
+        wrapper.feature_pipeline = feature_pipeline
+        wrapper.model = build_model(train_df=processed_train_df, num_cpus=cpus_per_fold)
+        metrics = evaluate_model(wrapper, test_df)
+    finally:
+        os.chdir(working_dir)
+        shutil.rmtree(fold_dir, ignore_errors=True)
+
+    return {
+        "fold": fold.fold,
+        "test_year": fold.test_year,
+        "train_years": fold.train_years,
+        "n_train": len(train_df),
+        "n_test": len(test_df),
+        "duration_s": time.perf_counter() - start,
+        **metrics,
+    }
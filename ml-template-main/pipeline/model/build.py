@@ -1,6 +1,6 @@
 """Copyright (c) 2022, Liberty Mutual Group."""
 import logging
-from typing import Any
+from typing import Any, List, Optional
 
 import pandas as pd
 from lit_ds_utils.decorate.logging import log_function
@@ -16,12 +16,24 @@ logger = logging.getLogger(__name__)
 
 
 @log_function()
-def build_model(train_df: pd.DataFrame, gpu: bool = False) -> Any:
+def build_model(
+    train_df: pd.DataFrame,
+    gpu: bool = False,
+    num_cpus: Optional[int] = None,
+    time_limit: int = 10000,
+    presets: Optional[List[str]] = None,
+    hyperparameters: Optional[str] = None,
+) -> Any:
     """Build the model.
 
     Args:
         train_df: DataFrame with features to train. Includes label.
         gpu: Whether there is a GPU to use multimodal
+        num_cpus: Maximum number of CPUs each model may use while fitting. Defaults to all of them.
+        time_limit: AutoGluon time limit, in seconds.
+        presets: AutoGluon tabular presets. Defaults to medium quality, optimized for deployment. With 'ignore_text',
+            the text n-gram and special features are not generated.
+        hyperparameters: Name of an AutoGluon hyperparameter config, e.g. 'very_light'. Defaults to the presets' own.
 
     Returns:
         The trained model object.
@@ -29,18 +41,26 @@ def build_model(train_df: pd.DataFrame, gpu: bool = False) -> Any:
     if gpu:
         predictor = MultiModalPredictor(label='target', eval_metric='log_loss', presets='medium_quality').fit(
             train_data=train_df,
-            time_limit=10000,
+            time_limit=time_limit,
         )
     else:
         feature_metadata = FeatureMetadata.from_df(train_df)
-        hyperparameters = get_hyperparameter_config('extreme')
+        ag_args_fit = {'num_cpus': num_cpus} if num_cpus else None
+        presets = presets or ['medium_quality', 'optimize_for_deployment']
+        # The feature generator is passed explicitly, which overrides the one the 'ignore_text' preset configures
+        text_features = 'ignore_text' not in presets
         predictor = TabularPredictor(label='target', eval_metric='log_loss', sample_weight='balance_weight').fit(
             train_data=train_df,
-            # hyperparameters=hyperparameters,
+            hyperparameters=get_hyperparameter_config(hyperparameters) if hyperparameters else None,
             feature_metadata=feature_metadata,
-            time_limit=10000,
-            presets=['medium_quality', 'optimize_for_deployment'],
-            feature_generator=AutoMLPipelineFeatureGenerator(vectorizer=TfidfVectorizer())
+            ag_args_fit=ag_args_fit,
+            time_limit=time_limit,
+            presets=presets,
+            feature_generator=AutoMLPipelineFeatureGenerator(
+                vectorizer=TfidfVectorizer(),
+                enable_text_ngram_features=text_features,
+                enable_text_special_features=text_features,
+            )
         )
 
     predictor_size = get_directory_size(predictor.path)
@@ -4,7 +4,7 @@ import tempfile
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
 from shutil import copy, copytree, ignore_patterns
-from typing import Any, List, Dict
+from typing import Any, List, Dict, Optional
 
 import dateutil.tz
 import mlflow
@@ -23,7 +23,8 @@ from ..config.constants import (
     BASE_PATH,
     DATABRICKS_EXPERIMENT_NAME,
     DATABRICKS_GROUP_NAME,
-    DATABRICKS_REGISTERED_MODEL_NAME
+    DATABRICKS_REGISTERED_MODEL_NAME,
+    FEATURE_PIPELINE_ARTIFACT,
 )
 from ..deployment.model_wrapper import ModelWrapper
 from ..features.feature_engineering import do_feature_engineering
@@ -35,12 +36,21 @@ GROUP_NAME = settings.str(DATABRICKS_GROUP_NAME)
 logger = logging.getLogger(__name__)
 
 
-def wrap_and_log_model(model: Any, test_df: pd.DataFrame) -> None:
+def wrap_and_log_model(
+    model: Any,
+    test_df: pd.DataFrame,
+    params: Optional[Dict[str, Any]] = None,
+    tags: Optional[Dict[str, str]] = None,
+    metrics: Optional[Dict[str, float]] = None,
+) -> None:
     """Wrap and log a model to MLFlow.
 
     Args:
         model: The model.
         test_df: Unprocessed test dataframe.
+        params: Parameters of the training run, e.g. the training mode and sample size. Optional.
+        tags: Extra tags of the training run, e.g. whether the features were read from the feature cache. Optional.
+        metrics: Extra metrics of the training run, e.g. the profile of the feature engineering. Optional.
     """
     # Create the model wrapper
     wrapper = ModelWrapper()
@@ -57,10 +67,18 @@ def wrap_and_log_model(model: Any, test_df: pd.DataFrame) -> None:
         # Log the model metrics in mlflow.
         logger.info("Logging metrics with mlflow")
         _log_metrics(log_loss)
+        if metrics:
+            mlflow.log_metrics(metrics)
+
+        if params:
+            logger.info("Logging params with mlflow")
+            mlflow.log_params(params)
 
         # Log additional tags.
         logger.info("Logging tags with mlflow")
         _log_additional_tags()
+        if tags:
+            mlflow.set_tags(tags)
 
         # Log artifacts.
         # logger.info("Logging artifacts with mlflow")
@@ -70,7 +88,7 @@ def wrap_and_log_model(model: Any, test_df: pd.DataFrame) -> None:
         model_name = None if str(MODEL_NAME).upper() == "NONE" or not MODEL_NAME.strip() else MODEL_NAME
 
         artifacts = {"predictor_path": model.path,
-                     "target_encoder": 'target_encoder.pkl'}
+                     "feature_pipeline": str(FEATURE_PIPELINE_ARTIFACT)}
 
         logger.info("Logging a model with MLFlow. Experiment name: %s. Model name: %s", EXPERIMENT_NAME, model_name)
         model_info = mlflow.pyfunc.log_model(
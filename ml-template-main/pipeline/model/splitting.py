@@ -0,0 +1,236 @@
+"""Copyright (c) 2022, Liberty Mutual Group."""
+import logging
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from ..config.constants import TEST_POLICY_YEAR
+from ..config.dataclasses import (
+    ModellingFeatures,
+    NonModellingFeatures,
+    SubSampledTrainSplit,
+    TargetFeature,
+    TrainTestHoldoutSplit,
+)
+
+logger = logging.getLogger(__name__)
+
+TRAIN = "train"
+TEST = "test"
+HOLDOUT = "holdout"
+SPLITS = [TRAIN, TEST, HOLDOUT]
+
+# Partition column of split datasets written to disk. The raw data already has a "split" column, so it is not reused.
+SPLIT_PARTITION_COLUMN = "data_split"
+
+WINDOW_EXPANDING = "expanding"
+WINDOW_SLIDING = "sliding"
+
+
+@dataclass()
+class BacktestFold:
+    """Policy years used to train and test one backtest fold."""
+
+    fold: int
+    train_years: List[int]
+    test_year: int
+
+
+def make_backtest_folds(
+    policy_years: Iterable[int], n_folds: int, window: str = WINDOW_EXPANDING, window_years: Optional[int] = None
+) -> List[BacktestFold]:
+    """Build rolling-origin folds over policy years.
+
+    The last n_folds policy years are each tested once, on a model trained on the years before them: all of them for an
+    expanding window, or the last window_years of them for a sliding window.
+
+    Args:
+        policy_years: The policy years in the data. Duplicates are ignored.
+        n_folds: Number of folds.
+        window: WINDOW_EXPANDING or WINDOW_SLIDING.
+        window_years: Number of training years of a sliding window.
+
+    Returns:
+        The folds, ordered by test year.
+
+    Raises:
+        ValueError: If the window is unknown, or there are too few policy years for the folds.
+    """
+    years = sorted({int(year) for year in policy_years})
+    if window not in (WINDOW_EXPANDING, WINDOW_SLIDING):
+        raise ValueError(f"Unknown backtest window: {window}")
+    if window == WINDOW_SLIDING and (window_years is None or window_years < 1):
+        raise ValueError("A sliding window needs a positive number of window years")
+    if n_folds < 1 or n_folds >= len(years):
+        raise ValueError(f"{n_folds} folds need at least {n_folds + 1} policy years, got {years}")
+
+    folds = []
+    for fold, test_year in enumerate(years[-n_folds:]):
+        train_years = [year for year in years if year < test_year]
+        if window == WINDOW_SLIDING:
+            train_years = train_years[-window_years:]
+        folds.append(BacktestFold(fold=fold, train_years=train_years, test_year=test_year))
+    return folds
+
+
+def account_hash_fractions(account_numbers: pd.Series) -> np.ndarray:
+    """Map account numbers to stable pseudo-random fractions in [0, 1).
+
+    The hash has a fixed key, so an account always maps to the same fraction, across runs, machines and batches.
+    Account numbers are hashed as strings, so the result does not depend on whether a batch read them as integers or
+    strings.
+
+    Args:
+        account_numbers: The account numbers.
+
+    Returns:
+        One fraction per account number.
+    """
+    hashes = pd.util.hash_array(account_numbers.astype(str).to_numpy(dtype=object))
+    return hashes / np.float64(2**64)
+
+
+def assign_splits(
+    df: pd.DataFrame, test_policy_year: int = TEST_POLICY_YEAR, holdout_fraction: float = 0.0
+) -> pd.Categorical:
+    """Assign each row to the train, test or holdout split.
+
+    Rows of accounts whose hash fraction is below holdout_fraction go to the holdout split, so a held-out account
+    never appears in training or testing. The remaining rows are split on policy year: earlier years train and the
+    test year tests. Rows after the test year are not assigned. Each row is assigned independently of the others, so
+    batches of a stream can be split one at a time.
+
+    Args:
+        df: Dataframe with account number and policy year columns.
+        test_policy_year: Policy year of the test split.
+        holdout_fraction: Fraction of accounts held out.
+
+    Returns:
+        The split of each row, with missing values for unassigned rows.
+    """
+    policy_years = df[NonModellingFeatures.policy_year].to_numpy()
+
+    codes = np.full(len(df), -1, dtype=np.int8)
+    codes[policy_years < test_policy_year] = SPLITS.index(TRAIN)
+    codes[policy_years == test_policy_year] = SPLITS.index(TEST)
+    if holdout_fraction > 0:
+        holdout = account_hash_fractions(df[NonModellingFeatures.account_number]) < holdout_fraction
+        codes[holdout & (policy_years <= test_policy_year)] = SPLITS.index(HOLDOUT)
+    return pd.Categorical.from_codes(codes, categories=SPLITS)
+
+
+def split_train_test_holdout(
+    df: pd.DataFrame, test_policy_year: int = TEST_POLICY_YEAR, holdout_fraction: float = 0.0
+) -> TrainTestHoldoutSplit:
+    """Split a dataframe into train, test and holdout splits.
+
+    Args:
+        df: The dataframe to split.
+        test_policy_year: Policy year of the test split.
+        holdout_fraction: Fraction of accounts held out.
+
+    Returns:
+        The train, test and holdout splits.
+    """
+    splits = assign_splits(df, test_policy_year, holdout_fraction)
+    return TrainTestHoldoutSplit(
+        data_train=df[splits == TRAIN],
+        data_test=df[splits == TEST],
+        data_holdout=df[splits == HOLDOUT],
+    )
+
+
+def subsample_train_split(
+    train_df: pd.DataFrame,
+    sample_size: int,
+    seed: int,
+    strata: Optional[List[str]] = None,
+) -> SubSampledTrainSplit:
+    """Draw a reproducible stratified sample of a training split.
+
+    Each stratum is sampled in proportion to its size, keeping at least one row of it, so rare combinations of target
+    and state are still seen in training. Rows are drawn with seeded random keys, so the same data and seed always
+    give the same sample, in the original row order.
+
+    Args:
+        train_df: The training split.
+        sample_size: Approximate number of rows to sample.
+        seed: Seed of the random sample.
+        strata: Columns whose combinations are sampled proportionally. Defaults to the target and state.
+
+    Returns:
+        The sampled training split. The whole split is returned if it is no larger than sample_size.
+    """
+    if len(train_df) <= sample_size:
+        return SubSampledTrainSplit(data_train=train_df)
+
+    strata = strata or [TargetFeature.target, ModellingFeatures.state]
+    group_ids = train_df.groupby(strata, observed=True, sort=False, dropna=False).ngroup().to_numpy()
+    group_sizes = np.bincount(group_ids)
+    quotas = np.maximum(1, np.round(group_sizes * sample_size / len(train_df))).astype(np.int64)
+
+    # Rank the rows of each group by a random key, and keep the first quota of them
+    keys = np.random.default_rng(seed).random(len(train_df))
+    order = np.lexsort((keys, group_ids))
+    group_starts = np.concatenate([[0], np.cumsum(group_sizes)[:-1]])
+    ranks = np.empty(len(train_df), dtype=np.int64)
+    ranks[order] = np.arange(len(train_df)) - group_starts[group_ids[order]]
+
+    return SubSampledTrainSplit(data_train=train_df[ranks < quotas[group_ids]])
+
+
+def iter_split_batches(
+    batches: Iterable[pd.DataFrame], test_policy_year: int = TEST_POLICY_YEAR, holdout_fraction: float = 0.0
+) -> Iterator[Tuple[str, pd.DataFrame]]:
+    """Split a stream of batches, without holding more than one batch in memory.
+
+    Args:
+        batches: The batches, e.g. from `iter_dataset`.
+        test_policy_year: Policy year of the test split.
+        holdout_fraction: Fraction of accounts held out.
+
+    Yields:
+        The split name and the rows of one batch assigned to it. Empty splits are skipped.
+    """
+    for batch in batches:
+        splits = assign_splits(batch, test_policy_year, holdout_fraction)
+        for split in SPLITS:
+            split_batch = batch[splits == split]
+            if len(split_batch):
+                yield split, split_batch
+
+
+def write_split_batches(
+    batches: Iterable[pd.DataFrame],
+    output_dir: Path,
+    test_policy_year: int = TEST_POLICY_YEAR,
+    holdout_fraction: float = 0.0,
+) -> Dict[str, int]:
+    """Split a stream of batches and write each split to its own partition of a parquet dataset.
+
+    The output is hive-partitioned, e.g. output_dir/data_split=train/part-00000.parquet, so a single split can be read
+    back with `get_dataset(output_dir / "data_split=train")`, or all of them with `get_dataset(output_dir)`.
+
+    Args:
+        batches: The batches, e.g. from `iter_dataset`.
+        output_dir: Directory of the output dataset.
+        test_policy_year: Policy year of the test split.
+        holdout_fraction: Fraction of accounts held out.
+
+    Returns:
+        The number of rows written to each split.
+    """
+    row_counts = {split: 0 for split in SPLITS}
+    part_numbers = {split: 0 for split in SPLITS}
+    for split, split_batch in iter_split_batches(batches, test_policy_year, holdout_fraction):
+        split_dir = Path(output_dir) / f"{SPLIT_PARTITION_COLUMN}={split}"
+        split_dir.mkdir(parents=True, exist_ok=True)
+        split_batch.to_parquet(split_dir / f"part-{part_numbers[split]:05d}.parquet", index=False)
+        part_numbers[split] += 1
+        row_counts[split] += len(split_batch)
+
+    logger.info(f"Wrote splits to {output_dir}: {row_counts}")
+    return row_counts
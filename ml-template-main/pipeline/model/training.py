@@ -1,21 +1,33 @@
 """Copyright (c) 2022, Liberty Mutual Group."""
 import logging
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
 
 import pandas as pd
 from lit_ds_utils.decorate.logging import log_function
 from sklearn.model_selection import train_test_split
 
 from .. import settings
+from ..acquisition.acquire_data import get_dataset
 from ..config.constants import (
     DATABRICKS_EXPERIMENT_NAME,
     DATABRICKS_GROUP_NAME,
     DATABRICKS_REGISTERED_MODEL_NAME,
+    DEV_HYPERPARAMETERS,
+    DEV_PRESETS,
+    DEV_SAMPLE_SEED,
+    DEV_SAMPLE_SIZE,
+    DEV_TIME_LIMIT_S,
     MODEL_ARTIFACT,
+    TRAINING_MODE,
+    TRAINING_MODE_DEV,
+    TRAINING_MODE_FULL,
 )
 from ..utils.utils import save_local_artifact
 from .build import build_model
 from .log_model import wrap_and_log_model
+from .splitting import split_train_test_holdout, subsample_train_split
 
 logger = logging.getLogger(__name__)
 
@@ -32,34 +44,113 @@ class TrainTestSplits:
     test_df: pd.DataFrame
 
 
+@dataclass()
+class TrainingConfig:
+    """How much data and time the model is trained with."""
+
+    mode: str = TRAINING_MODE_FULL
+    time_limit: int = 10000
+    presets: List[str] = field(default_factory=lambda: ["medium_quality", "optimize_for_deployment"])
+    hyperparameters: Optional[str] = None
+    sample_size: Optional[int] = None
+    sample_seed: Optional[int] = None
+
+    def to_params(self) -> Dict[str, Any]:
+        """MLflow parameters recording the training configuration.
+
+        Returns:
+            The parameters.
+        """
+        return {
+            "training_mode": self.mode,
+            "time_limit": self.time_limit,
+            "presets": ",".join(self.presets),
+            "hyperparameters": self.hyperparameters,
+            "sample_size": self.sample_size,
+            "sample_seed": self.sample_seed,
+        }
+
+
+def get_training_config() -> TrainingConfig:
+    """Create the training configuration for the TRAINING_MODE in settings.ini.
+
+    Returns:
+        The training configuration.
+
+    Raises:
+        ValueError: If the training mode is unknown.
+    """
+    mode = settings.str(TRAINING_MODE)
+    if mode == TRAINING_MODE_FULL:
+        return TrainingConfig()
+    if mode == TRAINING_MODE_DEV:
+        return TrainingConfig(
+            mode=mode,
+            time_limit=int(settings.str(DEV_TIME_LIMIT_S)),
+            presets=settings.str(DEV_PRESETS).split(","),
+            hyperparameters=settings.str(DEV_HYPERPARAMETERS),
+            sample_size=int(settings.str(DEV_SAMPLE_SIZE)),
+            sample_seed=int(settings.str(DEV_SAMPLE_SEED)),
+        )
+    raise ValueError(f"Unknown training mode: {mode}")
+
+
 @log_function()
-def train_and_log_model(train_df: pd.DataFrame, test_df: pd.DataFrame) -> None:
+def train_and_log_model(
+    train_df: Union[pd.DataFrame, str, Path],
+    test_df: Union[pd.DataFrame, str, Path],
+    training_config: Optional[TrainingConfig] = None,
+    tags: Optional[Dict[str, str]] = None,
+    metrics: Optional[Dict[str, float]] = None,
+) -> None:
     """Run an ML Flow experiment and log to databricks using the args sent in.
 
     Args:
-        train_df: Train df
-        test_df: Test df.
+        train_df: Train df, or the path of a dataset of processed training data, e.g. written by
+            `FeaturePipeline.transform_to_parquet`.
+        test_df: Test df, or the path of a dataset of processed test data.
+        training_config: Training configuration. Defaults to full training.
+        tags: Extra tags of the MLflow run, e.g. whether the features were read from the feature cache.
+        metrics: Extra metrics of the MLflow run, e.g. the profile of the feature engineering.
     """
-    logger.info("Building model")
-    model = build_model(train_df=train_df)
+    training_config = training_config or TrainingConfig()
+    if not isinstance(train_df, pd.DataFrame):
+        train_df = get_dataset(str(train_df))
+    if not isinstance(test_df, pd.DataFrame):
+        test_df = get_dataset(str(test_df))
+
+    logger.info(f"Building model in {training_config.mode} mode")
+    model = build_model(
+        train_df=train_df,
+        time_limit=training_config.time_limit,
+        presets=training_config.presets,
+        hyperparameters=training_config.hyperparameters,
+    )
     save_local_artifact(MODEL_ARTIFACT, model)
 
     logger.info("Logging model to MLFlow")
-    wrap_and_log_model(model, test_df=test_df)
+    params = {**training_config.to_params(), "train_rows": len(train_df)}
+    wrap_and_log_model(model, test_df=test_df, params=params, tags=tags, metrics=metrics)
 
 
 @log_function()
-def get_train_test_splits(input_df: pd.DataFrame) -> TrainTestSplits:
+def get_train_test_splits(
+    input_df: pd.DataFrame, training_config: Optional[TrainingConfig] = None
+) -> TrainTestSplits:
     """Split the supplied data into training, test and holdout splits.
 
     Args:
         input_df: The dataframe to split.
+        training_config: Training configuration. The training split is subsampled if it has a sample size.
 
     Returns:
         The train, test and holdout splits.
     """
+    splits = split_train_test_holdout(input_df)
+    train_df = splits.data_train
 
-    train_df = input_df[input_df['policy_year'] < 2017]
-    test_df = input_df[input_df['policy_year'] == 2017]
+    if training_config is not None and training_config.sample_size:
+        train_df = subsample_train_split(train_df, training_config.sample_size, training_config.sample_seed).data_train
+        logger.info(f"Subsampled the training split to {len(train_df)} of {len(splits.data_train)} rows")
 
-    return TrainTestSplits(train_df, test_df)
+    return TrainTestSplits(train_df, splits.data_test)
@@ -0,0 +1,135 @@
+"""Copyright (c) 2022, Liberty Mutual Group."""
+import json
+import logging
+import sys
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, List, Optional, Union
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - not available on Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# ru_maxrss is reported in bytes on macOS, and in kilobytes elsewhere
+MAXRSS_UNIT_BYTES = 1 if sys.platform == "darwin" else 1024
+
+
+@dataclass()
+class StageProfile:
+    """The resources used by one stage of a pipeline."""
+
+    stage: str
+    wall_time_s: float
+    cpu_time_s: float
+    peak_rss_delta_bytes: int
+    memory_before_bytes: int
+    memory_after_bytes: int
+
+
+class StageProfiler:
+    """Records the wall time, CPU time, peak RSS growth and frame memory of each stage of a pipeline.
+
+    Each stage is run through `run`, which measures it and emits its profile as one line of JSON in the log. The
+    profiles are kept, so they can be logged as MLflow metrics once a run is active, and compared between runs.
+
+    The peak RSS delta is the growth of the process's high-water mark during the stage, so a stage that stays below an
+    earlier peak shows no growth. The frame memory is `memory_usage(deep=True)`, which inspects every Python object of
+    object columns, so it can be turned off with deep_memory for large text columns.
+
+    Args:
+        name: Prefix of the stage names in the metrics, e.g. feature_engineering.
+        deep_memory: Measure the memory of object columns' contents, rather than only of their pointers.
+    """
+
+    def __init__(self, name: str = "feature_engineering", deep_memory: bool = True):
+        self.name = name
+        self.deep_memory = deep_memory
+        self.profiles: List[StageProfile] = []
+
+    def run(self, stage: str, func: Callable[[Any], Any], input_data: Union[pd.DataFrame, pd.Series]) -> Any:
+        """Run and profile a stage.
+
+        Args:
+            stage: Name of the stage.
+            func: The stage, which transforms a frame or series.
+            input_data: Input of the stage.
+
+        Returns:
+            The output of the stage.
+        """
+        memory_before = self._memory_usage(input_data)
+        peak_rss_before = peak_rss_bytes()
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        output_data = func(input_data)
+        wall_time = time.perf_counter() - wall_start
+        cpu_time = time.process_time() - cpu_start
+
+        profile = StageProfile(
+            stage=stage,
+            wall_time_s=wall_time,
+            cpu_time_s=cpu_time,
+            peak_rss_delta_bytes=peak_rss_bytes() - peak_rss_before,
+            memory_before_bytes=memory_before,
+            # Stages that fit rather than transform have no output frame, but may still have grown their input
+            memory_after_bytes=self._memory_usage(
+                output_data if isinstance(output_data, (pd.DataFrame, pd.Series)) else input_data
+            ),
+        )
+        self.profiles.append(profile)
+        logger.info(json.dumps({"profiler": self.name, **asdict(profile)}))
+        return output_data
+
+    def to_metrics(self) -> Dict[str, float]:
+        """The profiles as MLflow metrics, e.g. feature_engineering.CategoricalFeatureEngineering.fit.wall_time_s.
+
+        Stages run more than once, e.g. for the train and test data, are summed.
+
+        Returns:
+            The metrics.
+        """
+        metrics = {}
+        for profile in self.profiles:
+            for field, value in asdict(profile).items():
+                if field != "stage":
+                    key = f"{self.name}.{profile.stage}.{field}"
+                    metrics[key] = metrics.get(key, 0) + value
+        return metrics
+
+    def _memory_usage(self, data: Union[pd.DataFrame, pd.Series]) -> int:
+        if isinstance(data, pd.DataFrame):
+            return int(data.memory_usage(deep=self.deep_memory, index=True).sum())
+        return int(data.memory_usage(deep=self.deep_memory, index=True))
+
+
+def peak_rss_bytes() -> int:
+    if resource is None:
+        return 0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * MAXRSS_UNIT_BYTES
+
+
+def profile_stage(
+    profiler: Optional[StageProfiler],
+    stage: str,
+    func: Callable[[Any], Any],
+    input_data: Union[pd.DataFrame, pd.Series],
+) -> Any:
+    """Run a stage, profiling it if there is a profiler.
+
+    Args:
+        profiler: The profiler, or None to run the stage without profiling it.
+        stage: Name of the stage.
+        func: The stage, which transforms a frame or series.
+        input_data: Input of the stage.
+
+    Returns:
+        The output of the stage.
+    """
+    if profiler is None:
+        return func(input_data)
+    return profiler.run(stage, func, input_data)
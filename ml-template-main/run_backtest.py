@@ -0,0 +1,40 @@
+"""Copyright (c) 2022, Liberty Mutual Group."""
+import logging
+
+from pipeline import settings
+from pipeline.acquisition.acquire_data import TRAINING_COLUMNS, TRAINING_FILTERS, acquire_data
+from pipeline.config.constants import (
+    BACKTEST_CPUS_PER_FOLD,
+    BACKTEST_MAX_WORKERS,
+    BACKTEST_MEMORY_PER_FOLD_GB,
+    BACKTEST_N_FOLDS,
+    BACKTEST_WINDOW,
+    BACKTEST_WINDOW_YEARS,
+)
+from pipeline.model.backtesting import run_backtest
+
+logger = logging.getLogger(__name__)
+
+
+def run_backtest_pipeline() -> None:
+    """Backtest the model over the folds configured in settings.ini."""
+    logger.info("Getting training data")
+    input_data = acquire_data(columns=TRAINING_COLUMNS, filters=TRAINING_FILTERS)
+
+    logger.info("Running backtest")
+    fold_metrics = run_backtest(
+        input_data,
+        n_folds=int(settings.str(BACKTEST_N_FOLDS)),
+        window=settings.str(BACKTEST_WINDOW),
+        window_years=int(settings.str(BACKTEST_WINDOW_YEARS)),
+        max_workers=int(settings.str(BACKTEST_MAX_WORKERS)),
+        cpus_per_fold=int(settings.str(BACKTEST_CPUS_PER_FOLD)),
+        memory_per_fold_bytes=int(float(settings.str(BACKTEST_MEMORY_PER_FOLD_GB)) * 1024**3),
+    )
+
+    logger.info(f"Backtest fold metrics:\n{fold_metrics}")
+
+
+if __name__ == "__main__":
+    logger.info("Running backtest...")
+    run_backtest_pipeline()
@@ -0,0 +1,57 @@
+"""Copyright (c) 2022, Liberty Mutual Group."""
+import logging
+import sys
+from pathlib import Path
+
+from pipeline import settings
+from pipeline.config.constants import (
+    BASE_PATH,
+    BENCHMARK_BASELINE_PATH,
+    BENCHMARK_N_ROWS,
+    BENCHMARK_NLP_MAX_ROWS,
+    BENCHMARK_REGRESSION_THRESHOLD,
+    BENCHMARK_RESULTS_ARTIFACT,
+)
+from pipeline.features.feature_benchmark import (
+    find_regressions,
+    load_benchmark_results,
+    run_benchmarks,
+    save_benchmark_results,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def run_benchmark_pipeline() -> bool:
+    """Benchmark the feature engineering on synthetic data, and compare it with the baseline.
+
+    Returns:
+        Whether the benchmark is within the regression threshold of the baseline, or became the baseline.
+    """
+    sizes = [int(n_rows) for n_rows in settings.str(BENCHMARK_N_ROWS).split(",")]
+    results = run_benchmarks(sizes, nlp_max_rows=int(settings.str(BENCHMARK_NLP_MAX_ROWS)))
+    save_benchmark_results(results, BENCHMARK_RESULTS_ARTIFACT)
+    for result in results:
+        logger.info(
+            f"{result.stage} on {result.n_rows} rows: {result.rows_per_s:.0f} rows/s, "
+            f"peak RSS growth {result.peak_rss_delta_bytes / 1024**2:.0f} MiB"
+        )
+
+    baseline_path = Path(BASE_PATH) / settings.str(BENCHMARK_BASELINE_PATH)
+    if not baseline_path.exists():
+        logger.info(f"No baseline yet, saving the results as the baseline: {baseline_path}")
+        save_benchmark_results(results, baseline_path)
+        return True
+
+    regressions = find_regressions(
+        results, load_benchmark_results(baseline_path), float(settings.str(BENCHMARK_REGRESSION_THRESHOLD))
+    )
+    for regression in regressions:
+        logger.error(f"Performance regression: {regression}")
+    return not regressions
+
+
+if __name__ == "__main__":
+    logger.info("Running feature engineering benchmark...")
+    if not run_benchmark_pipeline():
+        sys.exit(1)
@@ -1,13 +1,34 @@
 """Copyright (c) 2022, Liberty Mutual Group."""
 import logging
+import shutil
 from pathlib import Path
+from typing import Iterator, Optional, Tuple
 
+import pandas as pd
 from lit_ds_utils.file_utils import delete_if_exists
 from lit_ds_utils.mlflow_utils import mlflow_authenticate
 
-from pipeline.acquisition.acquire_data import acquire_data
-from pipeline.features.feature_engineering import do_feature_engineering
-from pipeline.model.training import train_and_log_model, get_train_test_splits
+from pipeline import settings
+from pipeline.acquisition.acquire_data import (
+    TRAINING_COLUMNS,
+    TRAINING_FILTERS,
+    acquire_data,
+    acquire_data_batches,
+    iter_dataset,
+)
+from pipeline.config.constants import (
+    FEATURE_BATCH_SIZE_ROWS,
+    FEATURE_N_WORKERS,
+    FEATURE_PIPELINE_ARTIFACT,
+    FEATURE_PROFILING_ENABLED,
+    OUT_OF_CORE_DATA_DIR,
+    TRAINING_MODE_FULL,
+)
+from pipeline.features.feature_cache import MaterializedFeatures, get_default_feature_cache
+from pipeline.features.feature_pipeline import FeaturePipeline
+from pipeline.model.splitting import SPLIT_PARTITION_COLUMN, TEST, TRAIN, write_split_batches
+from pipeline.model.training import TrainTestSplits, get_training_config, train_and_log_model, get_train_test_splits
+from pipeline.utils.profiling import StageProfiler
 
 logger = logging.getLogger(__name__)
 
@@ -16,21 +37,101 @@ logger = logging.getLogger(__name__)
 def run_pipeline() -> None:
     """Train and log the model to MLFlow."""
 
+    training_config = get_training_config()
+    logger.info(f"Training in {training_config.mode} mode")
+
+    batch_size_rows = int(settings.str(FEATURE_BATCH_SIZE_ROWS))
+    if batch_size_rows and training_config.mode == TRAINING_MODE_FULL:
+        # Train straight from the feature datasets, without holding the raw data or its features in memory
+        train_path, test_path = _do_out_of_core_feature_engineering(batch_size_rows)
+        train_and_log_model(train_df=train_path, test_df=test_path, training_config=training_config)
+        return
+
     # Get training data
     logger.info("Getting training data")
-    input_data = acquire_data()
-    input_data_copy = input_data.copy()  # Preserve a copy of the original input data
+    input_data = acquire_data(columns=TRAINING_COLUMNS, filters=TRAINING_FILTERS)
 
     logger.info("Getting train/test/holdout splits")
-    train_test_splits = get_train_test_splits(input_data_copy)
+    # The splits are new frames, so the raw input data is never modified and does not need to be copied
+    train_test_splits = get_train_test_splits(input_data, training_config)
+    del input_data
 
     logger.info("Doing feature engineering")
-    processed_train_df = do_feature_engineering(train_test_splits.train_df, training=True)
-    processed_test_df = do_feature_engineering(train_test_splits.test_df, training=False)
+    profiler = StageProfiler() if settings.bool(FEATURE_PROFILING_ENABLED, False) else None
+    features, feature_cache_status = _do_feature_engineering(train_test_splits, profiler)
+    features.feature_pipeline.save(FEATURE_PIPELINE_ARTIFACT)
 
     # Train model and log in mlflow
-    train_and_log_model(train_df=processed_train_df,
-                        test_df=processed_test_df)
+    train_and_log_model(train_df=features.frames[TRAIN],
+                        test_df=features.frames[TEST],
+                        training_config=training_config,
+                        tags={"feature_cache": feature_cache_status},
+                        metrics=profiler.to_metrics() if profiler else None)
+
+
+def _do_feature_engineering(
+    train_test_splits: TrainTestSplits, profiler: Optional[StageProfiler] = None
+) -> Tuple[MaterializedFeatures, str]:
+    """Fit the feature engineering on the training split and process both splits, or read them from the cache.
+
+    Args:
+        train_test_splits: The unprocessed splits.
+        profiler: If given, each feature engineering step is profiled. Nothing is profiled on a cache hit.
+
+    Returns:
+        The features, and whether the feature cache was hit, missed, or is disabled.
+    """
+    n_workers = int(settings.str(FEATURE_N_WORKERS))
+
+    def compute() -> MaterializedFeatures:
+        feature_pipeline = FeaturePipeline().fit(train_test_splits.train_df, profiler=profiler)
+        frames = {
+            TRAIN: feature_pipeline.transform(train_test_splits.train_df, n_workers=n_workers, profiler=profiler),
+            TEST: feature_pipeline.transform(train_test_splits.test_df, n_workers=n_workers, profiler=profiler),
+        }
+        return MaterializedFeatures(feature_pipeline, frames)
+
+    feature_cache = get_default_feature_cache()
+    if feature_cache is None:
+        return compute(), "disabled"
+
+    input_data = {TRAIN: train_test_splits.train_df, TEST: train_test_splits.test_df}
+    # The worker count does not change the features, so it is not part of the configuration
+    config = {"feature_pipeline": FeaturePipeline().pipeline.get_params(deep=True)}
+    features, hit = feature_cache.fetch(input_data, compute, config)
+    return features, "hit" if hit else "miss"
+
+
+def _do_out_of_core_feature_engineering(batch_size_rows: int) -> Tuple[Path, Path]:
+    """Split the data and engineer its features batch by batch, so memory is bounded by the batch size.
+
+    Args:
+        batch_size_rows: Number of rows processed at a time.
+
+    Returns:
+        The paths of the train and test feature datasets.
+    """
+    split_dir = OUT_OF_CORE_DATA_DIR / "splits"
+    feature_dir = OUT_OF_CORE_DATA_DIR / "features"
+    shutil.rmtree(OUT_OF_CORE_DATA_DIR, ignore_errors=True)
+
+    logger.info("Getting train/test/holdout splits out of core")
+    batches = acquire_data_batches(batch_size_rows=batch_size_rows, columns=TRAINING_COLUMNS, filters=TRAINING_FILTERS)
+    write_split_batches(batches, split_dir)
+
+    logger.info("Doing feature engineering out of core")
+    feature_pipeline = FeaturePipeline().fit_streaming(_iter_split(split_dir, TRAIN, batch_size_rows))
+    feature_pipeline.save(FEATURE_PIPELINE_ARTIFACT)
+    for split in (TRAIN, TEST):
+        feature_pipeline.transform_to_parquet(_iter_split(split_dir, split, batch_size_rows), feature_dir / split)
+
+    return feature_dir / TRAIN, feature_dir / TEST
+
+
+def _iter_split(split_dir: Path, split: str, batch_size_rows: int) -> Iterator[pd.DataFrame]:
+    for batch in iter_dataset(str(split_dir / f"{SPLIT_PARTITION_COLUMN}={split}"), batch_size_rows=batch_size_rows):
+        # The split is read back from the partition's path, but is not a feature
+        yield batch.drop(columns=SPLIT_PARTITION_COLUMN)
 
 
 def _clean() -> None:
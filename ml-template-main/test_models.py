@@ -1,17 +1,20 @@
-import pandas as pd
 from dsc_2023_scoring_template import (
     configure_databricks,
     local_mlflow_prediction,
     validate_team_model
 )
 import os
+
+from pipeline.acquisition.acquire_data import get_dataset
+from pipeline.acquisition.dataset_cache import get_default_dataset_cache
+
 os.environ["MLFLOW_CONDA_HOME"] = "/opt/cortex-installs/miniconda"
 
 configure_databricks()
 
 team_name: str = "im-on-smoko"
 test_data_path: str = "s3://cortex-dsc-2023-data/sprint_data/sprint_train.parquet"
-test_data = pd.read_parquet(test_data_path)
+test_data = get_dataset(test_data_path, cache=get_default_dataset_cache())
 
 validate_team_model(
     team_name=team_name,
@@ -0,0 +1,325 @@
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+from pipeline.acquisition import acquire_data as acquire_data_module
+from pipeline.acquisition.acquire_data import TRAINING_COLUMNS, convert_to_arrow_ipc, get_dataset, iter_dataset
+from pipeline.acquisition.acquire_data_utils import (
+    CSV_SCHEMA_SIDECAR_SUFFIX,
+    apply_dtype_plan,
+    apply_filters,
+    arrow_table_to_pandas,
+    bind_partition_filters,
+    read_arrow_ipc,
+    read_csv_arrow,
+    write_arrow_ipc,
+)
+from pipeline.config.dataclasses import LoadTimeDtypes, NonModellingFeatures, TargetFeature, feature_names
+from pipeline.features.feature_pipeline import FeaturePipeline
+from pipeline.features.synthetic_data import make_synthetic_policies
+
+
+@pytest.fixture
+def sample_df() -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "account_number": range(1000),
+            "state": ["CA", "NY", "TX", "FL"] * 250,
+            "policy_year": [2015, 2016, 2017, 2018] * 250,
+            "target": [0, 1] * 500,
+        }
+    )
+
+
+def test_iter_dataset_parquet_yields_bounded_batches(tmp_path: Path, sample_df: pd.DataFrame) -> None:
+    path = str(tmp_path / "data.parquet")
+    sample_df.to_parquet(path, row_group_size=300)
+
+    batches = list(iter_dataset(path, batch_size_rows=128))
+
+    assert all(len(batch) <= 128 for batch in batches)
+    pd.testing.assert_frame_equal(pd.concat(batches, ignore_index=True), sample_df)
+
+
+@pytest.mark.parametrize("suffix", [".csv", ".json", ".jsonl"])
+def test_iter_dataset_text_formats_yield_bounded_batches(
+    tmp_path: Path, sample_df: pd.DataFrame, suffix: str
+) -> None:
+    path = str(tmp_path / f"data{suffix}")
+    if suffix == ".csv":
+        sample_df.to_csv(path, index=False)
+    else:
+        sample_df.to_json(path, orient="records", lines=suffix == ".jsonl")
+
+    batches = list(iter_dataset(path, batch_size_rows=300))
+
+    assert [len(batch) for batch in batches] == [300, 300, 300, 100]
+    pd.testing.assert_frame_equal(pd.concat(batches, ignore_index=True), sample_df)
+
+
+def test_iter_dataset_arrow_ipc_batch_size_in_bytes_reads_one_record_batch(
+    tmp_path: Path, sample_df: pd.DataFrame, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    path = str(tmp_path / "data.feather")
+    with pa.ipc.new_file(path, pa.Schema.from_pandas(sample_df, preserve_index=False)) as writer:
+        writer.write_table(pa.Table.from_pandas(sample_df, preserve_index=False), max_chunksize=250)
+    bytes_per_row = pa.Table.from_pandas(sample_df, preserve_index=False).nbytes / len(sample_df)
+    # The row size is estimated from the first record batch, without reading the whole file
+    monkeypatch.setattr(acquire_data_module, "read_arrow_ipc", None)
+
+    batches = list(iter_dataset(path, batch_size_bytes=int(bytes_per_row * 100)))
+
+    assert [len(batch) for batch in batches] == [100, 100, 50] * 4
+    pd.testing.assert_frame_equal(pd.concat(batches, ignore_index=True), sample_df)
+
+
+def test_iter_dataset_batch_size_in_bytes(tmp_path: Path, sample_df: pd.DataFrame) -> None:
+    path = str(tmp_path / "data.csv")
+    sample_df.to_csv(path, index=False)
+    bytes_per_row = sample_df.memory_usage(deep=True).sum() / len(sample_df)
+
+    batches = list(iter_dataset(path, batch_size_bytes=int(bytes_per_row * 100)))
+
+    assert len(batches) >= 10
+    assert all(len(batch) <= 100 for batch in batches)
+    assert sum(len(batch) for batch in batches) == len(sample_df)
+
+
+def test_iter_dataset_rejects_both_batch_sizes(tmp_path: Path) -> None:
+    with pytest.raises(ValueError):
+        next(iter_dataset(str(tmp_path / "data.parquet"), batch_size_rows=10, batch_size_bytes=10))
+
+
+def test_get_dataset_rejects_unsupported_format(tmp_path: Path) -> None:
+    with pytest.raises(ValueError):
+        get_dataset(str(tmp_path / "data.txt"))
+
+
+@pytest.mark.parametrize("suffix", [".parquet", ".csv"])
+def test_get_dataset_projects_columns_and_filters_rows(tmp_path: Path, sample_df: pd.DataFrame, suffix: str) -> None:
+    path = str(tmp_path / f"data{suffix}")
+    if suffix == ".parquet":
+        sample_df.to_parquet(path, row_group_size=100)
+    else:
+        sample_df.to_csv(path, index=False)
+
+    df = get_dataset(path, columns=["state", "target"], filters=[("policy_year", "<=", 2016)])
+
+    expected = sample_df.loc[sample_df["policy_year"] <= 2016, ["state", "target"]]
+    assert list(df.columns) == ["state", "target"]
+    pd.testing.assert_frame_equal(df.reset_index(drop=True), expected.reset_index(drop=True))
+
+
+def test_iter_dataset_parquet_pushes_down_filters(tmp_path: Path, sample_df: pd.DataFrame) -> None:
+    path = str(tmp_path / "data.parquet")
+    sample_df.sort_values("policy_year").to_parquet(path, row_group_size=250, index=False)
+
+    batches = list(
+        iter_dataset(path, batch_size_rows=100, columns=["account_number"], filters=[("policy_year", "==", 2017)])
+    )
+
+    assert all(list(batch.columns) == ["account_number"] for batch in batches)
+    assert sorted(pd.concat(batches)["account_number"]) == list(range(2, 1000, 4))
+
+
+def test_apply_filters_supports_disjunctions(sample_df: pd.DataFrame) -> None:
+    filters = [[("state", "==", "CA")], [("state", "in", ["NY"]), ("target", "!=", 0)]]
+
+    filtered = apply_filters(sample_df, filters)
+
+    assert set(filtered["state"]) == {"CA", "NY"}
+    assert (filtered.loc[filtered["state"] == "NY", "target"] == 1).all()
+
+
+def test_feature_names_lists_dataclass_columns() -> None:
+    assert feature_names(NonModellingFeatures, TargetFeature) == [
+        "account_number",
+        "policy_year",
+        "lob",
+        "split",
+        "target",
+    ]
+
+
+@pytest.mark.parametrize("suffix", [".feather", ".arrow"])
+def test_arrow_ipc_round_trip_is_memory_mapped(tmp_path: Path, sample_df: pd.DataFrame, suffix: str) -> None:
+    parquet_path = str(tmp_path / "data.parquet")
+    ipc_path = str(tmp_path / f"data{suffix}")
+    sample_df.to_parquet(parquet_path)
+
+    convert_to_arrow_ipc(parquet_path, ipc_path)
+    allocated_bytes = pa.total_allocated_bytes()
+    table = read_arrow_ipc(ipc_path, columns=["account_number"])
+    # Memory-mapped buffers are not allocated from the Arrow memory pool
+    assert pa.total_allocated_bytes() == allocated_bytes
+
+    # Numeric columns are not copied when converted to pandas
+    account_numbers = arrow_table_to_pandas(table)["account_number"].to_numpy()
+    assert table.column(0).chunk(0).buffers()[1].address == account_numbers.__array_interface__["data"][0]
+
+    df = get_dataset(ipc_path, columns=["account_number", "state"], filters=[("target", "==", 1)])
+    pd.testing.assert_frame_equal(get_dataset(ipc_path), sample_df)
+    expected = sample_df.loc[sample_df["target"] == 1, ["account_number", "state"]]
+    pd.testing.assert_frame_equal(df, expected.reset_index(drop=True))
+
+
+@pytest.mark.parametrize("uri", [False, True])
+def test_iter_dataset_arrow_ipc_yields_bounded_batches(tmp_path: Path, sample_df: pd.DataFrame, uri: bool) -> None:
+    path = str(tmp_path / "data.feather")
+    write_arrow_ipc(sample_df, path)
+
+    # A file:// URI is read through its filesystem, as remote files are
+    batches = list(iter_dataset((tmp_path / "data.feather").as_uri() if uri else path, batch_size_rows=300))
+
+    assert [len(batch) for batch in batches] == [300, 300, 300, 100]
+    pd.testing.assert_frame_equal(pd.concat(batches, ignore_index=True), sample_df)
+
+
+@pytest.mark.parametrize("suffix", [".parquet", ".csv", ".feather"])
+def test_get_dataset_applies_dtype_plan(tmp_path: Path, sample_df: pd.DataFrame, suffix: str) -> None:
+    path = str(tmp_path / f"data{suffix}")
+    if suffix == ".parquet":
+        sample_df.to_parquet(path)
+    elif suffix == ".csv":
+        sample_df.to_csv(path, index=False)
+    else:
+        write_arrow_ipc(sample_df, path)
+    dtype_plan = LoadTimeDtypes(categorical=["state"], downcast_integer=["policy_year", "target"], downcast_float=[])
+
+    df = get_dataset(path, columns=["state", "policy_year", "target"], dtype_plan=dtype_plan)
+
+    assert df.dtypes.to_dict() == {"state": "category", "policy_year": "int16", "target": "int8"}
+    pd.testing.assert_frame_equal(df.astype(sample_df.dtypes[df.columns]), sample_df[df.columns])
+
+
+def test_apply_dtype_plan_reports_memory_saved(sample_df: pd.DataFrame) -> None:
+    object_bytes = sample_df["state"].memory_usage(index=False, deep=True)
+    dtype_plan = LoadTimeDtypes(categorical=["state", "missing"], downcast_integer=["account_number"])
+
+    df, report = apply_dtype_plan(sample_df.copy(), dtype_plan)
+
+    assert list(report.index) == ["state", "account_number"]
+    assert report.loc["state", "bytes_before"] == object_bytes
+    assert report.loc["account_number", "dtype"] == "int16"
+    assert report.loc["account_number", "bytes_saved"] == 6 * len(sample_df)
+    # The size of a categorical column as strings is computed from its categories
+    _, categorical_report = apply_dtype_plan(df, dtype_plan)
+    assert categorical_report.loc["state", "bytes_before"] == object_bytes
+
+
+def test_apply_dtype_plan_only_keeps_categoricals_that_save_memory() -> None:
+    df = pd.DataFrame({"state": ["CA", "NY"], "lob": pd.Categorical(["wc", "wc"]), "exposure_amt": [1234.5678, 0.1]})
+
+    df, report = apply_dtype_plan(df, LoadTimeDtypes(categorical=["state", "lob"]))
+
+    assert df.dtypes.to_dict() == {"state": "object", "lob": "object", "exposure_amt": "float64"}
+    assert (report["bytes_saved"] >= 0).all()
+    assert df["exposure_amt"].tolist() == [1234.5678, 0.1]
+
+
+@pytest.fixture
+def partitioned_dataset(tmp_path: Path, sample_df: pd.DataFrame) -> Path:
+    for (policy_year, state), part in sample_df.groupby(["policy_year", "state"]):
+        directory = tmp_path / "extract" / f"policy_year={policy_year}" / f"state={state}"
+        directory.mkdir(parents=True)
+        part.drop(columns=["policy_year", "state"]).to_parquet(directory / "part-0.parquet", index=False)
+    (tmp_path / "extract" / "_SUCCESS").touch()
+    return tmp_path / "extract"
+
+
+def test_get_dataset_reads_partitioned_directory(partitioned_dataset: Path, sample_df: pd.DataFrame) -> None:
+    df = get_dataset(str(partitioned_dataset), filters=[("policy_year", "<", 2017), ("target", "==", 1)], max_workers=4)
+
+    expected = sample_df[(sample_df["policy_year"] < 2017) & (sample_df["target"] == 1)]
+    assert df["state"].dtype == "category"
+    assert sorted(df["account_number"]) == sorted(expected["account_number"])
+    assert (df["policy_year"] < 2017).all()
+
+
+@pytest.mark.parametrize("suffix", [".csv", ".parquet"])
+def test_get_dataset_promotes_types_that_differ_between_files(tmp_path: Path, suffix: str) -> None:
+    parts = {
+        "policy_year=2016": pd.DataFrame({"account_number": [1, 2], "x": [1, 2]}),
+        "policy_year=2017": pd.DataFrame({"account_number": [3, 4], "x": [1.5, None]}),
+    }
+    for partition, part in parts.items():
+        (tmp_path / partition).mkdir()
+        path = tmp_path / partition / f"part{suffix}"
+        if suffix == ".csv":
+            part.to_csv(path, index=False)
+        else:
+            part.to_parquet(path, index=False)
+
+    df = get_dataset(str(tmp_path)).sort_values("account_number", ignore_index=True)
+
+    assert df["x"].dtype == "float64"
+    assert df["x"].tolist()[:3] == [1.0, 2.0, 1.5]
+    assert df["x"].isna().tolist() == [False, False, False, True]
+
+
+def test_get_dataset_reads_glob_and_list_of_paths(partitioned_dataset: Path, sample_df: pd.DataFrame) -> None:
+    paths = sorted(str(path) for path in partitioned_dataset.glob("policy_year=2015/*/*.parquet"))
+
+    from_glob = get_dataset(str(partitioned_dataset / "policy_year=2015" / "*" / "*.parquet"), columns=["state"])
+    from_list = get_dataset(paths, columns=["account_number", "policy_year"])
+
+    assert list(from_glob.columns) == ["state"]
+    assert len(from_glob) == len(from_list) == (sample_df["policy_year"] == 2015).sum()
+    assert set(from_list["policy_year"]) == {2015}
+
+
+def test_iter_dataset_streams_partitioned_directory(partitioned_dataset: Path, sample_df: pd.DataFrame) -> None:
+    batches = list(iter_dataset(str(partitioned_dataset), batch_size_rows=100, filters=[("state", "==", "CA")]))
+
+    df = pd.concat(batches)
+    assert all(len(batch) <= 100 for batch in batches)
+    assert sorted(df["account_number"]) == sorted(sample_df.loc[sample_df["state"] == "CA", "account_number"])
+    assert set(df["state"]) == {"CA"}
+
+
+def test_bind_partition_filters_prunes_files() -> None:
+    assert bind_partition_filters([("policy_year", "<", 2017)], {"policy_year": 2017}) is None
+    assert bind_partition_filters([("policy_year", "<", 2017)], {"policy_year": 2016}) == []
+    assert bind_partition_filters(
+        [[("policy_year", "==", 2017)], [("lob", "==", "GL"), ("target", "==", 1)]], {"policy_year": 2016, "lob": "GL"}
+    ) == [[("target", "==", 1)]]
+
+
+def test_fast_csv_caches_inferred_schema(tmp_path: Path, sample_df: pd.DataFrame) -> None:
+    path = str(tmp_path / "data.csv")
+    sample_df.to_csv(path, index=False)
+
+    first = get_dataset(path, fast_csv=True)
+    sidecar = Path(f"{path}{CSV_SCHEMA_SIDECAR_SUFFIX}")
+    schema = pa.ipc.read_schema(pa.py_buffer(sidecar.read_bytes()))
+    second = get_dataset(path, columns=["state", "target"], filters=[("policy_year", "==", 2016)], fast_csv=True)
+
+    pd.testing.assert_frame_equal(first, sample_df)
+    assert schema.names == list(sample_df.columns)
+    expected = sample_df.loc[sample_df["policy_year"] == 2016, ["state", "target"]].reset_index(drop=True)
+    pd.testing.assert_frame_equal(second, expected)
+
+
+def test_fast_csv_reinfers_stale_schema(tmp_path: Path, sample_df: pd.DataFrame) -> None:
+    path = str(tmp_path / "data.csv")
+    sample_df.to_csv(path, index=False)
+    get_dataset(path, fast_csv=True)
+    sample_df.assign(target="yes").to_csv(path, index=False)
+
+    df = read_csv_arrow(path).to_pandas()
+    schema = pa.ipc.read_schema(pa.py_buffer(Path(f"{path}{CSV_SCHEMA_SIDECAR_SUFFIX}").read_bytes()))
+
+    assert set(df["target"]) == {"yes"}
+    assert schema.field("target").type == pa.string()
+
+
+def test_training_columns_include_every_column_the_model_consumes() -> None:
+    policies = make_synthetic_policies(200, words_per_summary=5)
+
+    features = FeaturePipeline().fit_transform(policies)
+    projected_features = FeaturePipeline().fit_transform(policies[TRAINING_COLUMNS])
+
+    assert set(projected_features.columns) == set(features.columns)
+    pd.testing.assert_frame_equal(projected_features[features.columns], features)
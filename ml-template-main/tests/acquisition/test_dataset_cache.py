@@ -0,0 +1,62 @@
+import os
+from pathlib import Path
+
+import fsspec
+import pandas as pd
+import pytest
+
+from pipeline.acquisition.acquire_data import get_dataset
+from pipeline.acquisition.dataset_cache import DatasetCache, is_remote_path
+
+
+@pytest.fixture
+def remote_parquet():
+    # An in-memory filesystem stands in for S3, so the cache can be exercised offline
+    uri = "memory://bucket/sprint_train.parquet"
+    df = pd.DataFrame({"state": ["CA", "NY", "TX"], "policy_year": [2015, 2016, 2017], "target": [0, 1, 0]})
+    with fsspec.open(uri, "wb") as f:
+        df.to_parquet(f)
+    yield uri, df
+    fsspec.filesystem("memory").rm(uri)
+
+
+def test_get_dataset_reads_remote_dataset_through_cache(tmp_path: Path, remote_parquet) -> None:
+    uri, df = remote_parquet
+    cache = DatasetCache(tmp_path, max_size_bytes=10 * 1024**2)
+
+    first = get_dataset(uri, cache=cache)
+    second = get_dataset(uri, columns=["state"], filters=[("policy_year", ">", 2015)], cache=cache)
+
+    pd.testing.assert_frame_equal(first, df)
+    assert list(second["state"]) == ["NY", "TX"]
+    assert len(list(tmp_path.glob("*.feather"))) == 1
+
+
+def test_cache_key_changes_when_source_is_rewritten(tmp_path: Path, remote_parquet) -> None:
+    uri, df = remote_parquet
+    cache = DatasetCache(tmp_path, max_size_bytes=10 * 1024**2)
+    key = cache.cache_key(uri)
+
+    with fsspec.open(uri, "wb") as f:
+        pd.concat([df, df]).to_parquet(f)
+
+    assert cache.cache_key(uri) != key
+
+
+def test_cache_evicts_least_recently_used_entries(tmp_path: Path) -> None:
+    cache = DatasetCache(tmp_path, max_size_bytes=0)
+    for i, name in enumerate(["old", "recent", "new"]):
+        entry = tmp_path / f"{name}.feather"
+        entry.write_bytes(b"0" * 100)
+        os.utime(entry, (i, i))
+    cache.max_size_bytes = 250
+
+    cache.evict(keep=tmp_path / "new.feather")
+
+    assert sorted(entry.name for entry in tmp_path.glob("*.feather")) == ["new.feather", "recent.feather"]
+
+
+def test_is_remote_path() -> None:
+    assert is_remote_path("s3://bucket/data.parquet")
+    assert not is_remote_path("/data/data.parquet")
+    assert not is_remote_path("file:///data/data.parquet")
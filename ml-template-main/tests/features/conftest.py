@@ -0,0 +1,29 @@
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pipeline.features.feature_engineering_utils import IndustryGrouping, StateGroupings
+
+
+@pytest.fixture
+def make_policies() -> Callable[..., pd.DataFrame]:
+    def make(n_rows: int = 500) -> pd.DataFrame:
+        rng = np.random.default_rng(0)
+        return pd.DataFrame(
+            {
+                "account_number": np.arange(n_rows),
+                "policy_year": 2016,
+                "lob": "wc",
+                "split": "train",
+                "state": rng.choice(list(StateGroupings["GDP"]), n_rows),
+                "industry": rng.choice(list(IndustryGrouping), n_rows),
+                "exposure_base": rng.choice(["Payroll", "Sales"], n_rows),
+                "exposure_amt": rng.random(n_rows) * 1e5,
+                "has_10k": rng.integers(0, 2, n_rows),
+                "target": rng.integers(0, 2, n_rows),
+            }
+        )
+
+    return make
@@ -0,0 +1,101 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pipeline.features.categorical_encoders import (
+    CategoryLookupTable,
+    FixedSchemaOneHotEncoder,
+    MEstimateTargetEncoder,
+)
+from pipeline.features.feature_engineering_utils import StateGroupings
+
+
+def test_lookup_matches_series_replace():
+    states = pd.Series(["CA", "NY", None, "XX", "PR", "CA"], dtype="category")
+
+    derived = CategoryLookupTable(StateGroupings).lookup(states)
+
+    assert list(derived) == list(StateGroupings)
+    for column, grouping in StateGroupings.items():
+        expected = states.replace(grouping).astype(object)
+        actual = pd.Series(derived[column]).astype(object)
+        assert actual.fillna("missing").tolist() == expected.fillna("missing").tolist()
+
+
+def test_lookup_groups_keys_missing_from_one_grouping_as_their_own_value():
+    lookup_table = CategoryLookupTable({"a": {"x": "1"}, "b": {"x": "2", "y": "3"}})
+
+    derived = lookup_table.lookup(pd.Series(["x", "y", "y"]))
+
+    assert list(derived["a"]) == ["1", "y", "y"]
+    assert list(derived["b"]) == ["2", "3", "3"]
+    assert derived["b"].codes.dtype == np.int8
+
+
+def test_one_hot_encoder_output_columns_are_fixed_at_fit_time():
+    train = pd.DataFrame({"x": [1.0, 2.0, 3.0], "base": ["payroll", "sales", "payroll"]})
+    serving = pd.DataFrame({"x": [4.0, 5.0], "base": ["unseen", "sales"]})
+
+    encoder = FixedSchemaOneHotEncoder(features=["base"]).fit(train)
+    encoded = encoder.transform(serving)
+
+    assert encoded.columns.tolist() == ["x", "base_payroll", "base_sales"]
+    assert encoded[["base_payroll", "base_sales"]].to_numpy().tolist() == [[0, 0], [0, 1]]
+    assert (encoder.transform(train) == pd.get_dummies(train, columns=["base"])).all().all()
+
+
+def test_one_hot_encoder_bool_and_sparse_outputs():
+    df = pd.DataFrame({"base": pd.Categorical(["a", None, "b"], categories=["a", "b", "c"])})
+
+    dense = FixedSchemaOneHotEncoder(features=["base"], output="bool").fit_transform(df)
+    sparse = FixedSchemaOneHotEncoder(features=["base"], output="sparse").fit_transform(df)
+
+    assert dense.dtypes.tolist() == [bool] * 3
+    assert dense.to_numpy().tolist() == [[True, False, False], [False, False, False], [False, True, False]]
+    assert isinstance(sparse.dtypes.iloc[0], pd.SparseDtype)
+    assert sparse.sparse.to_dense().to_numpy().tolist() == dense.astype(np.uint8).to_numpy().tolist()
+
+
+def test_m_estimate_target_encoder_matches_category_encoders():
+    category_encoders = pytest.importorskip("category_encoders")
+    rng = np.random.default_rng(0)
+    train = pd.DataFrame({"state": rng.choice(["CA", "NY", "TX", "VT"], 500), "target": rng.integers(0, 2, 500)})
+    test = pd.DataFrame({"state": ["CA", "VT", "XX", None], "target": [0, 0, 0, 0]})
+
+    encoder = MEstimateTargetEncoder(features=["state"], m=5.0).fit(train, train["target"])
+    reference = category_encoders.MEstimateEncoder(cols=["state"], m=5.0).fit(train, train["target"])
+
+    np.testing.assert_allclose(encoder.transform(test.copy())["state"], reference.transform(test)["state"])
+    np.testing.assert_allclose(encoder.transform(test.copy())["state"][2:], train["target"].mean())
+
+
+def test_m_estimate_target_encoder_updates_and_merges_exactly():
+    rng = np.random.default_rng(1)
+    df = pd.DataFrame({"state": rng.choice(["CA", "NY", "TX", "VT"], 400), "target": rng.integers(0, 2, 400)})
+    first, second = df.iloc[:150], df.iloc[150:]
+    test = pd.DataFrame({"state": ["CA", "NY", "TX", "VT", "XX"]})
+
+    full = MEstimateTargetEncoder(features=["state"], m=5.0).fit(df, df["target"])
+    updated = MEstimateTargetEncoder(features=["state"], m=5.0).fit(first, first["target"])
+    updated.partial_fit(second, second["target"])
+    merged = MEstimateTargetEncoder(features=["state"], m=5.0).fit(first, first["target"])
+    merged.merge(MEstimateTargetEncoder(features=["state"], m=5.0).fit(second, second["target"]))
+    restored = MEstimateTargetEncoder.from_dict(json.loads(json.dumps(merged.to_dict())))
+
+    expected = full.transform(test.copy())["state"]
+    for encoder in (updated, merged, restored):
+        np.testing.assert_allclose(encoder.transform(test.copy())["state"], expected)
+
+
+def test_m_estimate_target_encoder_does_not_modify_its_input():
+    train = pd.DataFrame({"state": ["CA", "NY", "CA", "TX"], "target": [1, 0, 0, 1]})
+    original = train.copy()
+    encoder = MEstimateTargetEncoder(features=["state"], m=5.0).fit(train, train["target"])
+
+    first = encoder.transform(train)
+    second = encoder.transform(train)
+
+    pd.testing.assert_frame_equal(train, original)
+    pd.testing.assert_frame_equal(first, second)
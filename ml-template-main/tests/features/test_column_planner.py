@@ -0,0 +1,36 @@
+import pandas as pd
+
+from pipeline.features.column_planner import ColumnStep, plan_columns
+from pipeline.features.feature_pipeline import FeaturePipeline
+
+
+def identity(df: pd.DataFrame) -> pd.DataFrame:
+    return df
+
+
+def test_plan_skips_steps_whose_outputs_are_unused():
+    steps = [
+        ColumnStep("scale", reads=("a",), writes=("a",), apply=identity),
+        ColumnStep("group", reads=("b",), writes=("b_grouped",), apply=identity),
+        ColumnStep("interact", reads=("a", "c"), writes=("a_x_c",), apply=identity),
+    ]
+
+    plan = plan_columns(steps, ["a_x_c", "d"])
+
+    assert [step.name for step in plan.steps] == ["scale", "interact"]
+    assert plan.skipped_steps == ["group"]
+    assert plan.input_columns == {"a", "c", "d"}
+
+
+def test_transform_computes_only_the_requested_columns(make_policies):
+    train = make_policies()
+    feature_pipeline = FeaturePipeline()
+    full_output = feature_pipeline.fit_transform(train.copy())
+    output_columns = ["exposure_amt", "industry", "exposure_base_Payroll"]
+    test = train.drop(columns="target")
+    original_test = test.copy()
+
+    output = feature_pipeline.transform(test, output_columns=output_columns)
+
+    pd.testing.assert_frame_equal(output, full_output[output_columns])
+    pd.testing.assert_frame_equal(test, original_test)
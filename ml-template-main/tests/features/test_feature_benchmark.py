@@ -0,0 +1,63 @@
+from pipeline.config.dataclasses import ModellingFeatures, TargetFeature, feature_names
+from pipeline.features.feature_benchmark import (
+    TOTAL_STAGE,
+    BenchmarkResult,
+    benchmark_feature_engineering,
+    find_regressions,
+    load_benchmark_results,
+    save_benchmark_results,
+)
+from pipeline.features.feature_engineering_utils import GDP
+from pipeline.features.nlp_feature_engineering_utils import NLPFeatures
+from pipeline.features.synthetic_data import make_synthetic_policies
+
+
+def test_synthetic_policies_match_the_training_data():
+    policies = make_synthetic_policies(5000, words_per_summary=10)
+
+    assert set(feature_names(ModellingFeatures, TargetFeature)).union(NLPFeatures) <= set(policies.columns)
+    assert policies[ModellingFeatures.state].dtype == "category"
+    assert set(policies[ModellingFeatures.state].cat.categories) == set(GDP)
+    assert policies[TargetFeature.target].between(0, 1).all()
+    assert policies[NLPFeatures[0]].str.split().str.len().eq(10).all()
+    # States with larger economies write more policies
+    state_counts = policies[ModellingFeatures.state].value_counts()
+    assert state_counts["CA"] > state_counts["WY"]
+    assert make_synthetic_policies(5000, words_per_summary=10).equals(policies)
+
+
+def test_every_stage_is_benchmarked():
+    results = benchmark_feature_engineering(1000, nlp=False)
+
+    stages = [result.stage for result in results]
+    assert stages[0] == "CategoricalFeatureEngineering.partial_fit"
+    assert "NumericalFeatureEngineering.interactions" in stages
+    assert stages[-1] == TOTAL_STAGE
+    assert all(result.n_rows == 1000 and result.rows_per_s > 0 for result in results)
+
+
+def test_regressions_beyond_the_threshold_are_found(tmp_path):
+    baseline = [
+        BenchmarkResult(10000, "slow_stage", 1.0, 10000.0, 0),
+        BenchmarkResult(10000, "noisy_stage", 0.001, 1e7, 0),
+        BenchmarkResult(10000, TOTAL_STAGE, 1.001, 9990.0, 100 * 1024**2),
+    ]
+    save_benchmark_results(baseline, tmp_path / "baseline.json")
+    baseline = load_benchmark_results(tmp_path / "baseline.json")
+
+    within_threshold = [
+        BenchmarkResult(10000, "slow_stage", 1.2, 8333.0, 0),
+        BenchmarkResult(10000, "noisy_stage", 0.01, 1e6, 0),
+        BenchmarkResult(10000, TOTAL_STAGE, 1.21, 8264.0, 120 * 1024**2),
+    ]
+    assert find_regressions(within_threshold, baseline, threshold=0.25) == []
+
+    regressed = [
+        BenchmarkResult(10000, "slow_stage", 2.0, 5000.0, 0),
+        BenchmarkResult(10000, TOTAL_STAGE, 2.001, 4998.0, 200 * 1024**2),
+        BenchmarkResult(1000000, "new_size", 2.0, 5e5, 0),
+    ]
+    regressions = find_regressions(regressed, baseline, threshold=0.25)
+    assert len(regressions) == 3
+    assert regressions[0].startswith("slow_stage on 10000 rows")
+    assert regressions[2].startswith("Peak memory on 10000 rows")
@@ -0,0 +1,56 @@
+from pathlib import Path
+from typing import Callable
+
+import pandas as pd
+
+from pipeline.features.feature_cache import FeatureCache, MaterializedFeatures
+from pipeline.features.feature_pipeline import FeaturePipeline
+
+
+def compute_features(train: pd.DataFrame, calls: list):
+    def compute() -> MaterializedFeatures:
+        calls.append(1)
+        feature_pipeline = FeaturePipeline().fit(train.copy())
+        return MaterializedFeatures(feature_pipeline, {"train": feature_pipeline.transform(train.copy())})
+
+    return compute
+
+
+def test_features_are_computed_once_per_input(tmp_path: Path, make_policies: Callable[..., pd.DataFrame]) -> None:
+    train = make_policies()
+    cache = FeatureCache(tmp_path, max_size_bytes=100 * 1024**2)
+    calls = []
+
+    first, first_hit = cache.fetch({"train": train}, compute_features(train, calls))
+    second, second_hit = cache.fetch({"train": train}, compute_features(train, calls))
+
+    assert (first_hit, second_hit) == (False, True)
+    assert len(calls) == 1
+    pd.testing.assert_frame_equal(second.frames["train"], first.frames["train"])
+    pd.testing.assert_frame_equal(
+        second.feature_pipeline.transform(train.copy()), first.feature_pipeline.transform(train.copy())
+    )
+
+
+def test_cache_key_changes_with_data_and_config(tmp_path: Path, make_policies: Callable[..., pd.DataFrame]) -> None:
+    train = make_policies()
+    changed = train.copy()
+    changed.loc[0, "exposure_amt"] += 1
+    cache = FeatureCache(tmp_path, max_size_bytes=100 * 1024**2)
+
+    key = cache.cache_key({"train": train})
+
+    assert cache.cache_key({"train": train.copy()}) == key
+    assert cache.cache_key({"train": changed}) != key
+    assert cache.cache_key({"train": train}, config={"interaction_dtype": "float32"}) != key
+
+
+def test_least_recently_used_features_are_evicted(tmp_path: Path, make_policies: Callable[..., pd.DataFrame]) -> None:
+    cache = FeatureCache(tmp_path, max_size_bytes=0)
+    first_train = make_policies()
+    second_train = make_policies(400)
+
+    cache.fetch({"train": first_train}, compute_features(first_train, []))
+    cache.fetch({"train": second_train}, compute_features(second_train, []))
+
+    assert [entry.name for entry in tmp_path.iterdir()] == [cache.cache_key({"train": second_train})]
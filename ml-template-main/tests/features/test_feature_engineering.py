@@ -1,3 +1,19 @@
-def test_feature_engineering():
-    # TODO: Placeholder for feature engineering unit tests
-    pass
+from pipeline.features import feature_engineering
+from pipeline.features.feature_engineering import do_feature_engineering
+from pipeline.features.feature_pipeline import FeaturePipeline
+from pipeline.features.synthetic_data import make_synthetic_policies
+
+
+def test_feature_engineering(tmp_path, monkeypatch):
+    monkeypatch.setattr(feature_engineering, "FEATURE_PIPELINE_ARTIFACT", tmp_path / "feature_pipeline.pkl")
+    train = make_synthetic_policies(2000, seed=0, text=False)
+    test = make_synthetic_policies(500, seed=1, text=False)
+
+    processed_train = do_feature_engineering(train, training=True)
+    processed_test = do_feature_engineering(test)
+
+    assert processed_test.columns.tolist() == processed_train.columns.tolist()
+    assert len(processed_test) == len(test)
+    assert not {"account_number", "lob", "split"}.intersection(processed_train.columns)
+    pipeline = FeaturePipeline.load(tmp_path / "feature_pipeline.pkl")
+    assert processed_test.equals(pipeline.transform(test))
@@ -0,0 +1,81 @@
+import pickle
+
+import pandas as pd
+import pytest
+
+from pipeline.acquisition.acquire_data import get_dataset
+from pipeline.features import feature_pipeline as feature_pipeline_module
+from pipeline.features.feature_pipeline import FeaturePipeline
+
+
+def test_fitted_pipeline_round_trips_and_aligns_single_rows(tmp_path, make_policies):
+    train = make_policies()
+    feature_pipeline = FeaturePipeline()
+    processed_train = feature_pipeline.fit_transform(train.copy())
+
+    feature_pipeline.save(tmp_path / "feature_pipeline.pkl")
+    loaded = FeaturePipeline.load(tmp_path / "feature_pipeline.pkl")
+    single_row = loaded.transform(train.iloc[[3]].drop(columns="target"))
+
+    assert single_row.columns.tolist() == processed_train.drop(columns="target").columns.tolist()
+    pd.testing.assert_frame_equal(
+        single_row.astype(object), processed_train.drop(columns="target").iloc[[3]].astype(object)
+    )
+
+
+def test_load_rejects_incompatible_versions(tmp_path, monkeypatch):
+    path = tmp_path / "feature_pipeline.pkl"
+    with open(path, "wb") as f:
+        pickle.dump(FeaturePipeline(), f)
+
+    monkeypatch.setattr(
+        feature_pipeline_module, "FEATURE_PIPELINE_VERSION", feature_pipeline_module.FEATURE_PIPELINE_VERSION + 1
+    )
+
+    with pytest.raises(ValueError, match="version"):
+        FeaturePipeline.load(path)
+
+
+def test_streamed_fit_and_transform_match_in_memory(tmp_path, make_policies):
+    train = make_policies()
+
+    def batches():
+        return (train.iloc[start : start + 90].copy() for start in range(0, len(train), 90))
+
+    in_memory = FeaturePipeline().fit_transform(train.copy())
+    streamed_pipeline = FeaturePipeline().fit_streaming(batches())
+    n_rows = streamed_pipeline.transform_to_parquet(batches(), tmp_path / "features")
+
+    streamed = get_dataset(str(tmp_path / "features"))
+    assert n_rows == len(train)
+    assert streamed.columns.tolist() == in_memory.columns.tolist()
+    pd.testing.assert_frame_equal(
+        streamed.astype(object), in_memory.reset_index(drop=True).astype(object), check_dtype=False
+    )
+
+
+def test_parallel_transform_matches_serial_transform(monkeypatch, make_policies):
+    train = make_policies(2000)
+    train.loc[train.index[-5:], "state"] = "unseen"
+    feature_pipeline = FeaturePipeline().fit(train.copy())
+    monkeypatch.setattr(feature_pipeline_module, "MIN_ROWS_PER_SHARD", 100)
+
+    serial = feature_pipeline.transform(train.copy())
+    parallel = feature_pipeline.transform(train.copy(), n_workers=3)
+
+    pd.testing.assert_frame_equal(parallel, serial)
+
+
+def test_fitting_leaves_the_input_unchanged(make_policies):
+    train = make_policies()
+    unchanged = train.copy()
+
+    FeaturePipeline().fit(train)
+    pd.testing.assert_frame_equal(train, unchanged)
+    FeaturePipeline().fit_transform(train)
+    pd.testing.assert_frame_equal(train, unchanged)
+
+
+def test_streamed_fit_rejects_no_batches():
+    with pytest.raises(ValueError, match="no batches"):
+        FeaturePipeline().fit_streaming(iter([]))
@@ -0,0 +1,66 @@
+import gensim.parsing.preprocessing as gsp
+import numpy as np
+import pandas as pd
+from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+
+from pipeline.features import nlp_feature_engineering
+from pipeline.features.nlp_feature_engineering import NLPFeatureEngineering, TextNormalizer, get_sentiment_analyzer
+from pipeline.features.nlp_feature_engineering_utils import TEXT_CLEANING_FUNCTION_MAPPINGS, SentimentScoreFeatures
+from pipeline.features.synthetic_data import make_synthetic_summaries
+
+EDGE_CASES = [
+    "Risk <b>Factors</b>:\tLitigation,\n  claims... and (adverse) results!",
+    "ﬁnancial naïve CAFÉ ℌilbert rôle n° Ⅻ",
+    "<unclosed tag and a < b > c",
+    r"\n|\t",
+    r"\N|\T",
+    "",
+    "   ",
+    "file\x1cseparated\x1fwords",
+    "line\u2028and\xa0non-breaking spaces",
+    "tabs\tand\x0bvertical\x0ctabs",
+    "afterward the company, afterwards",
+    np.nan,
+    12.5,
+]
+
+
+def test_text_normalizer_matches_the_cleaning_steps():
+    texts = pd.Series(make_synthetic_summaries(200, np.random.default_rng(0))["item1A_summary"] + EDGE_CASES)
+    stepwise = NLPFeatureEngineering(gsp_text_cleaning=TEXT_CLEANING_FUNCTION_MAPPINGS)
+
+    expected = stepwise._clean_text_stepwise("item1A_summary", texts.copy())
+    normalizer = TextNormalizer(stopwords=gsp.STOPWORDS)
+
+    assert [normalizer(text) for text in texts.astype(str)] == expected.tolist()
+
+
+def test_text_is_cleaned_in_one_pass_without_the_extra_stop_words():
+    texts = pd.Series(
+        ["Afterward, the <i>claims</i> were NOT settled.", np.nan, "Afterward, the <i>claims</i> were NOT settled."],
+        name="item1A_summary",
+    )
+
+    cleaned = NLPFeatureEngineering.clean_text(texts)
+
+    assert cleaned.tolist() == ["claims settled", "nan", "claims settled"]
+    assert cleaned.name == "item1A_summary"
+
+
+def test_sentiment_is_scored_in_batches_across_workers(monkeypatch):
+    summaries = pd.DataFrame(make_synthetic_summaries(30, np.random.default_rng(0), words_per_summary=20))
+    analyzer = SentimentIntensityAnalyzer()
+    expected = pd.DataFrame(
+        {
+            score: [analyzer.polarity_scores(text)["compound"] for text in summaries[feature]]
+            for feature, score in SentimentScoreFeatures.items()
+        }
+    )
+    monkeypatch.setattr(nlp_feature_engineering, "SENTIMENT_BATCH_SIZE", 7)
+
+    in_process = NLPFeatureEngineering().score_sentiment_features(summaries)
+    pooled = NLPFeatureEngineering(n_workers=2).score_sentiment_features(summaries)
+
+    pd.testing.assert_frame_equal(in_process, expected)
+    pd.testing.assert_frame_equal(pooled, expected)
+    assert get_sentiment_analyzer() is get_sentiment_analyzer()
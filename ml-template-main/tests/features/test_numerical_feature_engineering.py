@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+
+from pipeline.features.numerical_feature_engineering import InteractionFeatureGenerator, NumericalFeatureEngineering
+
+
+def make_features() -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "state": [0.1, 0.2, 0.3],
+            "industry": [0.5, 0.4, 0.3],
+            "exposure_amt": [1000.0, 2500.0, 0.0],
+            "has_10k": [1, 0, 1],
+        }
+    )
+
+
+def test_numerical_feature_engineering_does_not_modify_its_input():
+    df = make_features()
+    original = df.copy()
+
+    first = NumericalFeatureEngineering().transform(df)
+    second = NumericalFeatureEngineering().transform(df)
+
+    pd.testing.assert_frame_equal(df, original)
+    pd.testing.assert_frame_equal(first, second)
+    assert first["exposure_amt"].tolist() == [1.0, 2.5, 0.0]
+    assert first["state_expsramt_interac"].tolist() == [0.1, 0.5, 0.0]
+    assert first["expsramt_has10k_interac"].tolist() == [1.0, 0.0, 0.0]
+
+
+def test_interaction_generator_combines_features_up_to_max_degree():
+    df = make_features()
+
+    interactions = InteractionFeatureGenerator(
+        features=["state", "industry", "has_10k"], max_degree=3, dtype=np.float32
+    ).transform(df)
+
+    assert interactions.columns.tolist() == [
+        "state_x_industry",
+        "state_x_has_10k",
+        "industry_x_has_10k",
+        "state_x_industry_x_has_10k",
+    ]
+    assert (interactions.dtypes == np.float32).all()
+    np.testing.assert_allclose(interactions["state_x_industry_x_has_10k"], [0.05, 0.0, 0.09], rtol=1e-6)
+
+
+def test_numerical_feature_engineering_interactions_are_parameters():
+    df = make_features()
+    feature_engineering = NumericalFeatureEngineering(features=["state", "industry"])
+
+    output = feature_engineering.transform(df)
+
+    assert feature_engineering.get_params()["features"] == ["state", "industry"]
+    assert "state_x_industry" in output.columns
+    assert "state_expsramt_interac" not in output.columns
+    np.testing.assert_allclose(output["state_x_industry"], [0.05, 0.08, 0.09])
@@ -0,0 +1,48 @@
+import json
+import logging
+
+from pipeline.features import feature_pipeline as feature_pipeline_module
+from pipeline.features.feature_pipeline import FeaturePipeline
+from pipeline.utils.profiling import StageProfiler
+
+
+def test_every_feature_step_is_profiled(caplog, make_policies):
+    train = make_policies()
+    profiler = StageProfiler()
+
+    with caplog.at_level(logging.INFO, logger="pipeline.utils.profiling"):
+        feature_pipeline = FeaturePipeline().fit(train.copy(), profiler=profiler)
+        feature_pipeline.transform(train.copy(), profiler=profiler)
+
+    stages = [profile.stage for profile in profiler.profiles]
+    assert stages[0] == "CategoricalFeatureEngineering.partial_fit"
+    assert "CategoricalFeatureEngineering.one_hot_encoding" in stages
+    assert "NumericalFeatureEngineering.interactions" in stages
+    assert all(profile.wall_time_s >= 0 and profile.memory_after_bytes > 0 for profile in profiler.profiles)
+    logged = [json.loads(record.getMessage()) for record in caplog.records if record.name == "pipeline.utils.profiling"]
+    assert [record["stage"] for record in logged] == stages
+
+
+def test_every_feature_step_of_each_shard_is_profiled(monkeypatch, make_policies):
+    train = make_policies(1000)
+    feature_pipeline = FeaturePipeline().fit(train.copy())
+    monkeypatch.setattr(feature_pipeline_module, "MIN_ROWS_PER_SHARD", 100)
+    serial_profiler = StageProfiler()
+    sharded_profiler = StageProfiler()
+
+    feature_pipeline.transform(train.copy(), profiler=serial_profiler)
+    feature_pipeline.transform(train.copy(), n_workers=2, profiler=sharded_profiler)
+
+    serial_stages = [profile.stage for profile in serial_profiler.profiles]
+    assert [profile.stage for profile in sharded_profiler.profiles] == 2 * serial_stages + ["sharded_transform"]
+
+
+def test_profiles_are_summed_into_metrics(make_policies):
+    profiler = StageProfiler(name="fe")
+    for _ in range(2):
+        profiler.run("double", lambda df: df * 2, make_policies()[["exposure_amt"]])
+
+    metrics = profiler.to_metrics()
+
+    assert metrics["fe.double.wall_time_s"] == sum(profile.wall_time_s for profile in profiler.profiles)
+    assert metrics["fe.double.memory_before_bytes"] == 2 * profiler.profiles[0].memory_before_bytes
@@ -0,0 +1,110 @@
+import pandas as pd
+import pytest
+
+from pipeline.acquisition.acquire_data import get_dataset
+from pipeline.model.splitting import (
+    HOLDOUT,
+    TEST,
+    TRAIN,
+    WINDOW_SLIDING,
+    account_hash_fractions,
+    assign_splits,
+    make_backtest_folds,
+    split_train_test_holdout,
+    subsample_train_split,
+    write_split_batches,
+)
+
+
+def make_policies(n_accounts: int = 200) -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "account_number": [account for account in range(n_accounts) for _ in range(3)],
+            "policy_year": [2015, 2016, 2017] * n_accounts,
+            "target": [0, 1, 0] * n_accounts,
+        }
+    )
+
+
+def test_assign_splits_uses_policy_year_without_holdout():
+    df = pd.concat([make_policies(10), pd.DataFrame({"account_number": [0], "policy_year": [2018], "target": [0]})])
+
+    splits = assign_splits(df, test_policy_year=2017)
+
+    assert list(splits[:3]) == [TRAIN, TRAIN, TEST]
+    assert pd.isna(splits[-1])
+
+
+def test_account_hash_fractions_are_stable_across_dtypes():
+    as_int = account_hash_fractions(pd.Series([1, 2, 3]))
+    as_str = account_hash_fractions(pd.Series(["1", "2", "3"]))
+
+    assert (as_int == as_str).all()
+    assert ((as_int >= 0) & (as_int < 1)).all()
+
+
+def test_holdout_keeps_whole_accounts_out_of_train_and_test():
+    df = make_policies()
+
+    splits = split_train_test_holdout(df, test_policy_year=2017, holdout_fraction=0.25)
+
+    holdout_accounts = set(splits.data_holdout["account_number"])
+    assert 20 < len(holdout_accounts) < 80
+    assert not holdout_accounts & set(splits.data_train["account_number"])
+    assert not holdout_accounts & set(splits.data_test["account_number"])
+    assert len(splits.data_train) + len(splits.data_test) + len(splits.data_holdout) == len(df)
+
+
+def test_streamed_splits_match_in_memory_splits(tmp_path):
+    df = make_policies()
+    batches = (df.iloc[start : start + 70] for start in range(0, len(df), 70))
+
+    row_counts = write_split_batches(batches, tmp_path, test_policy_year=2017, holdout_fraction=0.25)
+
+    in_memory = split_train_test_holdout(df, test_policy_year=2017, holdout_fraction=0.25)
+    streamed_train = get_dataset(str(tmp_path / "data_split=train"))
+    assert row_counts[HOLDOUT] == len(in_memory.data_holdout)
+    assert streamed_train["account_number"].tolist() == in_memory.data_train["account_number"].tolist()
+
+
+def test_make_backtest_folds_expanding_window():
+    folds = make_backtest_folds([2017, 2014, 2015, 2016, 2015], n_folds=2)
+
+    assert [(fold.train_years, fold.test_year) for fold in folds] == [([2014, 2015], 2016), ([2014, 2015, 2016], 2017)]
+
+
+def test_make_backtest_folds_sliding_window():
+    folds = make_backtest_folds(range(2012, 2018), n_folds=3, window=WINDOW_SLIDING, window_years=2)
+
+    assert [(fold.train_years, fold.test_year) for fold in folds] == [
+        ([2013, 2014], 2015),
+        ([2014, 2015], 2016),
+        ([2015, 2016], 2017),
+    ]
+
+
+def test_make_backtest_folds_needs_a_training_year_per_fold():
+    with pytest.raises(ValueError):
+        make_backtest_folds([2016, 2017], n_folds=2)
+
+
+def test_subsample_train_split_is_stratified_and_reproducible():
+    df = pd.DataFrame(
+        {
+            "state": ["MA"] * 900 + ["NY"] * 99 + ["VT"],
+            "target": ([0] * 8 + [1] * 2) * 90 + [0] * 99 + [1],
+        }
+    )
+
+    sample = subsample_train_split(df, sample_size=100, seed=7).data_train
+    repeat = subsample_train_split(df, sample_size=100, seed=7).data_train
+
+    assert sample.index.tolist() == repeat.index.tolist()
+    assert sample.index.is_monotonic_increasing
+    assert sample.groupby(["state", "target"]).size().to_dict() == {
+        ("MA", 0): 72,
+        ("MA", 1): 18,
+        ("NY", 0): 10,
+        ("VT", 1): 1,
+    }
+    assert subsample_train_split(df, sample_size=100, seed=8).data_train.index.tolist() != sample.index.tolist()